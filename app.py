@@ -2,40 +2,50 @@
 Flask Web Application for E-Commerce Price Prediction
 Professional frontend for multimodal price prediction model.
 """
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 import traceback
 import os
+import time
+
+from config import SERVING_CONFIG, UNCERTAINTY_CONFIG
+from batch_io import (iter_json_rows, stream_predictions, columnar_format, stream_arrow_predictions,
+                      stream_msgpack_predictions, validate_row, ARROW_MIMETYPE, MSGPACK_MIMETYPE)
+from predictor_service import (get_loader, process_memory, check_admin_token,
+                               resolve_model_path, start_watching, get_prediction_cache)
+from prediction_cache import cached_predict_price
+from metrics import instrument_flask, observe, timed
+from profiling import profiler
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'ecommerce-price-predictor-2026'
 app.config['JSON_SORT_KEYS'] = False
 
-# Global predictor instance (lazy loaded)
-_predictor = None
-_predictor_error = None
+# Request latency / status counters and GET /metrics
+instrument_flask(app)
+
+# Predictor loads and warms up in a background thread from process start
+predictor_loader = get_loader()
+
+# Hot reload on new checkpoints (gunicorn starts the watcher per worker instead)
+if SERVING_CONFIG['watch_models'] and not SERVING_CONFIG['preload']:
+    start_watching(predictor_loader)
+
+prediction_cache = get_prediction_cache()
 
 def get_predictor_instance():
-    """Get or create predictor instance (singleton pattern)."""
-    global _predictor, _predictor_error
-    
-    if _predictor is not None:
-        return _predictor
-    
-    if _predictor_error is not None:
-        return None
-    
-    try:
-        print("🔧 Loading predictor for the first time...")
-        from predict import get_predictor
-        _predictor = get_predictor()
-        print("✅ Predictor loaded successfully!")
-        return _predictor
-    except Exception as e:
-        _predictor_error = str(e)
-        print(f"❌ Failed to load predictor: {e}")
-        traceback.print_exc()
-        return None
+    """Ready predictor, or None while loading (never blocks on model load)."""
+    return predictor_loader.get()
+
+def not_ready_response():
+    """503 with loading progress while the predictor is not ready."""
+    status = predictor_loader.status()
+    error = status['error'] or f"Model is {status['state'].replace('_', ' ')} ({status['progress'] * 100:.0f}%). Please retry shortly."
+    return jsonify({
+        'success': False,
+        'error': error,
+        'status': status
+    }), 500 if status['state'] == 'failed' else 503
 
 @app.route('/')
 def index():
@@ -92,13 +102,10 @@ def predict():
         predictor = get_predictor_instance()
         
         if predictor is None:
-            error_msg = _predictor_error if _predictor_error else 'Model not loaded. Please wait for initialization.'
-            return jsonify({
-                'success': False,
-                'error': error_msg
-            }), 500
+            return not_ready_response()
         
         # Get input data
+        parse_start = time.perf_counter()
         data = request.get_json()
         
         # Validate required fields
@@ -116,6 +123,34 @@ def predict():
         ratings = float(data.get('ratings', 4.0))
         no_of_ratings = int(data.get('no_of_ratings', 100))
         discount_ratio = float(data.get('discount_ratio', 0.0))
+        neighbours = int(data.get('neighbours', SERVING_CONFIG['catalog_neighbours']))
+        if not 0 <= neighbours <= SERVING_CONFIG['catalog_max_neighbours']:
+            return jsonify({
+                'success': False,
+                'error': f"Neighbours must be between 0 and {SERVING_CONFIG['catalog_max_neighbours']}"
+            }), 400
+        latency_budget_ms = data.get('latency_budget_ms')
+        if latency_budget_ms is not None:
+            latency_budget_ms = float(latency_budget_ms)
+            if latency_budget_ms <= 0:
+                return jsonify({
+                    'success': False,
+                    'error': 'Latency budget must be positive'
+                }), 400
+        
+        # MC-dropout interval: true for the default coverage, or one of the calibrated levels
+        uncertainty_level = data.get('uncertainty')
+        if uncertainty_level is True:
+            uncertainty_level = UNCERTAINTY_CONFIG['default_level']
+        elif uncertainty_level in (None, False):
+            uncertainty_level = None
+        elif float(uncertainty_level) not in UNCERTAINTY_CONFIG['levels']:
+            return jsonify({
+                'success': False,
+                'error': f"Uncertainty level must be true or one of {UNCERTAINTY_CONFIG['levels']}"
+            }), 400
+        else:
+            uncertainty_level = float(uncertainty_level)
         
         # Validate ranges
         if not (0 <= ratings <= 5):
@@ -136,41 +171,55 @@ def predict():
                 'error': 'Discount ratio must be between 0 and 1'
             }), 400
         
-        # Make prediction
-        predicted_price, confidence = predictor.predict_price(
+        observe('stage_seconds', time.perf_counter() - parse_start, stage='parse')
+        
+        # Make prediction (repeated identical requests are answered from the cache)
+        predicted_price, confidence, details = cached_predict_price(
+            prediction_cache,
+            predictor,
             product_name=product_name,
             category=category,
             ratings=ratings,
             no_of_ratings=no_of_ratings,
-            discount_ratio=discount_ratio
+            discount_ratio=discount_ratio,
+            latency_budget_ms=latency_budget_ms,
+            neighbours=neighbours,
+            uncertainty_level=uncertainty_level
         )
         
-        # Calculate price range (confidence interval)
-        price_lower = predicted_price * 0.85
-        price_upper = predicted_price * 1.15
+        # Price range: the MC-dropout interval when requested, else a fixed ±15% band
+        if details.get('uncertainty'):
+            price_lower, price_upper = details['uncertainty']['lower'], details['uncertainty']['upper']
+        else:
+            price_lower = predicted_price * 0.85
+            price_upper = predicted_price * 1.15
         
         # Return results
-        return jsonify({
-            'success': True,
-            'prediction': {
-                'price': round(predicted_price, 2),
-                'price_formatted': f"₹{predicted_price:,.2f}",
-                'confidence': round(confidence * 100, 1),
-                'price_range': {
-                    'lower': round(price_lower, 2),
-                    'upper': round(price_upper, 2),
-                    'lower_formatted': f"₹{price_lower:,.2f}",
-                    'upper_formatted': f"₹{price_upper:,.2f}"
+        with timed('serialize'):
+            response = jsonify({
+                'success': True,
+                'prediction': {
+                    'price': round(predicted_price, 2),
+                    'price_formatted': f"₹{predicted_price:,.2f}",
+                    'confidence': round(confidence * 100, 1),
+                    'price_range': {
+                        'lower': round(price_lower, 2),
+                        'upper': round(price_upper, 2),
+                        'lower_formatted': f"₹{price_lower:,.2f}",
+                        'upper_formatted': f"₹{price_upper:,.2f}"
+                    }
+                },
+                'model_version': details['model_version'],
+                'serving': details,
+                'input': {
+                    'product_name': product_name,
+                    'category': category,
+                    'ratings': ratings,
+                    'no_of_ratings': no_of_ratings,
+                    'discount_ratio': discount_ratio
                 }
-            },
-            'input': {
-                'product_name': product_name,
-                'category': category,
-                'ratings': ratings,
-                'no_of_ratings': no_of_ratings,
-                'discount_ratio': discount_ratio
-            }
-        })
+            })
+        return response
     
     except ValueError as e:
         return jsonify({
@@ -186,6 +235,209 @@ def predict():
             'error': 'An error occurred during prediction. Please try again.'
         }), 500
 
+@app.route('/api/predict/sweep', methods=['POST'])
+def predict_sweep():
+    """Price curve for one product over a grid of discount ratios (and ratings)."""
+    try:
+        predictor = get_predictor_instance()
+        
+        if predictor is None:
+            return not_ready_response()
+        
+        data = request.get_json() or {}
+        
+        for field in ('product_name', 'category'):
+            if not data.get(field):
+                return jsonify({
+                    'success': False,
+                    'error': f'Missing required field: {field}'
+                }), 400
+        
+        # Discount grid: explicit list, or 11 points from 0 to 0.5
+        discount_ratios = data.get('discount_ratios', [round(0.05 * i, 2) for i in range(11)])
+        ratings = data.get('ratings', 4.0)
+        discount_ratios = [float(d) for d in discount_ratios]
+        ratings = [float(r) for r in ratings] if isinstance(ratings, list) else [float(ratings)]
+        no_of_ratings = int(data.get('no_of_ratings', 100))
+        
+        if not all(0 <= d <= 1 for d in discount_ratios):
+            return jsonify({
+                'success': False,
+                'error': 'Discount ratios must be between 0 and 1'
+            }), 400
+        
+        if not all(0 <= r <= 5 for r in ratings):
+            return jsonify({
+                'success': False,
+                'error': 'Ratings must be between 0 and 5'
+            }), 400
+        
+        if no_of_ratings < 0:
+            return jsonify({
+                'success': False,
+                'error': 'Number of ratings must be positive'
+            }), 400
+        
+        sweep = predictor.predict_sweep(
+            product_name=data['product_name'].strip(),
+            category=data['category'].strip().lower(),
+            discount_ratios=discount_ratios,
+            ratings=ratings,
+            no_of_ratings=no_of_ratings
+        )
+        
+        return jsonify({
+            'success': True,
+            'curve': [{**point, 'price': round(point['price'], 2),
+                       'confidence': round(point['confidence'] * 100, 1)}
+                      for point in sweep['points']],
+            'model_version': sweep['model_version'],
+            'latency_ms': sweep['latency_ms']
+        })
+    
+    except (ValueError, TypeError) as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid input: {str(e)}'
+        }), 400
+    
+    except Exception as e:
+        print(f"❌ Sweep error: {e}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': 'An error occurred during prediction. Please try again.'
+        }), 500
+
+@app.route('/api/explain', methods=['POST'])
+def explain():
+    """
+    Prices with text/category/numeric token importance, from one forward pass.
+    
+    Body: one product (like /api/predict) or {"products": [...]} explained as a batch.
+    """
+    try:
+        predictor = get_predictor_instance()
+        
+        if predictor is None:
+            return not_ready_response()
+        
+        data = request.get_json() or {}
+        batched = isinstance(data.get('products'), list)
+        products = data['products'] if batched else [data]
+        if not 0 < len(products) <= SERVING_CONFIG['explain_max_products']:
+            return jsonify({
+                'success': False,
+                'error': f"Explain between 1 and {SERVING_CONFIG['explain_max_products']} products per request"
+            }), 400
+        
+        rows = []
+        for i, product in enumerate(products):
+            try:
+                rows.append(validate_row(product))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': f'Product {i}: {e}' if batched else str(e)
+                }), 400
+        
+        start = time.perf_counter()
+        result = predictor.explain_arrays(*(list(column) for column in zip(*rows)))
+        latency_ms = round((time.perf_counter() - start) * 1000, 3)
+        
+        tokens = result['tokens']
+        explanations = [
+            {
+                'price': round(float(result['prices'][i]), 2),
+                'confidence': round(float(result['confidence'][i]) * 100, 1),
+                'importance': dict(zip(tokens, (round(float(w), 4) for w in result['importance'][i]))),
+                'pooling_attention': dict(zip(tokens, (round(float(w), 4) for w in result['pooling'][i]))),
+                'layer_attention': result['layers'][:, i].round(4).tolist()
+            }
+            for i in range(len(rows))
+        ]
+        
+        response = {'success': True, 'model_version': result['model_version'], 'latency_ms': latency_ms}
+        if batched:
+            response['explanations'] = explanations
+        else:
+            response['explanation'] = explanations[0]
+        return jsonify(response)
+    
+    except Exception as e:
+        print(f"❌ Explain error: {e}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': 'An error occurred during prediction. Please try again.'
+        }), 500
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Bulk prediction: NDJSON (or a JSON array) in, NDJSON streamed out per micro-batch.
+    
+    Invalid rows get an error line; the request itself only fails if the model
+    is not ready.
+    """
+    predictor = get_predictor_instance()
+    
+    if predictor is None:
+        return not_ready_response()
+    
+    rows = iter_json_rows(request.stream)
+    return Response(stream_with_context(stream_predictions(predictor, rows)),
+                    mimetype='application/x-ndjson')
+
+@app.route('/api/predict/columnar', methods=['POST'])
+def predict_columnar():
+    """
+    Bulk prediction with columnar binary payloads (Arrow IPC stream or msgpack).
+    
+    The response uses the request's format and is streamed one batch per input batch.
+    """
+    predictor = get_predictor_instance()
+    
+    if predictor is None:
+        return not_ready_response()
+    
+    payload_format = columnar_format(request.content_type)
+    if payload_format is None:
+        return jsonify({
+            'success': False,
+            'error': f'Content-Type must be {ARROW_MIMETYPE} or {MSGPACK_MIMETYPE}'
+        }), 415
+    
+    if payload_format == 'arrow':
+        results, mimetype = stream_arrow_predictions(predictor, request.stream), ARROW_MIMETYPE
+    else:
+        results, mimetype = stream_msgpack_predictions(predictor, request.stream), MSGPACK_MIMETYPE
+    
+    # Score the first batch before sending headers so malformed uploads get a 400
+    try:
+        first = next(results)
+    except ImportError as e:
+        return jsonify({
+            'success': False,
+            'error': f'{payload_format} support is not installed on the server ({e.name})'
+        }), 415
+    except (ValueError, KeyError) as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid input: {str(e)}'
+        }), 400
+    
+    def generate():
+        yield first
+        try:
+            yield from results
+        except Exception as e:
+            # Headers are already sent: the client sees a truncated stream
+            print(f"❌ Columnar prediction error: {e}")
+            traceback.print_exc()
+    
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
     """Get available product categories."""
@@ -216,15 +468,88 @@ def get_categories():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint."""
-    predictor = get_predictor_instance()
+    """Liveness + readiness and loading progress (always 200 while the process is up)."""
+    status = predictor_loader.status()
     
     return jsonify({
-        'status': 'healthy' if predictor else 'initializing',
-        'model_loaded': predictor is not None,
-        'error': _predictor_error if _predictor_error else None
+        'status': 'healthy' if status['ready'] else status['state'],
+        'model_loaded': status['ready'],
+        **status,
+        'memory': process_memory(),
+        'prediction_cache': prediction_cache.stats()
     })
 
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once the predictor is loaded and warmed up, else 503."""
+    status = predictor_loader.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    Hot-reload the model in the background (X-Admin-Token header required).
+    
+    Optional JSON body {"model_path": "..."}: checkpoint relative to the models
+    directory; by default the serving bundle / best_model.pth is reloaded.
+    Progress and the active version are reported by /api/health.
+    """
+    if not check_admin_token(request.headers.get('X-Admin-Token')):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    
+    model_path = (request.get_json(silent=True) or {}).get('model_path')
+    if model_path:
+        try:
+            model_path = resolve_model_path(model_path)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if not predictor_loader.ready:
+        return not_ready_response()
+    if not predictor_loader.reload(model_path):
+        return jsonify({'success': False, 'error': 'A reload is already in progress'}), 409
+    
+    return jsonify({
+        'success': True,
+        'message': 'Reload started',
+        'model_version': predictor_loader.status()['model_version']
+    }), 202
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """
+    Profile live predictions (X-Admin-Token header required).
+    
+    POST {"mode": "torch", "predictions": N}: torch.profiler Chrome trace for each
+    of the next N predictions. POST {"mode": "sample", "seconds": S, "interval_ms": I}:
+    wall-clock stack samples of all threads for S seconds, as one collapsed-stack
+    file. GET reports the running session and the files written so far.
+    """
+    if not check_admin_token(request.headers.get('X-Admin-Token')):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    
+    if request.method == 'GET':
+        return jsonify({'success': True, **profiler.status()})
+    
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'torch')
+    try:
+        if mode == 'torch':
+            started = profiler.trace_predictions(int(data.get('predictions', 10)))
+        elif mode == 'sample':
+            interval_ms = data.get('interval_ms')
+            started = profiler.start_sampling(float(data.get('seconds', 10)),
+                                              float(interval_ms) if interval_ms is not None else None)
+        else:
+            return jsonify({'success': False, 'error': "mode must be 'torch' or 'sample'"}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if not started:
+        return jsonify({'success': False, 'error': 'A profiling session is already running'}), 409
+    
+    return jsonify({'success': True, 'message': f'Profiling started ({mode})', **profiler.status()}), 202
+
 @app.errorhandler(404)
 def not_found(e):
     """Handle 404 errors."""
@@ -250,8 +575,15 @@ if __name__ == '__main__':
     print("Access the application at: http://localhost:5000")
     print("API Documentation:")
     print("  POST /api/predict - Predict product price")
+    print("  POST /api/predict/sweep - Price curve over discount ratios")
+    print("  POST /api/predict/batch - Bulk prediction (NDJSON in/out, streamed)")
+    print("  POST /api/predict/columnar - Bulk prediction (Arrow IPC / msgpack)")
+    print("  POST /api/explain - Prices with token importance")
     print("  GET  /api/categories - Get available categories")
-    print("  GET  /api/health - Health check")
+    print("  GET  /api/health - Health check (liveness, readiness, progress)")
+    print("  GET  /api/health/ready - Readiness probe")
+    print("  POST /api/admin/reload - Hot-reload the model (X-Admin-Token)")
+    print("  POST /api/admin/profile - Profile live predictions (X-Admin-Token)")
     print("\n" + "="*60 + "\n")
     
     # Run Flask app
@@ -1,40 +1,31 @@
 """
-Quick Start Flask App - Loads UI immediately, model on first prediction
+Quick Start Flask App - Loads UI immediately, model in the background
 """
 from flask import Flask, render_template, request, jsonify
 import traceback
 
+from config import SERVING_CONFIG
+from predictor_service import get_loader, process_memory, start_watching, get_prediction_cache
+from prediction_cache import cached_predict_price
+from metrics import instrument_flask
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'ecommerce-price-predictor-2026'
 app.config['JSON_SORT_KEYS'] = False
+instrument_flask(app)  # GET /metrics
+
+# Predictor loads in a background thread from process start
+predictor_loader = get_loader()
+
+# Hot reload on new checkpoints (gunicorn starts the watcher per worker instead)
+if SERVING_CONFIG['watch_models'] and not SERVING_CONFIG['preload']:
+    start_watching(predictor_loader)
 
-# Predictor loaded on first use
-_predictor = None
-_loading = False
+prediction_cache = get_prediction_cache()
 
 def load_predictor():
-    """Load predictor lazily."""
-    global _predictor, _loading
-    
-    if _predictor is not None:
-        return _predictor
-    
-    if _loading:
-        return None
-    
-    _loading = True
-    try:
-        print("🔄 Loading predictor (this may take 2-3 minutes on first run)...")
-        from predict import get_predictor
-        _predictor = get_predictor()
-        print("✅ Predictor loaded!")
-        return _predictor
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        traceback.print_exc()
-        return None
-    finally:
-        _loading = False
+    """Ready predictor, or None while loading (never blocks)."""
+    return predictor_loader.get()
 
 @app.route('/')
 def home():
@@ -81,10 +72,12 @@ def predict():
         predictor = load_predictor()
         
         if predictor is None:
+            status = predictor_loader.status()
             return jsonify({
                 'success': False,
-                'error': 'Model is loading... Please wait 2-3 minutes and try again.'
-            }), 503
+                'error': status['error'] or f"Model is loading ({status['progress'] * 100:.0f}%)... Please try again shortly.",
+                'status': status
+            }), 500 if status['state'] == 'failed' else 503
         
         # Get data
         data = request.get_json()
@@ -96,10 +89,16 @@ def predict():
                 'error': 'Product name and category are required'
             }), 400
         
+        # Normalize the way the cache key does, so the predictor sees the same input
+        product_name = data['product_name'].strip()
+        category = data['category'].strip().lower()
+        
         # Make prediction
-        price, conf = predictor.predict_price(
-            product_name=data['product_name'],
-            category=data['category'],
+        price, conf, details = cached_predict_price(
+            prediction_cache,
+            predictor,
+            product_name=product_name,
+            category=category,
             ratings=float(data.get('ratings', 4.0)),
             no_of_ratings=int(data.get('no_of_ratings', 100)),
             discount_ratio=float(data.get('discount_ratio', 0.0))
@@ -119,6 +118,7 @@ def predict():
                     'upper_formatted': f"₹{price * 1.15:,.2f}"
                 }
             },
+            'model_version': details['model_version'],
             'input': data
         })
     
@@ -146,13 +146,23 @@ def get_categories():
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    """Health check."""
+    """Health check (liveness, readiness, progress)."""
+    status = predictor_loader.status()
     return jsonify({
         'status': 'healthy',
-        'model_loaded': _predictor is not None,
-        'loading': _loading
+        'model_loaded': status['ready'],
+        'loading': status['state'] in ('loading', 'warming_up'),
+        **status,
+        'memory': process_memory(),
+        'prediction_cache': prediction_cache.stats()
     })
 
+@app.route('/api/health/ready', methods=['GET'])
+def ready():
+    """Readiness probe."""
+    status = predictor_loader.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("🛒 PredictCart - E-Commerce Price Predictor")
@@ -160,7 +170,7 @@ if __name__ == '__main__':
     print("\n✅ Server starting...")
     print("📱 Open: http://localhost:5000")
     print("⚡ UI loads instantly!")
-    print("🤖 Model loads on first prediction (2-3 min first time)")
+    print("🤖 Model loads in the background (see /api/health for progress)")
     print("\n" + "="*60 + "\n")
     
     app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
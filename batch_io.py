@@ -0,0 +1,427 @@
+"""
+Bulk prediction I/O for the web API.
+
+NDJSON streaming (POST /api/predict/batch): the request body is read
+incrementally, either as newline-delimited JSON objects or as a single JSON
+array. Rows are validated one by one, and each micro-batch
+(SERVING_CONFIG['batch_chunk_size'] rows) is scored with
+PricePredictor.predict_arrays and streamed back as NDJSON before the next one
+is read. Memory therefore stays bounded by one micro-batch plus one row,
+whatever the upload size. An invalid row produces an error line for that row
+only.
+
+Columnar binary (POST /api/predict/columnar) is for catalog-scale scoring.
+The body is an Arrow IPC stream of record batches, or a stream of msgpack maps
+of column name -> list. Each batch is validated with array operations, and its
+columns go straight into predict_arrays. The results come back in the same
+format, one batch per input batch. pyarrow and msgpack are optional and are
+imported on first use.
+"""
+import codecs
+import itertools
+import json
+import time
+
+import numpy as np
+
+from config import SERVING_CONFIG
+from metrics import timed
+
+READ_SIZE = 64 * 1024
+
+
+def validate_row(row):
+    """
+    Validate and normalize one prediction input.
+    
+    Returns:
+        (product_name, category, ratings, no_of_ratings, discount_ratio)
+    
+    Raises:
+        ValueError: with a message suitable for the client
+    """
+    if not isinstance(row, dict):
+        raise ValueError('Row must be a JSON object')
+    
+    for field in ('product_name', 'category'):
+        if not isinstance(row.get(field), str) or not row[field].strip():
+            raise ValueError(f'Missing required field: {field}')
+    
+    try:
+        ratings = float(row.get('ratings', 4.0))
+        no_of_ratings = int(row.get('no_of_ratings', 100))
+        discount_ratio = float(row.get('discount_ratio', 0.0))
+    except (TypeError, ValueError, OverflowError) as e:  # OverflowError: int(1e400)
+        raise ValueError(f'Invalid input: {e}')
+    
+    if not 0 <= ratings <= 5:
+        raise ValueError('Ratings must be between 0 and 5')
+    if no_of_ratings < 0:
+        raise ValueError('Number of ratings must be positive')
+    if not 0 <= discount_ratio <= 1:
+        raise ValueError('Discount ratio must be between 0 and 1')
+    
+    return row['product_name'].strip(), row['category'].strip().lower(), ratings, no_of_ratings, discount_ratio
+
+
+def _read_chunks(stream):
+    while True:
+        chunk = stream.read(READ_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_ndjson(chunks, buffer, max_row_bytes):
+    """NDJSON rows; an oversized or malformed line is an error for that row only."""
+    skipping = False
+    # The bytes read for format detection may already hold several lines (or the whole body)
+    chunks, buffer = itertools.chain([buffer], chunks), b''
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if skipping:
+                skipping = False  # Tail of an oversized row
+                continue
+            if len(line) > max_row_bytes:
+                yield None, ValueError(f'Row exceeds {max_row_bytes} bytes')
+            elif line.strip():
+                yield _decode_line(line)
+        if len(buffer) > max_row_bytes:
+            if not skipping:
+                yield None, ValueError(f'Row exceeds {max_row_bytes} bytes')
+            skipping, buffer = True, b''
+    if buffer.strip() and not skipping:
+        yield _decode_line(buffer)
+
+
+def _decode_line(line):
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, ValueError(f'Malformed JSON: {e}')
+
+
+def _iter_json_array(chunks, buffer, max_row_bytes):
+    """Elements of one top-level JSON array, decoded one at a time."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    text = utf8.decode(buffer).lstrip()[1:]  # Drop the opening '['
+    eof = False
+    
+    while True:
+        text = text.lstrip().lstrip(',').lstrip()
+        if text.startswith(']'):
+            return
+        if text:
+            try:
+                row, end = decoder.raw_decode(text)
+                # A value that ends exactly at the buffer edge may be truncated (e.g. a number)
+                if end < len(text) or eof:
+                    yield row, None
+                    text = text[end:]
+                    continue
+            except ValueError as e:
+                if eof or len(text) > max_row_bytes:
+                    # No way to resynchronize inside an array: report and stop
+                    yield None, ValueError(f'Malformed JSON array: {e}')
+                    return
+        elif eof:
+            yield None, ValueError('Malformed JSON array: missing closing bracket')
+            return
+        
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            text += utf8.decode(b'', final=True)
+        else:
+            text += utf8.decode(chunk)
+
+
+def iter_json_rows(stream, max_row_bytes=None):
+    """
+    Yield (row, error) pairs from an NDJSON or JSON-array body, reading incrementally.
+    
+    The format is detected from the first non-whitespace byte ('[' = array).
+    """
+    max_row_bytes = max_row_bytes or SERVING_CONFIG['batch_max_row_bytes']
+    chunks = _read_chunks(stream)
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip():
+            break
+    
+    if buffer.lstrip().startswith(b'['):
+        return _iter_json_array(chunks, buffer, max_row_bytes)
+    return _iter_ndjson(chunks, buffer, max_row_bytes)
+
+
+def _ndjson(record):
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n'
+
+
+def stream_predictions(predictor, rows, chunk_size=None):
+    """
+    Score (row, error) pairs in micro-batches and yield NDJSON result lines.
+    
+    Lines keep the input order: {"index", "id", "price", "confidence"} per row
+    (confidence in percent, as in /api/predict) or {"index", "id", "error"};
+    the last line is a {"done": true, ...} summary. All rows are scored by the
+    model version that was active when the stream started.
+    """
+    chunk_size = chunk_size or SERVING_CONFIG['batch_chunk_size']
+    models = predictor.models
+    start = time.perf_counter()
+    num_rows = num_errors = 0
+    pending = []  # (index, id, parsed inputs or None, error or None)
+    
+    def flush():
+        valid = [inputs for _, _, inputs, _ in pending if inputs is not None]
+        if valid:
+            result = predictor.predict_arrays(*zip(*valid), models=models)
+            prices = iter(result['prices'])
+            confidences = iter(result['confidence'])
+        with timed('serialize'):
+            lines = []
+            for index, row_id, inputs, error in pending:
+                if inputs is None:
+                    lines.append(_ndjson({'index': index, 'id': row_id, 'error': str(error)}))
+                else:
+                    lines.append(_ndjson({'index': index, 'id': row_id, 'price': round(float(next(prices)), 2),
+                                          'confidence': round(float(next(confidences)) * 100, 1)}))
+            pending.clear()
+            return ''.join(lines)
+    
+    try:
+        for index, (row, error) in enumerate(rows):
+            row_id = row.get('id') if isinstance(row, dict) else None
+            inputs = None
+            if error is None:
+                try:
+                    inputs = validate_row(row)
+                except ValueError as e:
+                    error = e
+            num_rows += 1
+            num_errors += inputs is None
+            pending.append((index, row_id, inputs, error))
+            if len(pending) >= chunk_size:
+                yield flush()
+        if pending:
+            yield flush()
+    except Exception as e:
+        # Headers are already sent; report the failure in-band
+        print(f"❌ Batch prediction error: {e}")
+        yield _ndjson({'done': False, 'rows': num_rows, 'error': 'Batch prediction failed'})
+        return
+    
+    yield _ndjson({
+        'done': True,
+        'rows': num_rows,
+        'errors': num_errors,
+        'model_version': models.version,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+    })
+
+
+# Columnar formats
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MIMETYPE = 'application/msgpack'
+COLUMN_DEFAULTS = {'ratings': 4.0, 'no_of_ratings': 100, 'discount_ratio': 0.0}
+NUMERIC_CHECKS = {  # (low, high, error) as in validate_row
+    'ratings': (0, 5, 'Ratings must be between 0 and 5'),
+    'no_of_ratings': (0, np.inf, 'Number of ratings must be positive'),
+    'discount_ratio': (0, 1, 'Discount ratio must be between 0 and 1')
+}
+
+
+def columnar_format(content_type):
+    """'arrow', 'msgpack' or None for a request Content-Type."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    # Only the IPC stream format: the file format needs a seekable body (pa.ipc.open_file)
+    if content_type in (ARROW_MIMETYPE, 'application/x-arrow'):
+        return 'arrow'
+    if content_type in (MSGPACK_MIMETYPE, 'application/x-msgpack', 'application/vnd.msgpack'):
+        return 'msgpack'
+    return None
+
+
+def _text_column(values, num_rows):
+    """Object array of stripped strings; None where the value is missing, empty or not a string."""
+    column = np.empty(num_rows, dtype=object)
+    column[:] = values
+    strip = np.frompyfunc(lambda v: v.strip() or None if isinstance(v, str) else None, 1, 1)
+    return strip(column) if num_rows else column
+
+
+def score_columns(predictor, columns, models, offset=0):
+    """
+    Validate and score one batch of input columns.
+    
+    Args:
+        columns: dict of column name -> sequence or ndarray ('product_name' and
+            'category' required; numeric columns fall back to the /api/predict
+            defaults; an optional 'id' column is passed through)
+        offset: index of the first row in the whole upload
+    
+    Returns:
+        dict of result columns: 'index', 'price' and 'confidence' (float64,
+        NaN for invalid rows, confidence in percent), 'error' (object, None for
+        valid rows) and 'id' when given
+    """
+    if 'product_name' not in columns or 'category' not in columns:
+        raise ValueError('Columns product_name and category are required')
+    num_rows = len(columns['product_name'])
+    errors = np.full(num_rows, None, dtype=object)
+    
+    def fail(mask, message):
+        errors[mask & np.equal(errors, None)] = message
+    
+    names = _text_column(columns['product_name'], num_rows)
+    categories = _text_column(columns['category'], num_rows)
+    fail(np.equal(names, None), 'Missing required field: product_name')
+    fail(np.equal(categories, None), 'Missing required field: category')
+    
+    numeric = {}
+    for name, default in COLUMN_DEFAULTS.items():
+        values = columns.get(name)
+        try:
+            values = np.full(num_rows, default, dtype=np.float64) if values is None else \
+                np.asarray(values, dtype=np.float64).reshape(num_rows)
+        except (TypeError, ValueError):
+            values = np.full(num_rows, np.nan)
+            fail(np.ones(num_rows, dtype=bool), f'Invalid {name} column')
+        low, high, message = NUMERIC_CHECKS[name]
+        fail(np.isinf(values), f'Invalid input: {name} must be finite')
+        fail(~((values >= low) & (values <= high)), message)  # NaN (null) fails too
+        numeric[name] = values
+    
+    valid = np.equal(errors, None)
+    prices = np.full(num_rows, np.nan)
+    confidence = np.full(num_rows, np.nan)
+    if valid.any():
+        lower = np.frompyfunc(str.lower, 1, 1)
+        result = predictor.predict_arrays(
+            names[valid].tolist(), lower(categories[valid]).tolist(),
+            numeric['ratings'][valid], np.floor(numeric['no_of_ratings'][valid]), numeric['discount_ratio'][valid],
+            models=models
+        )
+        prices[valid] = result['prices']
+        confidence[valid] = result['confidence'] * 100
+    
+    scored = {'index': np.arange(offset, offset + num_rows, dtype=np.int64), 'price': prices,
+              'confidence': confidence, 'error': errors}
+    if 'id' in columns:
+        scored['id'] = columns['id']
+    return scored
+
+
+def stream_arrow_predictions(predictor, stream):
+    """Read Arrow IPC record batches from `stream`, yield the Arrow IPC stream of results."""
+    import pyarrow as pa
+    
+    reader = pa.ipc.open_stream(stream)
+    models = predictor.models
+    sink = _ChunkSink()
+    writer = None
+    offset = 0
+    
+    for batch in reader:
+        columns = {name: batch.column(name) for name in batch.schema.names}
+        inputs = {name: column.to_numpy(zero_copy_only=False) for name, column in columns.items() if name != 'id'}
+        scored = score_columns(predictor, inputs, models, offset)
+        offset += batch.num_rows
+        
+        arrays = {
+            'index': pa.array(scored['index']),
+            'price': pa.array(scored['price'], from_pandas=True),  # NaN -> null
+            'confidence': pa.array(scored['confidence'], from_pandas=True),
+            'error': pa.array(scored['error'], type=pa.string())
+        }
+        if 'id' in columns:
+            arrays['id'] = columns['id']
+        result = pa.record_batch(list(arrays.values()), names=list(arrays))
+        
+        with timed('serialize'):
+            if writer is None:
+                schema = result.schema.with_metadata({'model_version': models.version})
+                writer = pa.ipc.new_stream(sink, schema)
+            writer.write_batch(result)
+        yield sink.drain()
+    
+    if writer is None:
+        # Empty upload: still answer with a valid (empty) stream
+        schema = pa.schema([('index', pa.int64()), ('price', pa.float64()), ('confidence', pa.float64()),
+                            ('error', pa.string())], metadata={'model_version': models.version})
+        writer = pa.ipc.new_stream(sink, schema)
+    writer.close()
+    yield sink.drain()
+
+
+def stream_msgpack_predictions(predictor, stream):
+    """Read msgpack column maps from `stream`, yield one msgpack result map per input map, then a summary map."""
+    import msgpack
+    
+    unpacker = msgpack.Unpacker(stream, raw=False, max_buffer_size=SERVING_CONFIG['columnar_max_batch_bytes'])
+    models = predictor.models
+    start = time.perf_counter()
+    offset = num_errors = 0
+    
+    for columns in unpacker:
+        if not isinstance(columns, dict):
+            raise ValueError('Each msgpack object must be a map of column name -> list')
+        scalars = sorted(str(name) for name, values in columns.items() if not isinstance(values, (list, tuple)))
+        if scalars:
+            # A string would otherwise be scored as one row per character
+            raise ValueError(f"Columns must be lists, got a scalar for: {', '.join(scalars)}")
+        if len({len(v) for v in columns.values()}) > 1:
+            raise ValueError('All columns of a batch must have the same length')
+        scored = score_columns(predictor, columns, models, offset)
+        num_rows = len(scored['index'])
+        offset += num_rows
+        valid = np.equal(scored['error'], None)
+        num_errors += int((~valid).sum())
+        
+        result = {
+            'index': scored['index'].tolist(),
+            'price': np.where(valid, scored['price'], None).tolist(),
+            'confidence': np.where(valid, scored['confidence'], None).tolist(),
+            'error': scored['error'].tolist()
+        }
+        if 'id' in scored:
+            result['id'] = list(scored['id'])
+        with timed('serialize'):
+            packed = msgpack.packb(result, use_bin_type=True)
+        yield packed
+    
+    yield msgpack.packb({
+        'done': True,
+        'rows': offset,
+        'errors': num_errors,
+        'model_version': models.version,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+    }, use_bin_type=True)
+
+
+class _ChunkSink:
+    """Writable file object that hands back what was written since the last drain."""
+    
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
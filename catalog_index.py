@@ -0,0 +1,329 @@
+"""
+Known-product index over the training catalog.
+
+Built from the cached training text embeddings (text_embedding_cache.npz,
+written by the preprocessing notebook together with prices). The embeddings
+are projected into the model's text-token space, and the index has two
+lookups:
+
+- exact: titles are normalized (lowercase, collapsed whitespace) and hashed
+  to 64 bits. A sorted hash array answers "is this a known product?" with a
+  binary search. On a hit the predictor uses the stored text token and skips
+  the text encoder, but only while it serves the text space the index was
+  built in (`text_space` in the metadata: BERT plus the text projection).
+- approximate: random-hyperplane LSH (SimHash) in NumPy. There are `num_tables`
+  tables of `num_bits`-bit codes, with multi-probe on the least confident bits
+  and exact cosine re-ranking of the candidates. It returns the nearest known
+  products and their prices as context.
+
+Build-time evaluation of recall@k and latency against brute force is stored
+with the index. Lookup latency and the fraction of traffic served from the
+index are reported by `stats()` (GET /api/health).
+
+Usage:
+    python catalog_index.py build [--cache PATH] [--output PATH] [--tables 8] [--bits 12]
+    python catalog_index.py evaluate [--index PATH] [--queries 500]
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from config import TEXT_ENCODER_CONFIG, SERVING_CONFIG
+
+INDEX_FORMAT = 'predictcart.catalog_index'
+
+
+def normalize_title(title):
+    """Exact-match key: lowercase with collapsed whitespace."""
+    return ' '.join(str(title).lower().split())
+
+
+def title_hash(title):
+    """Signed 64-bit hash of the normalized title (stable across processes)."""
+    digest = hashlib.blake2b(normalize_title(title).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def _normalize_rows(x):
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+class CatalogIndex:
+    """Exact title hash + SimHash LSH over known products' text tokens."""
+    
+    def __init__(self, embeddings, prices, titles, planes, metadata=None, categories=None):
+        self.embeddings = _normalize_rows(embeddings)  # Unit vectors for cosine
+        self.tokens = np.asarray(embeddings, dtype=np.float32)  # Unnormalized text tokens for the model
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.titles = list(titles)
+        self.categories = None if categories is None else list(categories)
+        self.planes = np.asarray(planes, dtype=np.float32)  # [tables, d_model, bits]
+        self.metadata = metadata or {}
+        
+        hashes = np.array([title_hash(t) for t in self.titles], dtype=np.int64)
+        self._hash_order = np.argsort(hashes, kind='stable')  # First occurrence wins on duplicates
+        self._sorted_hashes = hashes[self._hash_order]
+        
+        codes = self._codes(self.embeddings)  # [tables, N]
+        self._table_order = np.argsort(codes, axis=1, kind='stable')
+        self._sorted_codes = np.take_along_axis(codes, self._table_order, axis=1)
+        
+        self._lock = threading.Lock()
+        self.reset_stats()
+    
+    def reset_stats(self):
+        with self._lock:
+            self.lookups = self.exact_hits = self.ann_queries = 0
+            self.exact_seconds = self.ann_seconds = 0.0
+    
+    def __len__(self):
+        return len(self.prices)
+    
+    @property
+    def text_space(self):
+        """text_encoders.text_space of the stored tokens (None for indexes built before it was recorded)."""
+        return self.metadata.get('text_space')
+    
+    @property
+    def num_tables(self):
+        return self.planes.shape[0]
+    
+    @property
+    def num_bits(self):
+        return self.planes.shape[2]
+    
+    def _projections(self, x):
+        return np.einsum('nd,tdb->tnb', x, self.planes)
+    
+    def _codes(self, x, projections=None):
+        projections = self._projections(x) if projections is None else projections
+        weights = (1 << np.arange(self.num_bits, dtype=np.int64))
+        return ((projections > 0) * weights).sum(axis=-1)  # [tables, n]
+    
+    def exact(self, title):
+        """Row of a known product with this (normalized) title, or None."""
+        start = time.perf_counter()
+        key = title_hash(title)
+        position = np.searchsorted(self._sorted_hashes, key)
+        row = None
+        if position < len(self._sorted_hashes) and self._sorted_hashes[position] == key:
+            row = int(self._hash_order[position])
+        with self._lock:
+            self.lookups += 1
+            self.exact_hits += row is not None
+            self.exact_seconds += time.perf_counter() - start
+        return row
+    
+    def candidates(self, query, probes=2):
+        """Rows sharing a bucket with `query` in any table, probing the `probes` least certain bits too."""
+        projections = self._projections(query[None, :])[:, 0]  # [tables, bits]
+        codes = self._codes(None, projections[:, None, :])[:, 0]
+        # Multi-probe: also visit buckets with one of the lowest-margin bits flipped
+        flips = np.argsort(np.abs(projections), axis=1)[:, :probes]
+        found = []
+        for table in range(self.num_tables):
+            sorted_codes = self._sorted_codes[table]
+            for code in [codes[table]] + [codes[table] ^ (1 << int(bit)) for bit in flips[table]]:
+                lo = np.searchsorted(sorted_codes, code, side='left')
+                hi = np.searchsorted(sorted_codes, code, side='right')
+                found.append(self._table_order[table, lo:hi])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+    
+    def search(self, query, k=5, probes=2, track=True):
+        """
+        Approximate k nearest known products by cosine similarity.
+        
+        Returns:
+            (rows, similarities), best first
+        """
+        start = time.perf_counter()
+        query = _normalize_rows(query)
+        rows = self.candidates(query, probes)
+        similarities = self.embeddings[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-similarities, k)[:k]
+            rows, similarities = rows[top], similarities[top]
+        order = np.argsort(-similarities)
+        if track:
+            with self._lock:
+                self.ann_queries += 1
+                self.ann_seconds += time.perf_counter() - start
+        return rows[order], similarities[order]
+    
+    def brute_force(self, query, k=5):
+        """Exact k nearest neighbours (reference for recall)."""
+        similarities = self.embeddings @ _normalize_rows(query)
+        top = np.argpartition(-similarities, k)[:k] if len(similarities) > k else np.arange(len(similarities))
+        order = np.argsort(-similarities[top])
+        return top[order], similarities[top][order]
+    
+    def neighbours(self, query, k=5, probes=2):
+        """Nearest known products as [{'title', 'price', 'similarity'}]."""
+        rows, similarities = self.search(query, k, probes)
+        return [{'title': self.titles[row], 'price': round(float(self.prices[row]), 2),
+                 'similarity': round(float(sim), 4)} for row, sim in zip(rows, similarities)]
+    
+    def stats(self):
+        """Size, hit rate, lookup latency and build-time recall for health endpoints."""
+        with self._lock:
+            return {
+                'size': len(self),
+                'lookups': self.lookups,
+                'exact_hits': self.exact_hits,
+                'served_from_index': round(self.exact_hits / self.lookups, 4) if self.lookups else None,
+                'exact_lookup_us': round(self.exact_seconds / self.lookups * 1e6, 1) if self.lookups else None,
+                'ann_queries': self.ann_queries,
+                'ann_lookup_ms': round(self.ann_seconds / self.ann_queries * 1000, 3) if self.ann_queries else None,
+                'text_space': self.text_space,
+                'evaluation': self.metadata.get('evaluation')
+            }
+    
+    def save(self, path):
+        encoded = [t.encode('utf-8') for t in self.titles]
+        offsets = np.cumsum([0] + [len(t) for t in encoded]).astype(np.int64)
+        arrays = {
+            'tokens': self.tokens,
+            'prices': self.prices,
+            'planes': self.planes,
+            'title_bytes': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'title_offsets': offsets,
+            'metadata': np.frombuffer(json.dumps({'format': INDEX_FORMAT, **self.metadata}).encode(), dtype=np.uint8)
+        }
+        if self.categories is not None:
+            arrays['categories'] = np.asarray(self.categories, dtype=str)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(path + '.tmp', path)
+        return path
+    
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        metadata = json.loads(data['metadata'].tobytes().decode())
+        if metadata.get('format') != INDEX_FORMAT:
+            raise ValueError(f"{path} is not a catalog index")
+        title_bytes, offsets = data['title_bytes'].tobytes(), data['title_offsets']
+        titles = [title_bytes[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+        categories = data['categories'].tolist() if 'categories' in data.files else None
+        return cls(data['tokens'], data['prices'], titles, data['planes'], metadata, categories)
+
+
+def evaluate(index, num_queries=500, k=5, noise=0.1, probes=2, seed=0):
+    """
+    Recall@k of the LSH search against brute force, plus latency.
+    
+    Queries are catalog embeddings with Gaussian noise (relative scale
+    `noise`), standing in for near-duplicate titles.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(index), size=min(num_queries, len(index)), replace=False)
+    queries = index.embeddings[rows]
+    queries = queries + rng.normal(scale=noise / np.sqrt(queries.shape[1]), size=queries.shape).astype(np.float32)
+    
+    recalls, ann_ms, brute_ms, candidates = [], [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        found, _ = index.search(query, k, probes, track=False)
+        ann_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        truth, _ = index.brute_force(query, k)
+        brute_ms.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(found.tolist()) & set(truth.tolist())) / len(truth))
+        candidates.append(len(index.candidates(_normalize_rows(query), probes)))
+    
+    return {
+        f'recall@{k}': round(float(np.mean(recalls)), 4),
+        'queries': len(queries),
+        'noise': noise,
+        'probes': probes,
+        'mean_candidates': round(float(np.mean(candidates)), 1),
+        'ann_ms_p50': round(float(np.percentile(ann_ms, 50)), 3),
+        'ann_ms_p95': round(float(np.percentile(ann_ms, 95)), 3),
+        'brute_force_ms_p50': round(float(np.percentile(brute_ms, 50)), 3)
+    }
+
+
+def build_catalog_index(cache_path=None, output_path=None, num_tables=8, num_bits=12, seed=0):
+    """
+    Build the index from the cached training embeddings and save it.
+    
+    The cache must hold 'texts', 'embeddings' and 'prices' (written by the
+    preprocessing notebook); embeddings go through the fixed text projection
+    so they live in the same space as PricePredictor.encode_text. That space
+    is recorded as 'text_space', so the predictor can tell when it no longer
+    serves it (another backend, or a bundle with a different projection).
+    """
+    from text_encoders import BertTextEncoder, load_projected_cache, load_text_projection, text_space
+    
+    cache_path = cache_path or TEXT_ENCODER_CONFIG['embedding_cache_path']
+    output_path = output_path or SERVING_CONFIG['catalog_index_path']
+    cache = np.load(cache_path, allow_pickle=True)
+    if 'prices' not in cache.files:
+        raise ValueError(f"{cache_path} has no prices; re-run the preprocessing notebook to rebuild the cache")
+    
+    titles, tokens = load_projected_cache(cache_path)
+    tokens = tokens.numpy()
+    planes = np.random.default_rng(seed).standard_normal((num_tables, tokens.shape[1], num_bits)).astype(np.float32)
+    categories = cache['categories'].tolist() if 'categories' in cache.files else None
+    projection = load_text_projection(text_dim=cache['embeddings'].shape[1])
+    
+    index = CatalogIndex(tokens, cache['prices'], titles, planes, {
+        'source': os.path.basename(cache_path),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'text_space': text_space(BertTextEncoder.name, BertTextEncoder.version, projection),
+        'num_tables': num_tables,
+        'num_bits': num_bits
+    }, categories)
+    index.metadata['evaluation'] = evaluate(index)
+    index.save(output_path)
+    
+    evaluation = index.metadata['evaluation']
+    print(f"🗂️ Catalog index: {len(index):,} products, {num_tables} tables × {num_bits} bits → {output_path}")
+    print(f"   recall@5 {evaluation['recall@5']:.3f} | ANN p50 {evaluation['ann_ms_p50']:.2f} ms "
+          f"(brute force {evaluation['brute_force_ms_p50']:.2f} ms) | {evaluation['mean_candidates']:.0f} candidates")
+    return index
+
+
+def load_catalog_index(path=None):
+    """The serving index, or None if it has not been built."""
+    path = path or SERVING_CONFIG['catalog_index_path']
+    if not os.path.exists(path):
+        return None
+    try:
+        index = CatalogIndex.load(path)
+        print(f"   ✅ Catalog index loaded ({len(index):,} known products)")
+        return index
+    except Exception as e:
+        print(f"   ⚠️ Could not load catalog index: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build or evaluate the known-product catalog index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    build_parser = subparsers.add_parser('build', help='Build from the cached training embeddings')
+    build_parser.add_argument('--cache', help='text_embedding_cache.npz (with prices)')
+    build_parser.add_argument('--output', help='Index path')
+    build_parser.add_argument('--tables', type=int, default=8)
+    build_parser.add_argument('--bits', type=int, default=12)
+    
+    eval_parser = subparsers.add_parser('evaluate', help='Recall@k and latency against brute force')
+    eval_parser.add_argument('--index', help='Index path')
+    eval_parser.add_argument('--queries', type=int, default=500)
+    eval_parser.add_argument('--noise', type=float, default=0.1)
+    eval_parser.add_argument('--probes', type=int, default=2)
+    args = parser.parse_args()
+    
+    if args.command == 'build':
+        build_catalog_index(args.cache, args.output, args.tables, args.bits)
+    else:
+        index = CatalogIndex.load(args.index or SERVING_CONFIG['catalog_index_path'])
+        print(json.dumps(evaluate(index, args.queries, noise=args.noise, probes=args.probes), indent=2))
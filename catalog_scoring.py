@@ -0,0 +1,245 @@
+"""
+Offline catalog scoring: CSV / Parquet in, chunked result files out.
+
+    python predict.py score catalog.csv --output scores/ --workers 4
+
+The input is read in chunks of `chunk_size` rows. The chunks are scored in
+parallel by worker processes, each holding its own PricePredictor with
+`threads` torch threads (default: cores / workers). Each chunk is validated
+and scored like /api/predict/columnar (batch_io.score_columns).
+
+Each chunk is written to part-NNNNN.{csv,parquet} under the output directory
+(aside, then renamed). manifest.json records the completed chunks after each
+one finishes. Running the same command again resumes: chunks already in the
+manifest (with their part file present) are skipped. The manifest also pins the
+input file, chunk size and model version, so a resumed run never mixes models
+or chunk boundaries.
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+MANIFEST_FILE = 'manifest.json'
+INPUT_COLUMNS = ('product_name', 'category', 'ratings', 'no_of_ratings', 'discount_ratio')
+NUMERIC_COLUMNS = ('ratings', 'no_of_ratings', 'discount_ratio')
+
+_worker_predictor = None
+
+
+def input_format(path):
+    return 'parquet' if path.lower().endswith(('.parquet', '.pq')) else 'csv'
+
+
+def iter_chunks(path, chunk_size, columns=None):
+    """
+    Yield DataFrames of up to `chunk_size` rows from a CSV or Parquet file.
+    
+    Args:
+        columns: optional {model column: file column} renames (e.g. product_name='name')
+    """
+    import pandas as pd
+    
+    columns = columns or {}
+    rename = {source: target for target, source in columns.items()}
+    
+    if input_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+        chunks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size))
+    else:
+        chunks = pd.read_csv(path, chunksize=chunk_size)
+    
+    for chunk in chunks:
+        chunk = chunk.rename(columns=rename)
+        for name in NUMERIC_COLUMNS:
+            if name in chunk and not pd.api.types.is_numeric_dtype(chunk[name]):
+                # Catalog dumps often carry "1,234" counts; unparsable values become row errors
+                chunk[name] = pd.to_numeric(chunk[name].astype(str).str.replace(',', ''), errors='coerce')
+        yield chunk
+
+
+def _init_worker(threads):
+    """Process initializer: cap torch threads and load one predictor per worker."""
+    global _worker_predictor
+    import torch
+    from predict import PricePredictor
+    
+    torch.set_num_threads(threads)
+    _worker_predictor = PricePredictor()
+
+
+def _score_chunk(chunk_index, offset, columns, output_path, id_column):
+    """Score one chunk in a worker and write its part file; returns chunk stats."""
+    import pandas as pd
+    from batch_io import score_columns
+    
+    start = time.perf_counter()
+    predictor = _worker_predictor
+    models = predictor.models
+    scored = score_columns(predictor, columns, models, offset)
+    
+    result = pd.DataFrame({
+        'index': scored['index'],
+        'price': scored['price'],
+        'confidence': scored['confidence'],
+        'error': scored['error']
+    })
+    if id_column in columns:
+        result.insert(0, id_column, columns[id_column])
+    
+    tmp_path = output_path + '.tmp'
+    if output_path.endswith('.parquet'):
+        result.to_parquet(tmp_path, index=False)
+    else:
+        result.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    
+    return {
+        'chunk': chunk_index,
+        'file': os.path.basename(output_path),
+        'rows': len(result),
+        'errors': int(result['error'].notna().sum()),
+        'model_version': models.version,
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _input_fingerprint(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def score_catalog(input_path, output_dir, workers=None, chunk_size=10000, threads=None,
+                  columns=None, id_column='id', restart=False):
+    """
+    Score a catalog file into chunked outputs, resuming a previous run when possible.
+    
+    Args:
+        workers: worker processes (default: CPU count)
+        threads: torch threads per worker (default: cores / workers)
+        columns: {model column: file column} renames
+        id_column: input column copied to the outputs when present
+        restart: ignore an existing manifest and rescore everything
+    
+    Returns:
+        the final manifest dict
+    """
+    cpu_count = multiprocessing.cpu_count()
+    workers = workers or cpu_count
+    threads = threads or max(1, cpu_count // workers)
+    os.makedirs(output_dir, exist_ok=True)
+    extension = input_format(input_path)
+    
+    settings = {'input': _input_fingerprint(input_path), 'chunk_size': chunk_size, 'columns': columns or {}}
+    manifest = None if restart else load_manifest(output_dir)
+    if manifest is not None and {k: manifest.get(k) for k in settings} != settings:
+        raise ValueError(f"{output_dir} holds a run for a different input or chunk size; use --restart to rescore")
+    if manifest is None:
+        manifest = {**settings, 'model_version': None, 'chunks': {}, 'complete': False}
+    
+    # Chunks are only trusted if their part file made it to disk
+    completed = {int(k): v for k, v in manifest['chunks'].items()
+                 if os.path.exists(os.path.join(output_dir, v['file']))}
+    manifest['chunks'] = {str(k): v for k, v in sorted(completed.items())}
+    manifest['complete'] = False
+    _save_manifest(output_dir, manifest)
+    if completed:
+        print(f"⏩ Resuming: {len(completed)} chunks ({sum(c['rows'] for c in completed.values()):,} rows) already scored")
+    
+    print(f"🧮 Scoring {input_path} → {output_dir} ({workers} workers × {threads} threads, {chunk_size:,} rows/chunk)")
+    start = time.perf_counter()
+    scored_rows = 0
+    context = multiprocessing.get_context('spawn')  # Fresh interpreters: no forked torch/OpenMP state
+    
+    def record(future):
+        nonlocal scored_rows
+        stats = future.result()
+        if manifest['model_version'] is None:
+            manifest['model_version'] = stats['model_version']
+        elif stats['model_version'] != manifest['model_version']:
+            raise RuntimeError(f"Model changed during the run ({manifest['model_version']} → "
+                               f"{stats['model_version']}); use --restart to rescore with the new model")
+        manifest['chunks'][str(stats['chunk'])] = stats
+        _save_manifest(output_dir, manifest)
+        scored_rows += stats['rows']
+        rate = scored_rows / max(time.perf_counter() - start, 1e-9)
+        print(f"   ✅ chunk {stats['chunk']:5d}: {stats['rows']:,} rows, {stats['errors']} errors "
+              f"({scored_rows:,} rows this run, {rate:,.0f} rows/s)")
+    
+    def record_done(done):
+        # Keep every finished chunk before surfacing a failed one, so a rerun resumes after them
+        failed = {future for future in done if future.exception() is not None}
+        for future in done - failed:
+            record(future)
+        for future in failed:
+            future.result()
+    
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(threads,)) as executor:
+        in_flight = set()
+        try:
+            offset = 0
+            for chunk_index, chunk in enumerate(iter_chunks(input_path, chunk_size, columns)):
+                chunk_offset, offset = offset, offset + len(chunk)
+                if chunk_index in completed:
+                    continue
+                
+                # Bound memory: at most two chunks queued per worker
+                while len(in_flight) >= 2 * workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    record_done(done)
+                
+                chunk_columns = {name: chunk[name].to_numpy() for name in chunk.columns
+                                 if name in INPUT_COLUMNS or name == id_column}
+                output_path = os.path.join(output_dir, f'part-{chunk_index:05d}.{extension}')
+                in_flight.add(executor.submit(_score_chunk, chunk_index, chunk_offset, chunk_columns,
+                                              output_path, id_column))
+            
+            record_done(wait(in_flight).done)
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            print(f"⚠️ Scoring stopped; rerun the same command to resume "
+                  f"({len(manifest['chunks'])} chunks recorded in {MANIFEST_FILE})")
+            raise
+    
+    chunks = manifest['chunks'].values()
+    manifest['complete'] = True
+    manifest['rows'] = sum(c['rows'] for c in chunks)
+    manifest['errors'] = sum(c['errors'] for c in chunks)
+    _save_manifest(output_dir, manifest)
+    
+    elapsed = time.perf_counter() - start
+    print(f"🎉 Scored {manifest['rows']:,} rows in {len(manifest['chunks'])} chunks "
+          f"({manifest['errors']:,} errors, {scored_rows:,} this run in {elapsed:.1f}s)")
+    return manifest
+
+
+def read_scores(output_dir):
+    """Concatenate the part files of a finished run into one DataFrame (ordered by index)."""
+    import pandas as pd
+    
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No {MANIFEST_FILE} in {output_dir}")
+    parts = []
+    for chunk in sorted(manifest['chunks'].values(), key=lambda c: c['chunk']):
+        path = os.path.join(output_dir, chunk['file'])
+        parts.append(pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path))
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
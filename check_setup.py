@@ -6,6 +6,7 @@ Run this to quickly test if everything is set up correctly.
 
 import os
 import sys
+from importlib.util import find_spec
 
 def check_environment():
     """Check if the environment is properly set up."""
@@ -32,27 +33,36 @@ def check_environment():
         'sklearn'
     ]
     
+    # find_spec locates packages without importing them (torch/transformers take seconds)
     for package in required_packages:
-        try:
-            __import__(package)
+        if find_spec(package) is not None:
             print(f"✅ Package: {package}")
-        except ImportError:
+        else:
             print(f"❌ Package: {package} (not installed)")
             issues.append(f"Install {package}")
     
     # Check required files
     required_files = {
         'Model': 'simple_models/best_model.pth',
-        'Transform Info': 'Transformer_Ready_Input/transform_info.pkl',
-        'Feature Prep': 'Transformer_Ready_Input/feature_prep.pkl',
+        'Transform Info': 'Transformer_Ready_Input/transform_info.json',
+        'Feature Prep': 'Transformer_Ready_Input/feature_prep.json',
         'App': 'app.py',
         'Predictor': 'predict.py',
         'Transformer': 'transformer.py'
     }
     
+    # Legacy pickles still load, just more slowly
+    legacy_files = {
+        'Transformer_Ready_Input/transform_info.json': 'Transformer_Ready_Input/transform_info.pkl',
+        'Transformer_Ready_Input/feature_prep.json': 'Transformer_Ready_Input/feature_prep.pkl'
+    }
+    
     for name, filepath in required_files.items():
         if os.path.exists(filepath):
             print(f"✅ {name}: {filepath}")
+        elif filepath in legacy_files and os.path.exists(legacy_files[filepath]):
+            print(f"⚠️  {name}: {legacy_files[filepath]} (legacy pickle; convert with "
+                  f"`python preprocessing_utils.py convert Transformer_Ready_Input`)")
         else:
             print(f"❌ {name}: {filepath} (missing)")
             issues.append(f"Missing {filepath}")
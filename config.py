@@ -29,7 +29,123 @@ TRAINING_CONFIG = {
     'num_epochs': 30,
     'weight_decay': 1e-5,       # Light regularization
     'patience': 8,
-    'min_lr': 1e-6
+    'min_lr': 1e-6,
+    # On-the-fly Gaussian noise on the numeric token, redrawn for every batch
+    'noise_augmentation': {
+        'enabled': False,
+        'noise_level': 0.05,    # Std in standardized feature units (before the numeric projection)
+        'token_index': 2,       # 0=text, 1=category, 2=numeric
+        'seed': 42              # Epoch e uses seed + e
+    }
+}
+
+# Feature preparation (PREPROCESSING_PIPELINE / INPUT_PREPARATION notebooks) - 'index'
+# stores int32 category ids and builds the category token with an embedding gather;
+# 'onehot' keeps the dense one-hot matrices
+FEATURE_CONFIG = {
+    'category_encoding': 'index',
+    'token_build_batch_size': 4096
+}
+
+# Evaluation - single-pass streaming metrics
+EVALUATION_CONFIG = {
+    'batch_size': 64,
+    'price_bins': 1500,            # Fine log-price histogram used for price deciles
+    'num_price_quantiles': 10,     # Deciles
+    'plot_mode': 'auto',           # 'auto' | 'density' | 'scatter'
+    'scatter_threshold': 20000,    # 'auto' draws a scatter only up to this many points
+    'density_bins': 300,           # Log-price bins per axis for the density plot
+    'plot_dpi': 300,
+    'dump_predictions': False,     # Write predictions to disk in chunks
+    'predictions_chunk_size': 100000,
+    'predictions_dir': os.path.join(RESULTS_PATH, 'predictions')
+}
+
+# Text encoder backend (see text_encoders.py) used for training data generation and
+# serving: 'bert' (bert-base-uncased CLS), 'distilled' (bag-of-subwords student) or
+# 'hashing' (n-gram TF-IDF + learned projection, no transformer model needed).
+# 'bert' output goes through the fixed 768 -> d_model text projection.
+TEXT_ENCODER_CONFIG = {
+    'backend': os.environ.get('PREDICTCART_TEXT_ENCODER', 'bert'),  # Env so spawned workers agree
+    'bert_model_name': 'bert-base-uncased',
+    'text_projection_path': os.path.join(MODEL_SAVE_PATH, 'text_projection.pth'),
+    'distilled_model_path': os.path.join(MODEL_SAVE_PATH, 'text_encoder_distilled.pth'),
+    'hashing_model_path': os.path.join(MODEL_SAVE_PATH, 'text_encoder_hashing.pth'),
+    'hashing_num_features': 2 ** 16,
+    'hashing_learning_rate': 1e-2,
+    'embedding_cache_path': os.path.join(DATA_PATH, 'text_embedding_cache.npz'),
+    'tokenizer_vocab_path': None,     # vocab.txt; None searches the local HF cache
+    'max_length': 128,
+    'embedding_dim': 256,
+    'hidden_dim': 256,
+    'epochs': 10,
+    'batch_size': 256,
+    'learning_rate': 1e-3
+}
+
+# Distillation - small student trained on the teacher's predictions, used as a
+# latency tier when a request's budget would be missed by the full path
+DISTILLATION_CONFIG = {
+    'student_model_path': os.path.join(MODEL_SAVE_PATH, 'student_model.pth'),
+    'teacher_model_path': os.path.join(MODEL_SAVE_PATH, 'best_model.pth'),
+    'num_epochs': 15,
+    'learning_rate': 1e-3,
+    'teacher_weight': 0.7,        # Loss target = w * teacher + (1 - w) * true price
+    'use_text_token': False,      # False: student skips the text token, so no BERT call
+    'latency_ewma_alpha': 0.2,    # Smoothing for per-tier latency estimates
+    'probe_interval_s': 5.0,      # Re-measure the full path after this long on the student
+    'results_path': os.path.join(RESULTS_PATH, 'distillation_results.json')
+}
+
+# Monte-Carlo dropout price intervals (uncertainty.py)
+UNCERTAINTY_CONFIG = {
+    'num_samples': int(os.environ.get('PREDICTCART_MC_SAMPLES', '32')),  # K stochastic passes per product
+    'min_samples': 8,
+    'max_rows_per_request': 2048,     # Cost budget: K is lowered so K x products fits
+    'max_rows': 4096,                 # Rows per forward when sampling large batches (calibration)
+    'levels': [0.5, 0.8, 0.9, 0.95],  # Interval coverages that get a calibrated scale
+    'default_level': 0.8,
+    'min_std_log': 0.02,              # Spread floor (clamped predictions can have none)
+    'calibration_path': os.path.join(MODEL_SAVE_PATH, 'uncertainty_calibration.json')
+}
+
+# Web serving - predictor is loaded and warmed up in a background thread at start
+SERVING_CONFIG = {
+    'warmup_batch_sizes': [1, 8, 32, 64],
+    # Pre-fork mode (gunicorn.conf.py): load once in the master, share weights with workers
+    'preload': os.environ.get('PREDICTCART_PRELOAD', '0') == '1',
+    # Start loading at app import; with 0 the first API request starts it instead
+    'autoload': os.environ.get('PREDICTCART_AUTOLOAD', '1') == '1',
+    # Versioned mmap'd bundle (serving_bundle.py build); used instead of the pickles when present
+    'bundle_path': os.path.join(MODEL_SAVE_PATH, 'serving_bundle'),
+    # Hot reload: poll the bundle manifest / best_model.pth and swap in new weights
+    'watch_models': os.environ.get('PREDICTCART_WATCH_MODELS', '0') == '1',
+    'reload_poll_seconds': float(os.environ.get('PREDICTCART_RELOAD_POLL', '10')),
+    # Token for POST /api/admin/reload (endpoint disabled when unset)
+    'admin_token': os.environ.get('PREDICTCART_ADMIN_TOKEN'),
+    # Largest ratings x discount grid accepted by /api/predict/sweep (one batch)
+    'sweep_max_points': 1024,
+    # Most products explained in one /api/explain request (a single forward pass)
+    'explain_max_products': 64,
+    # Bulk endpoints: rows per model micro-batch, and max bytes of one NDJSON row
+    'batch_chunk_size': 256,
+    'batch_max_row_bytes': 64 * 1024,
+    # Largest single msgpack column map accepted by /api/predict/columnar
+    'columnar_max_batch_bytes': 256 * 1024 ** 2,
+    # /api/predict response cache (prediction_cache.py); size 0 disables it
+    'prediction_cache_size': int(os.environ.get('PREDICTCART_CACHE_SIZE', '10000')),
+    'prediction_cache_ttl_seconds': 300,
+    # Known-product index (catalog_index.py build); used by the predictor when present
+    'catalog_index_path': os.path.join(MODEL_SAVE_PATH, 'catalog_index.npz'),
+    'catalog_neighbours': 0,          # Known products returned by /api/predict (opt-in per request: each adds an LSH search)
+    'catalog_max_neighbours': 20,
+    # Per-stage latency histograms and counters on GET /metrics (metrics.py)
+    'metrics_enabled': os.environ.get('PREDICTCART_METRICS', '1') == '1',
+    # On-demand profiling via POST /api/admin/profile (profiling.py): torch traces / collapsed stacks
+    'profile_dir': os.environ.get('PREDICTCART_PROFILE_DIR', os.path.join(RESULTS_PATH, 'profiles')),
+    'profile_max_predictions': 100,
+    'profile_max_seconds': 300,
+    'profile_interval_ms': 10
 }
 
 # 🆕 Quantization configuration
@@ -50,4 +166,5 @@ MODEL_TYPES = {
 # Default model type
 DEFAULT_MODEL_TYPE = 'original'  # Change to 'quantized' to use quantized model by default
 
-print("✅ Simple configuration loaded")
\ No newline at end of file
+if __name__ == "__main__":
+    print("✅ Simple configuration loaded")
\ No newline at end of file
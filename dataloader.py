@@ -10,12 +10,15 @@ import os
 class PricePredictionDataset(Dataset):
     """Simple dataset for price prediction."""
     
-    def __init__(self, token_sequences, targets, split_name="train"):
+    def __init__(self, token_sequences, targets, split_name="train", main_category=None):
         # Convert to tensors and validate
         self.token_sequences = torch.tensor(token_sequences, dtype=torch.float32)
         self.targets = torch.tensor(targets, dtype=torch.float32)
         self.split_name = split_name
         
+        # Optional main category ids, kept aligned with samples for per-category evaluation
+        self.main_category = None if main_category is None else np.asarray(main_category)
+        
         # Basic validation
         assert len(self.token_sequences) == len(self.targets), "Length mismatch!"
         assert self.token_sequences.shape[1] == 3, f"Expected 3 tokens, got {self.token_sequences.shape[1]}"
@@ -40,6 +43,8 @@ class PricePredictionDataset(Dataset):
             
             self.token_sequences = self.token_sequences[valid_mask]
             self.targets = self.targets[valid_mask]
+            if self.main_category is not None:
+                self.main_category = self.main_category[valid_mask.numpy()]
     
     def __len__(self):
         return len(self.targets)
@@ -47,6 +52,94 @@ class PricePredictionDataset(Dataset):
     def __getitem__(self, idx):
         return self.token_sequences[idx], self.targets[idx]
 
+class NumericNoiseAugmenter:
+    """
+    Vectorized Gaussian noise augmentation applied per training batch.
+    
+    Replaces materializing noisy copies of the numeric features: each batch gets a
+    fresh draw, the stream is reproducible per epoch (seed + epoch), and nothing
+    extra is stored.
+    
+    The numeric token is numeric_projection(x) + positional encoding, linear in the
+    6 standardized features x. With the projection weight W used to build the
+    tokens, noise e ~ N(0, noise_level^2) is drawn per feature and e @ W.T is added
+    to the token: exactly the same as adding e to x before projection. Without W
+    (tokens from an older notebook run) the fallback adds independent noise per
+    token dimension scaled by the token's std, which only approximates that.
+    """
+    
+    def __init__(self, projection_weight=None, token_std=None, noise_level=0.05, token_index=2, seed=42):
+        if (projection_weight is None) == (token_std is None):
+            raise ValueError("Pass exactly one of projection_weight or token_std")
+        # [num_features, d_model] feature noise -> token noise, or a [d_model] per-dimension scale
+        if projection_weight is not None:
+            self.mix = torch.as_tensor(projection_weight, dtype=torch.float32).t() * noise_level
+        else:
+            self.mix = torch.as_tensor(token_std, dtype=torch.float32) * noise_level
+        self.in_feature_space = projection_weight is not None
+        self.noise_level = noise_level
+        self.token_index = token_index
+        self.seed = seed
+        self.epoch = 0
+        self._generators = {}
+        self._mixes = {}
+    
+    @classmethod
+    def from_dataset(cls, dataset, noise_level=0.05, token_index=2, seed=42, projection_weight=None, **_):
+        """Feature-space augmenter if the projection weight is known, else one from token statistics."""
+        if projection_weight is not None:
+            return cls(projection_weight=projection_weight, noise_level=noise_level,
+                       token_index=token_index, seed=seed)
+        tokens = dataset.token_sequences[:, token_index].double()
+        return cls(token_std=tokens.std(dim=0).float(), noise_level=noise_level,
+                   token_index=token_index, seed=seed)
+    
+    def set_epoch(self, epoch):
+        """Reseed so that every epoch sees a different, reproducible noise stream."""
+        self.epoch = epoch
+        for generator in self._generators.values():
+            generator.manual_seed(self.seed + epoch)
+    
+    def _state_for(self, device):
+        key = str(device)
+        if key not in self._generators:
+            generator = torch.Generator(device=device)
+            generator.manual_seed(self.seed + self.epoch)
+            self._generators[key] = generator
+            self._mixes[key] = self.mix.to(device)
+        return self._generators[key], self._mixes[key]
+    
+    def __call__(self, token_sequences):
+        if self.noise_level <= 0:
+            return token_sequences
+        
+        generator, mix = self._state_for(token_sequences.device)
+        noise = torch.randn(token_sequences.shape[0], mix.shape[0] if self.in_feature_space else mix.shape[-1],
+                            generator=generator, device=token_sequences.device)
+        noise = noise @ mix if self.in_feature_space else noise * mix
+        augmented = token_sequences.clone()
+        augmented[:, self.token_index] += noise.to(token_sequences.dtype)
+        return augmented
+
+def load_numeric_projection(data_path):
+    """Numeric projection weight [d_model, 6] saved with the prepared tokens, or None."""
+    path = os.path.join(data_path, 'modality_projection.pth')
+    if not os.path.exists(path):
+        return None
+    return torch.load(path, map_location='cpu')['numeric_projection.weight']
+
+def load_split(data_path, split_name='test'):
+    """Load a single split as a PricePredictionDataset (without building dataloaders)."""
+    with open(os.path.join(data_path, 'prepared_tokens.pkl'), 'rb') as f:
+        split_data = pickle.load(f)[split_name]
+    
+    return PricePredictionDataset(
+        split_data['token_sequences'],
+        split_data['targets'],
+        split_name,
+        main_category=split_data.get('main_category')
+    )
+
 def load_data(data_path, batch_size=32):
     """Load and prepare data for training."""
     
@@ -69,7 +162,8 @@ def load_data(data_path, batch_size=32):
         dataset = PricePredictionDataset(
             split_data['token_sequences'],
             split_data['targets'],
-            split_name
+            split_name,
+            main_category=split_data.get('main_category')
         )
         datasets[split_name] = dataset
         
@@ -94,4 +188,64 @@ def load_data(data_path, batch_size=32):
     print(f"   Validation: {len(val_loader)} batches") 
     print(f"   Test: {len(test_loader)} batches")
     
-    return train_loader, val_loader, test_loader, transform_info
\ No newline at end of file
+    return train_loader, val_loader, test_loader, transform_info
+
+def as_category_ids(values, num_categories):
+    """Convert one-hot rows to vocabulary ids (all-zero rows -> OOV id)."""
+    values = np.asarray(values)
+    if values.ndim == 1:
+        return values.astype(np.int64)
+    ids = values.argmax(axis=1)
+    ids[values.max(axis=1) <= 0] = num_categories
+    return ids
+
+def prepare_token_sequences(split_data, projection, batch_size=4096, device=None):
+    """
+    Build [N, 3, d_model] token sequences from a data split.
+    
+    Args:
+        split_data: dict with 'text_embeddings', 'main_category', 'sub_category',
+            'numeric_features' and 'y' (as written by the preprocessing pipeline).
+            Categories may be int ids or one-hot rows.
+        projection: transformer.ModalityProjection
+    
+    Returns:
+        dict with 'token_sequences' (float32), 'targets' and 'main_category' ids
+    """
+    device = device or next(projection.parameters()).device
+    index_mode = projection.category_encoding == 'index'
+    category_dtype = torch.long if index_mode else torch.float32
+    
+    main_category = split_data['main_category']
+    sub_category = split_data['sub_category']
+    if index_mode:
+        # Category token becomes an embedding gather; split artifacts stay int32
+        main_category = as_category_ids(main_category, projection.main_cat_projection.num_categories)
+        sub_category = as_category_ids(sub_category, projection.sub_cat_projection.num_categories)
+    
+    num_samples = len(split_data['y'])
+    token_sequences = np.empty((num_samples, 3, projection.d_model), dtype=np.float32)
+    
+    def batch(values, start, end, dtype):
+        return torch.as_tensor(np.asarray(values[start:end]), dtype=dtype, device=device)
+    
+    projection.eval()
+    with torch.no_grad():
+        for start in range(0, num_samples, batch_size):
+            end = min(start + batch_size, num_samples)
+            tokens = projection(
+                batch(split_data['text_embeddings'], start, end, torch.float32),
+                batch(main_category, start, end, category_dtype),
+                batch(sub_category, start, end, category_dtype),
+                batch(split_data['numeric_features'], start, end, torch.float32)
+            )
+            token_sequences[start:end] = tokens.cpu().numpy()
+    
+    # Keep main category ids alongside the tokens for per-category evaluation
+    num_main = (projection.main_cat_projection.num_categories if index_mode
+                else projection.main_cat_projection.in_features)
+    return {
+        'token_sequences': token_sequences,
+        'targets': np.asarray(split_data['y'], dtype=np.float32),
+        'main_category': as_category_ids(main_category, num_main).astype(np.int32)
+    }
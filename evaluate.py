@@ -1,70 +1,332 @@
 """
 Simple evaluation for price prediction model.
+
+Metrics are accumulated batch by batch in float64, so evaluation memory stays
+constant no matter how large the test set is.
 """
 import torch
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from torch.utils.data import SequentialSampler
 import os
 
-def evaluate_model(model, dataloader, transform_info, device):
-    """Evaluate model and return metrics."""
+# Log-price clip applied before expm1 (targets are log1p prices)
+LOG_PRICE_CLIP = (0.0, 15.0)
+
+# Columns of the running sums: count, squared error, absolute error,
+# absolute percentage error, shifted target, shifted target squared
+_NUM_SUMS = 6
+
+def _group_sums(group_ids, sums, num_groups):
+    """Sum rows of `sums` per group id with one bincount per column."""
+    return np.stack([
+        np.bincount(group_ids, weights=sums[:, j], minlength=num_groups)
+        for j in range(_NUM_SUMS)
+    ], axis=1)
+
+def _metrics_from_sums(sums):
+    """RMSE / MAE / R² / MAPE from a row of running sums."""
+    count, sse, sae, sape, shifted_sum, shifted_sq = (float(v) for v in sums)
+    if count == 0:
+        return {'num_samples': 0}
+    
+    # Shifted sums keep the total sum of squares well conditioned
+    ss_tot = shifted_sq - shifted_sum ** 2 / count
+    return {
+        'rmse': float(np.sqrt(sse / count)),
+        'mae': sae / count,
+        'r2': 1.0 - sse / ss_tot if ss_tot > 0 else None,
+        'mape': sape / count * 100,
+        'num_samples': int(count)
+    }
+
+def format_r2(r2):
+    """R² for display; None (constant targets) prints as n/a."""
+    return f"{r2:.4f}" if r2 is not None else 'n/a'
+
+class StreamingMetrics:
+    """
+    Single-pass, constant-memory accumulator for price metrics.
+    
+    Tracks running sums overall, per main category and over a fine log-price
+    histogram. The histogram is folded into price quantiles (deciles by default,
+    reported under 'per_price_quantile') at the end, so no predictions have to be kept.
+    """
+    
+    def __init__(self, price_bins=1500, num_price_quantiles=10, category_names=None):
+        self.bin_edges = np.linspace(LOG_PRICE_CLIP[0], LOG_PRICE_CLIP[1], price_bins + 1)
+        self.num_price_quantiles = num_price_quantiles
+        self.category_names = category_names
+        
+        self.overall = np.zeros(_NUM_SUMS)
+        self.by_price_bin = np.zeros((price_bins, _NUM_SUMS))
+        self.by_category = np.zeros((0, _NUM_SUMS))
+        self.shift = None
+        
+        # Log-space ranges for reporting
+        self.log_pred_range = [np.inf, -np.inf]
+        self.log_target_range = [np.inf, -np.inf]
+        self.price_pred_range = [np.inf, -np.inf]
+        self.price_target_range = [np.inf, -np.inf]
+    
+    @property
+    def count(self):
+        return int(self.overall[0])
+    
+    def update(self, log_predictions, log_targets, categories=None):
+        """
+        Add one batch of log-space predictions and targets.
+        
+        Returns:
+            (pred_original, target_original) for this batch in rupees
+        """
+        log_predictions = np.asarray(log_predictions, dtype=np.float64).ravel()
+        log_targets = np.asarray(log_targets, dtype=np.float64).ravel()
+        if len(log_targets) == 0:
+            return log_predictions, log_targets
+        
+        log_predictions_clipped = np.clip(log_predictions, *LOG_PRICE_CLIP)
+        log_targets_clipped = np.clip(log_targets, *LOG_PRICE_CLIP)
+        
+        # Our targets are in log1p space, so use expm1 to get original prices
+        pred_original = np.expm1(log_predictions_clipped)
+        target_original = np.expm1(log_targets_clipped)
+        
+        if self.shift is None:
+            self.shift = float(target_original.mean())
+        
+        errors = target_original - pred_original
+        shifted = target_original - self.shift
+        abs_errors = np.abs(errors)
+        sums = np.stack([
+            np.ones_like(errors),
+            errors ** 2,
+            abs_errors,
+            # MAPE with protection against division by zero
+            abs_errors / np.maximum(target_original, 1),
+            shifted,
+            shifted ** 2
+        ], axis=1)
+        
+        self.overall += sums.sum(axis=0)
+        
+        num_bins = len(self.by_price_bin)
+        price_bins = np.clip(np.searchsorted(self.bin_edges, log_targets_clipped, side='right') - 1, 0, num_bins - 1)
+        self.by_price_bin += _group_sums(price_bins, sums, num_bins)
+        
+        if categories is not None:
+            categories = np.asarray(categories, dtype=np.int64).ravel()
+            num_categories = int(categories.max()) + 1
+            if num_categories > len(self.by_category):
+                grown = np.zeros((num_categories, _NUM_SUMS))
+                grown[:len(self.by_category)] = self.by_category
+                self.by_category = grown
+            self.by_category += _group_sums(categories, sums, len(self.by_category))
+        
+        for value_range, values in ((self.log_pred_range, log_predictions),
+                                    (self.log_target_range, log_targets),
+                                    (self.price_pred_range, pred_original),
+                                    (self.price_target_range, target_original)):
+            value_range[0] = min(value_range[0], float(values.min()))
+            value_range[1] = max(value_range[1], float(values.max()))
+        
+        return pred_original, target_original
+    
+    def _category_name(self, category_id):
+        if self.category_names is not None and category_id < len(self.category_names):
+            return str(self.category_names[category_id])
+        if self.category_names is not None and category_id == len(self.category_names):
+            return 'unknown'
+        return str(category_id)
+    
+    def _price_quantiles(self):
+        counts = self.by_price_bin[:, 0]
+        total = counts.sum()
+        occupied = np.nonzero(counts)[0]
+        if total == 0:
+            return []
+        
+        # Assign each fine bin to the quantile containing its midpoint
+        midpoints = (np.cumsum(counts) - counts / 2) / total
+        quantile_of_bin = np.minimum((midpoints * self.num_price_quantiles).astype(np.int64),
+                                     self.num_price_quantiles - 1)
+        
+        quantiles = []
+        for q in range(self.num_price_quantiles):
+            bins = occupied[quantile_of_bin[occupied] == q]
+            if len(bins) == 0:
+                continue
+            entry = {
+                'quantile': q + 1,
+                'price_min': float(np.expm1(self.bin_edges[bins[0]])),
+                'price_max': float(np.expm1(self.bin_edges[bins[-1] + 1]))
+            }
+            entry.update(_metrics_from_sums(self.by_price_bin[bins].sum(axis=0)))
+            quantiles.append(entry)
+        return quantiles
+    
+    def compute(self):
+        """Final metrics with per-category and per-price-quantile breakdowns."""
+        metrics = _metrics_from_sums(self.overall)
+        metrics['per_category'] = {
+            self._category_name(category_id): _metrics_from_sums(sums)
+            for category_id, sums in enumerate(self.by_category) if sums[0] > 0
+        }
+        metrics['num_price_quantiles'] = self.num_price_quantiles
+        metrics['per_price_quantile'] = self._price_quantiles()
+        return metrics
+
+class PredictionDensity:
+    """
+    Incremental 2-D histogram of (actual, predicted) in log-price space.
+    
+    Counts are binned per batch, so the density plot costs the same no matter how
+    many points there are. Raw points are also kept while there are at most
+    `scatter_threshold` of them, for a scatter plot on small test sets.
+    """
+    
+    def __init__(self, num_bins=300, scatter_threshold=20000):
+        self.bin_edges = np.linspace(LOG_PRICE_CLIP[0], LOG_PRICE_CLIP[1], num_bins + 1)
+        self.counts = np.zeros((num_bins, num_bins), dtype=np.int64)
+        self.scatter_threshold = scatter_threshold
+        self._points = ([], [])
+        self.count = 0
+    
+    def update(self, log_predictions, log_targets, pred_original, target_original):
+        num_bins = len(self.counts)
+        
+        def bin_ids(values):
+            values = np.clip(np.asarray(values, dtype=np.float64).ravel(), *LOG_PRICE_CLIP)
+            return np.clip(np.searchsorted(self.bin_edges, values, side='right') - 1, 0, num_bins - 1)
+        
+        flat = bin_ids(log_targets) * num_bins + bin_ids(log_predictions)
+        self.counts += np.bincount(flat, minlength=num_bins * num_bins).reshape(num_bins, num_bins)
+        self.count += len(flat)
+        
+        # Raw points only while the scatter fallback is still possible
+        if self._points is not None:
+            if self.count <= self.scatter_threshold:
+                self._points[0].append(np.asarray(target_original))
+                self._points[1].append(np.asarray(pred_original))
+            else:
+                self._points = None
+    
+    @property
+    def points(self):
+        """(targets, predictions) in rupees, or None once past the scatter threshold."""
+        if self._points is None or not self._points[0]:
+            return None
+        return np.concatenate(self._points[0]), np.concatenate(self._points[1])
+
+class PredictionWriter:
+    """Writes predictions to numbered .npz chunks so large test sets never sit in memory."""
+    
+    def __init__(self, directory, chunk_size=100000):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.num_chunks = 0
+        self._buffers = {}
+        self._buffered = 0
+        os.makedirs(directory, exist_ok=True)
+    
+    def write(self, **columns):
+        for name, values in columns.items():
+            self._buffers.setdefault(name, []).append(np.asarray(values))
+        self._buffered += len(next(iter(columns.values())))
+        if self._buffered >= self.chunk_size:
+            self.flush()
+    
+    def flush(self):
+        if self._buffered == 0:
+            return
+        path = os.path.join(self.directory, f'predictions_{self.num_chunks:05d}.npz')
+        np.savez(path, **{name: np.concatenate(parts) for name, parts in self._buffers.items()})
+        self.num_chunks += 1
+        self._buffers = {}
+        self._buffered = 0
+    
+    def close(self):
+        self.flush()
+        print(f"💾 Wrote {self.num_chunks} prediction chunk(s) to {self.directory}")
+
+def evaluate_model(model, dataloader, transform_info, device, category_names=None, dump_predictions=None):
+    """
+    Evaluate model and return metrics.
+    
+    Runs a single streaming pass: overall metrics, per-main-category and
+    per-price-decile breakdowns are accumulated batch by batch.
+    
+    Args:
+        category_names: Optional main category vocabulary for readable breakdowns
+        dump_predictions: Write predictions to disk in chunks (defaults to EVALUATION_CONFIG)
+    """
+    from config import EVALUATION_CONFIG
     
     print("🧪 Evaluating model...")
     
     model.eval()
-    all_predictions = []
-    all_targets = []
+    accumulator = StreamingMetrics(
+        price_bins=EVALUATION_CONFIG['price_bins'],
+        num_price_quantiles=EVALUATION_CONFIG['num_price_quantiles'],
+        category_names=category_names
+    )
+    
+    # Category ids line up with batches only when the loader is not shuffled
+    dataset = dataloader.dataset
+    categories = getattr(dataset, 'main_category', None)
+    if not isinstance(dataloader.sampler, SequentialSampler):
+        categories = None
     
-    # Collect predictions
+    if dump_predictions is None:
+        dump_predictions = EVALUATION_CONFIG['dump_predictions']
+    writer = None
+    if dump_predictions:
+        writer = PredictionWriter(EVALUATION_CONFIG['predictions_dir'],
+                                  EVALUATION_CONFIG['predictions_chunk_size'])
+    
+    # Binned counts (and a small raw sample) for the results plot
+    density = PredictionDensity(EVALUATION_CONFIG['density_bins'], EVALUATION_CONFIG['scatter_threshold'])
+    
+    offset = 0
     with torch.no_grad():
         for token_sequences, targets in dataloader:
             token_sequences = token_sequences.to(device)
-            predictions = model(token_sequences)
+            predictions = model(token_sequences).cpu().numpy()
+            targets = targets.numpy()
+            
+            batch_categories = None
+            if categories is not None:
+                batch_categories = categories[offset:offset + len(targets)]
+            offset += len(targets)
+            
+            pred_original, target_original = accumulator.update(predictions, targets, batch_categories)
             
-            all_predictions.extend(predictions.cpu().numpy())
-            all_targets.extend(targets.numpy())
+            if writer is not None:
+                columns = {'log_prediction': predictions, 'log_target': targets,
+                           'prediction': pred_original, 'target': target_original}
+                if batch_categories is not None:
+                    columns['main_category'] = batch_categories
+                writer.write(**columns)
+            
+            density.update(predictions, targets, pred_original, target_original)
     
-    predictions = np.array(all_predictions)
-    targets = np.array(all_targets)
+    if writer is not None:
+        writer.close()
     
-    print(f"Collected {len(predictions)} predictions")
-    print(f"Log space - Predictions: {predictions.min():.3f} to {predictions.max():.3f}")
-    print(f"Log space - Targets: {targets.min():.3f} to {targets.max():.3f}")
+    if accumulator.count == 0:
+        print("❌ Error calculating metrics: no samples in dataloader")
+        return None
     
-    # Convert back to original price scale (inverse log transform)
-    try:
-        # Our targets are in log1p space, so use expm1 to get original prices
-        pred_original = np.expm1(np.clip(predictions, 0, 15))
-        target_original = np.expm1(np.clip(targets, 0, 15))
-        
-        print(f"Original prices - Predictions: ₹{pred_original.min():.2f} to ₹{pred_original.max():.2f}")
-        print(f"Original prices - Targets: ₹{target_original.min():.2f} to ₹{target_original.max():.2f}")
-        
-    except Exception as e:
-        print(f"❌ Error in inverse transform: {e}")
-        pred_original = predictions
-        target_original = targets
+    print(f"Collected {accumulator.count} predictions")
+    print(f"Log space - Predictions: {accumulator.log_pred_range[0]:.3f} to {accumulator.log_pred_range[1]:.3f}")
+    print(f"Log space - Targets: {accumulator.log_target_range[0]:.3f} to {accumulator.log_target_range[1]:.3f}")
+    print(f"Original prices - Predictions: ₹{accumulator.price_pred_range[0]:.2f} to ₹{accumulator.price_pred_range[1]:.2f}")
+    print(f"Original prices - Targets: ₹{accumulator.price_target_range[0]:.2f} to ₹{accumulator.price_target_range[1]:.2f}")
     
-    # Calculate metrics on original scale
     try:
-        rmse = np.sqrt(mean_squared_error(target_original, pred_original))
-        mae = mean_absolute_error(target_original, pred_original)
-        r2 = r2_score(target_original, pred_original)
-        
-        # MAPE with protection against division by zero
-        mape = np.mean(np.abs((target_original - pred_original) / np.maximum(target_original, 1))) * 100
-        
-        metrics = {
-            'rmse': rmse,
-            'mae': mae,
-            'r2': r2,
-            'mape': mape,
-            'num_samples': len(predictions)
-        }
+        metrics = accumulator.compute()
         
         # Create simple visualization
-        create_simple_plot(target_original, pred_original, metrics)
+        create_results_plot(density, metrics, EVALUATION_CONFIG['plot_mode'], EVALUATION_CONFIG['plot_dpi'])
         
         return metrics
         
@@ -72,8 +334,94 @@ def evaluate_model(model, dataloader, transform_info, device):
         print(f"❌ Error calculating metrics: {e}")
         return None
 
-def create_simple_plot(targets, predictions, metrics):
+def print_breakdowns(results):
+    """Print per-category and per-price-quantile breakdowns."""
+    if results.get('per_category'):
+        print(f"\n📂 Per main category:")
+        for name, m in sorted(results['per_category'].items(), key=lambda kv: -kv[1]['num_samples']):
+            print(f"  {name[:28]:<28} n={m['num_samples']:>8}  RMSE=₹{m['rmse']:.2f}  "
+                  f"MAE=₹{m['mae']:.2f}  MAPE={m['mape']:.2f}%")
+    
+    quantiles = results.get('per_price_quantile')
+    if quantiles:
+        deciles = results.get('num_price_quantiles') == 10
+        prefix = 'D' if deciles else 'Q'
+        print(f"\n💰 Per price {'decile' if deciles else 'quantile'}:")
+        for entry in quantiles:
+            print(f"  {prefix}{entry['quantile']:<2} ₹{entry['price_min']:>10.0f} - ₹{entry['price_max']:<10.0f} "
+                  f"n={entry['num_samples']:>8}  MAE=₹{entry['mae']:.2f}  MAPE={entry['mape']:.2f}%")
+
+def create_results_plot(density, metrics, plot_mode='auto', dpi=300):
+    """
+    Plot predictions vs targets from a PredictionDensity.
+    
+    'auto' draws a scatter while the raw points were kept (small test sets)
+    and a log-price density plot otherwise.
+    """
+    points = density.points
+    if plot_mode == 'scatter' and points is None:
+        print(f"⚠️  {density.count} points exceed the scatter threshold, drawing density instead")
+    
+    if plot_mode != 'density' and points is not None:
+        create_simple_plot(points[0], points[1], metrics, dpi=dpi)
+    else:
+        create_density_plot(density, metrics, dpi=dpi)
+
+def create_density_plot(density, metrics, dpi=300):
+    """Create a 2-D histogram of predictions vs targets in log-price space."""
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+    
+    try:
+        occupied_rows = np.nonzero(density.counts.sum(axis=1))[0]
+        occupied_cols = np.nonzero(density.counts.sum(axis=0))[0]
+        if len(occupied_rows) == 0:
+            print("❌ Error creating plot: no points")
+            return
+        
+        # Crop to the occupied region so the bins are not mostly empty space
+        first = min(occupied_rows[0], occupied_cols[0])
+        last = max(occupied_rows[-1], occupied_cols[-1]) + 1
+        edges = density.bin_edges[first:last + 1]
+        counts = density.counts[first:last, first:last]
+        
+        plt.figure(figsize=(10, 8))
+        
+        masked = np.ma.masked_equal(counts.T, 0)
+        mesh = plt.pcolormesh(edges, edges, masked, norm=LogNorm(vmin=1, vmax=max(int(counts.max()), 1)),
+                              cmap='viridis', shading='flat')
+        plt.colorbar(mesh, label='Products per bin')
+        
+        # Perfect prediction line
+        plt.plot([edges[0], edges[-1]], [edges[0], edges[-1]], 'r--', linewidth=2, label='Perfect Prediction')
+        
+        # Axes are log1p(price); label ticks in rupees
+        ticks = np.linspace(edges[0], edges[-1], 6)
+        labels = [f"₹{np.expm1(t):,.0f}" for t in ticks]
+        plt.xticks(ticks, labels)
+        plt.yticks(ticks, labels)
+        
+        plt.xlabel('Actual Price (₹, log scale)')
+        plt.ylabel('Predicted Price (₹, log scale)')
+        plt.title(f'Price Prediction Results ({density.count:,} products)\n'
+                  f'R² = {format_r2(metrics["r2"])}, RMSE = ₹{metrics["rmse"]:.2f}')
+        plt.legend()
+        plt.grid(True, alpha=0.3)
+        
+        # Save plot
+        from config import RESULTS_PATH
+        save_path = os.path.join(RESULTS_PATH, 'prediction_results.png')
+        plt.savefig(save_path, dpi=dpi, bbox_inches='tight')
+        plt.close()
+        
+        print(f"📊 Saved density plot to {save_path}")
+        
+    except Exception as e:
+        print(f"❌ Error creating plot: {e}")
+
+def create_simple_plot(targets, predictions, metrics, dpi=300):
     """Create a simple scatter plot of predictions vs targets."""
+    import matplotlib.pyplot as plt
     
     try:
         plt.figure(figsize=(10, 8))
@@ -88,14 +436,14 @@ def create_simple_plot(targets, predictions, metrics):
         
         plt.xlabel('Actual Price (₹)')
         plt.ylabel('Predicted Price (₹)')
-        plt.title(f'Price Prediction Results\nR² = {metrics["r2"]:.4f}, RMSE = ₹{metrics["rmse"]:.2f}')
+        plt.title(f'Price Prediction Results\nR² = {format_r2(metrics["r2"])}, RMSE = ₹{metrics["rmse"]:.2f}')
         plt.legend()
         plt.grid(True, alpha=0.3)
         
         # Save plot
         from config import RESULTS_PATH
         save_path = os.path.join(RESULTS_PATH, 'prediction_results.png')
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
+        plt.savefig(save_path, dpi=dpi, bbox_inches='tight')
         plt.close()
         
         print(f"📊 Saved plot to {save_path}")
@@ -103,10 +451,187 @@ def create_simple_plot(targets, predictions, metrics):
     except Exception as e:
         print(f"❌ Error creating plot: {e}")
 
+def load_category_names(data_path):
+    """Main category vocabulary from the feature preparation artifact, if available."""
+    try:
+        from preprocessing_utils import load_feature_prep
+        feature_prep = load_feature_prep(data_path)
+        return feature_prep.vocabularies['main_category'] if feature_prep else None
+    except Exception as e:
+        print(f"   Warning: Could not load category names: {e}")
+        return None
+
+def load_checkpoint_model(model_path, device='cpu'):
+    """
+    Load any checkpoint this project writes: a plain state dict, a dict with
+    'model_state_dict', a whole pickled module, or a dynamically quantized
+    (qint8 Linear) state dict.
+    """
+    from config import MODEL_CONFIG
+    from transformer import MultimodalPriceTransformer
+    
+    checkpoint = torch.load(model_path, map_location=device, weights_only=False)
+    if isinstance(checkpoint, torch.nn.Module):
+        return checkpoint.to(device).eval()
+    
+    state_dict = checkpoint.get('model_state_dict', checkpoint)
+    model = MultimodalPriceTransformer(**MODEL_CONFIG)
+    if any('_packed_params' in key for key in state_dict):
+        # Quantized checkpoints only run on CPU
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        device = 'cpu'
+        # The encoder fast-path check reads .weight.device, which quantized Linears
+        # don't have; any forward hook makes the layer take the regular path.
+        for layer in model.transformer.layers:
+            layer.register_forward_pre_hook(lambda module, args: None)
+    model.load_state_dict(state_dict)
+    return model.to(device).eval()
+
+def count_parameters(model):
+    """Parameter count, including weights packed inside dynamically quantized Linears."""
+    total = sum(p.numel() for p in model.parameters())
+    for module in model.modules():
+        # Quantized Linears expose weight()/bias() methods instead of nn.Parameters
+        if callable(getattr(module, 'weight', None)):
+            bias = module.bias()
+            total += module.weight().numel() + (bias.numel() if bias is not None else 0)
+    return total
+
+# Test split shared by comparison workers (set by _init_compare_worker)
+_shared_split = {}
+
+def _init_compare_worker(token_sequences, targets, main_category, num_threads):
+    torch.set_num_threads(num_threads)
+    _shared_split.update(token_sequences=token_sequences, targets=targets, main_category=main_category)
+
+def _score_checkpoint(task):
+    """Evaluate one checkpoint on the shared test split (runs in a worker process)."""
+    model_path, batch_size, category_names = task
+    import time
+    
+    token_sequences = _shared_split['token_sequences']
+    targets = _shared_split['targets']
+    main_category = _shared_split['main_category']
+    
+    try:
+        load_start = time.perf_counter()
+        model = load_checkpoint_model(model_path, 'cpu')
+        load_time = time.perf_counter() - load_start
+        
+        accumulator = StreamingMetrics(category_names=category_names)
+        eval_start = time.perf_counter()
+        with torch.inference_mode():
+            for start in range(0, len(targets), batch_size):
+                end = start + batch_size
+                predictions = model(token_sequences[start:end]).numpy()
+                categories = None if main_category is None else main_category[start:end].numpy()
+                accumulator.update(predictions, targets[start:end].numpy(), categories)
+        eval_time = time.perf_counter() - eval_start
+        
+        # Single-item latency, the serving case
+        single = token_sequences[:1]
+        latencies = []
+        with torch.inference_mode():
+            for _ in range(5):
+                model(single)
+            for _ in range(50):
+                start = time.perf_counter()
+                model(single)
+                latencies.append((time.perf_counter() - start) * 1000)
+        
+        metrics = accumulator.compute()
+        metrics.update({
+            'checkpoint': model_path,
+            'file_size_mb': os.path.getsize(model_path) / 1e6,
+            'num_parameters': count_parameters(model),
+            'load_time_s': load_time,
+            'latency_p50_ms': float(np.percentile(latencies, 50)),
+            'latency_p99_ms': float(np.percentile(latencies, 99)),
+            'throughput_per_s': len(targets) / eval_time
+        })
+        return metrics
+    
+    except Exception as e:
+        return {'checkpoint': model_path, 'error': str(e)}
+
+def compare_checkpoints(model_paths, num_workers=None, batch_size=None, save_path=None):
+    """
+    Evaluate several checkpoints in parallel and print one comparison table.
+    
+    The test split is loaded once and placed in shared memory; each worker
+    process maps it instead of reloading prepared_tokens.pkl.
+    """
+    import json
+    import torch.multiprocessing as mp
+    from config import DATA_PATH, RESULTS_PATH, EVALUATION_CONFIG
+    from dataloader import load_split
+    
+    model_paths = [path for path in model_paths if os.path.exists(path)]
+    if not model_paths:
+        print("❌ No checkpoints found to compare")
+        return []
+    
+    batch_size = batch_size or EVALUATION_CONFIG['batch_size']
+    num_workers = max(1, min(num_workers or os.cpu_count() or 1, len(model_paths)))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+    
+    dataset = load_split(DATA_PATH, 'test')
+    token_sequences = dataset.token_sequences.share_memory_()
+    targets = dataset.targets.share_memory_()
+    main_category = None
+    if dataset.main_category is not None:
+        main_category = torch.as_tensor(dataset.main_category, dtype=torch.int64).share_memory_()
+    category_names = load_category_names(DATA_PATH)
+    
+    print(f"\n⚖️  Comparing {len(model_paths)} checkpoints on {len(targets)} test samples "
+          f"({num_workers} workers x {threads_per_worker} threads)")
+    
+    context = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+    tasks = [(path, batch_size, category_names) for path in model_paths]
+    with context.Pool(num_workers, initializer=_init_compare_worker,
+                      initargs=(token_sequences, targets, main_category, threads_per_worker)) as pool:
+        results = pool.map(_score_checkpoint, tasks)
+    
+    print_comparison_table(results)
+    
+    save_path = save_path or os.path.join(RESULTS_PATH, 'checkpoint_comparison.json')
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    with open(save_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Comparison saved to {save_path}")
+    
+    return results
+
+def print_comparison_table(results):
+    """Print accuracy, latency and size side by side per checkpoint."""
+    header = (f"{'Checkpoint':<28} {'RMSE':>10} {'MAE':>10} {'R²':>8} {'MAPE':>8} "
+              f"{'p50 ms':>8} {'p99 ms':>8} {'rows/s':>10} {'MB':>8} {'Params':>10}")
+    print("\n" + header)
+    print("-" * len(header))
+    for result in results:
+        name = os.path.basename(result['checkpoint'])[:28]
+        if 'error' in result:
+            print(f"{name:<28} ❌ {result['error']}")
+            continue
+        print(f"{name:<28} {result['rmse']:>10.2f} {result['mae']:>10.2f} {format_r2(result['r2']):>8} "
+              f"{result['mape']:>7.2f}% {result['latency_p50_ms']:>8.2f} {result['latency_p99_ms']:>8.2f} "
+              f"{result['throughput_per_s']:>10.0f} {result['file_size_mb']:>8.2f} {result['num_parameters']:>10,}")
+
+def default_comparison_checkpoints():
+    """best/final/quantized checkpoints plus any other .pth files in MODEL_SAVE_PATH."""
+    from config import MODEL_SAVE_PATH, QUANTIZATION_CONFIG
+    
+    paths = [os.path.join(MODEL_SAVE_PATH, name) for name in ('best_model.pth', 'final_model.pth')]
+    paths.append(QUANTIZATION_CONFIG['quantized_model_path'])
+    if os.path.isdir(MODEL_SAVE_PATH):
+        paths += sorted(os.path.join(MODEL_SAVE_PATH, name) for name in os.listdir(MODEL_SAVE_PATH)
+                        if name.endswith('.pth'))
+    return list(dict.fromkeys(paths))
+
 def load_and_evaluate(model_path=None):
     """Load model and evaluate."""
     
-    from config import MODEL_SAVE_PATH, DATA_PATH, MODEL_CONFIG
+    from config import MODEL_SAVE_PATH, DATA_PATH, MODEL_CONFIG, EVALUATION_CONFIG
     from transformer import MultimodalPriceTransformer
     from dataloader import load_data
     
@@ -114,29 +639,41 @@ def load_and_evaluate(model_path=None):
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     
     # Load data
-    _, _, test_loader, transform_info = load_data(DATA_PATH, batch_size=64)
+    _, _, test_loader, transform_info = load_data(DATA_PATH, batch_size=EVALUATION_CONFIG['batch_size'])
+    category_names = load_category_names(DATA_PATH)
     
     # Load model
     if model_path is None:
         model_path = os.path.join(MODEL_SAVE_PATH, 'best_model.pth')
     
-    model = MultimodalPriceTransformer(**MODEL_CONFIG)
-    model.load_state_dict(torch.load(model_path, map_location=device))
-    model = model.to(device)
+    model = load_checkpoint_model(model_path, device)
     
     print(f"Loaded model from {model_path}")
     
     # Evaluate
-    results = evaluate_model(model, test_loader, transform_info, device)
+    results = evaluate_model(model, test_loader, transform_info, device, category_names=category_names)
     
     if results:
         print(f"\n📊 Evaluation Results:")
         print(f"RMSE: ₹{results['rmse']:.2f}")
         print(f"MAE:  ₹{results['mae']:.2f}")
-        print(f"R²:   {results['r2']:.4f}")
+        print(f"R²:   {format_r2(results['r2'])}")
         print(f"MAPE: {results['mape']:.2f}%")
+        print_breakdowns(results)
     
     return results
 
 if __name__ == "__main__":
-    load_and_evaluate()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Evaluate price prediction checkpoints")
+    parser.add_argument('model_path', nargs='?', help="Checkpoint to evaluate (default: best_model.pth)")
+    parser.add_argument('--compare', nargs='*', metavar='CHECKPOINT',
+                        help="Compare checkpoints in parallel (default: all in the models folder)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes for --compare")
+    args = parser.parse_args()
+    
+    if args.compare is not None:
+        compare_checkpoints(args.compare or default_comparison_checkpoints(), num_workers=args.workers)
+    else:
+        load_and_evaluate(args.model_path)
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Gunicorn configuration for multi-worker serving with pre-fork model sharing.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The master imports the app once with PREDICTCART_PRELOAD=1, which loads the
+predictor synchronously and moves its tensors into shared memory; workers are
+forked afterwards and map the same weights read-only. Each worker logs its
+unique memory (USS) on start, also available from GET /api/health ("memory").
+
+Environment:
+    PREDICTCART_WORKERS   number of workers (default: CPU count)
+    PREDICTCART_BIND      bind address (default: 0.0.0.0:5000)
+    PREDICTCART_PRELOAD   1 (default) to share weights, 0 to load per worker
+    PREDICTCART_WATCH_MODELS  1 to hot-reload new checkpoints/bundles in every worker
+"""
+import multiprocessing
+import os
+
+os.environ.setdefault('PREDICTCART_PRELOAD', '1')
+
+bind = os.environ.get('PREDICTCART_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('PREDICTCART_WORKERS', multiprocessing.cpu_count()))
+preload_app = os.environ['PREDICTCART_PRELOAD'] == '1'
+timeout = 120
+
+
+def post_fork(server, worker):
+    """Split the cores between workers instead of every worker using all of them."""
+    import torch
+    torch.set_num_threads(max(1, multiprocessing.cpu_count() // workers))
+
+
+def post_worker_init(worker):
+    """Log per-worker memory so the sharing can be confirmed (USS << RSS)."""
+    from config import SERVING_CONFIG
+    from predictor_service import process_memory, start_watching
+    
+    # Watcher threads don't survive fork, so each worker starts its own
+    if SERVING_CONFIG['watch_models']:
+        start_watching()
+    
+    memory = process_memory()
+    if memory:
+        worker.log.info(
+            f"Worker {memory['pid']}: USS {memory['uss_mb']} MB, PSS {memory['pss_mb']} MB, "
+            f"RSS {memory['rss_mb']} MB, shared {memory['shared_mb']} MB"
+        )
@@ -0,0 +1,80 @@
+"""
+Import-time report for the project's entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+summarizes the self time per top-level package, so regressions (a heavy
+dependency creeping into a light module) are easy to spot.
+
+Usage:
+    python import_report.py [module ...] [--top N]
+"""
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Dependencies that must only be imported by the code paths that use them
+HEAVY_MODULES = ('torch', 'transformers', 'sklearn', 'matplotlib', 'pandas', 'pyarrow')
+
+
+def measure_import(module):
+    """
+    Import `module` in a fresh interpreter with -X importtime.
+    
+    The predictor is not auto-loaded (PREDICTCART_AUTOLOAD=0) so only the
+    import itself is measured.
+    
+    Returns:
+        dict with 'module', 'total_ms' (cumulative import time of `module`),
+        'packages' (top-level package -> self ms, descending) and 'imported'
+        (set of all imported module names)
+    """
+    env = dict(os.environ, PREDICTCART_AUTOLOAD='0')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    
+    packages = {}
+    imported = set()
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        imported.add(name)
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+    
+    return {
+        'module': module,
+        'total_ms': total_us / 1000,
+        'packages': {k: v / 1000 for k, v in sorted(packages.items(), key=lambda kv: -kv[1])},
+        'imported': imported
+    }
+
+
+def print_report(report, top=15):
+    print(f"\n📦 import {report['module']}: {report['total_ms']:.1f} ms")
+    for package, ms in list(report['packages'].items())[:top]:
+        print(f"   {package:<28s} {ms:8.1f} ms")
+    heavy = [m for m in HEAVY_MODULES if m in report['imported']]
+    print(f"   Heavy dependencies: {', '.join(heavy) if heavy else 'none'}")
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Summarize import time per package")
+    parser.add_argument('modules', nargs='*', default=['app', 'app_quick', 'config', 'check_setup', 'predict'])
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+    
+    for module in args.modules:
+        print_report(measure_import(module), args.top)
@@ -13,8 +13,8 @@ from tqdm import tqdm
 
 from config import *
 from transformer import MultimodalPriceTransformer, SimplePricePredictor
-from dataloader import load_data
-from evaluate import evaluate_model
+from dataloader import load_data, load_numeric_projection, NumericNoiseAugmenter
+from evaluate import evaluate_model, format_r2, load_category_names, print_breakdowns
 
 class EarlyStopping:
     """Simple early stopping."""
@@ -44,7 +44,7 @@ class EarlyStopping:
                                      for k, v in self.best_state.items()})
                 print("🔄 Restored best model weights")
 
-def train_epoch(model, dataloader, criterion, optimizer, device):
+def train_epoch(model, dataloader, criterion, optimizer, device, augmenter=None):
     """Train for one epoch."""
     model.train()
     total_loss = 0.0
@@ -55,6 +55,10 @@ def train_epoch(model, dataloader, criterion, optimizer, device):
         token_sequences = token_sequences.to(device)
         targets = targets.to(device)
         
+        # Fresh per-batch noise (nothing materialized ahead of time)
+        if augmenter is not None:
+            token_sequences = augmenter(token_sequences)
+        
         # Forward pass
         optimizer.zero_grad()
         predictions = model(token_sequences)
@@ -92,6 +96,120 @@ def validate(model, dataloader, criterion, device):
     
     return total_loss / num_batches
 
+def student_inputs(token_sequences, use_text_token):
+    """Zero the text token when the student is trained to run without BERT."""
+    if use_text_token:
+        return token_sequences
+    token_sequences = token_sequences.clone()
+    token_sequences[:, 0] = 0.0
+    return token_sequences
+
+def distill():
+    """Train SimplePricePredictor to match the trained transformer's predictions."""
+    print("🚀 Distilling transformer into the latency-tier student")
+    print("=" * 60)
+    
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    config = DISTILLATION_CONFIG
+    use_text = config['use_text_token']
+    
+    try:
+        train_loader, val_loader, test_loader, transform_info = load_data(
+            DATA_PATH, TRAINING_CONFIG['batch_size']
+        )
+    except Exception as e:
+        print(f"❌ Error loading data: {e}")
+        return None
+    
+    # Teacher
+    teacher = MultimodalPriceTransformer(**MODEL_CONFIG).to(device)
+    checkpoint = torch.load(config['teacher_model_path'], map_location=device)
+    teacher.load_state_dict(checkpoint.get('model_state_dict', checkpoint))
+    teacher.eval()
+    print(f"✅ Teacher loaded from {config['teacher_model_path']}")
+    
+    student = SimplePricePredictor(MODEL_CONFIG['d_model']).to(device)
+    print(f"Student parameters: {sum(p.numel() for p in student.parameters()):,} "
+          f"(text token {'used' if use_text else 'dropped'})")
+    
+    criterion = nn.MSELoss()
+    optimizer = optim.AdamW(student.parameters(), lr=config['learning_rate'],
+                            weight_decay=TRAINING_CONFIG['weight_decay'])
+    weight = config['teacher_weight']
+    
+    def agreement(loader):
+        """MSE against the teacher and against true targets."""
+        student.eval()
+        teacher_se, target_se, count = 0.0, 0.0, 0
+        with torch.no_grad():
+            for token_sequences, targets in loader:
+                token_sequences, targets = token_sequences.to(device), targets.to(device)
+                predictions = student(student_inputs(token_sequences, use_text))
+                teacher_se += ((predictions - teacher(token_sequences)) ** 2).sum().item()
+                target_se += ((predictions - targets) ** 2).sum().item()
+                count += len(targets)
+        return teacher_se / count, target_se / count
+    
+    best_val = float('inf')
+    for epoch in range(config['num_epochs']):
+        student.train()
+        total_loss, num_batches = 0.0, 0
+        for token_sequences, targets in tqdm(train_loader, desc=f"Distill {epoch+1}"):
+            token_sequences, targets = token_sequences.to(device), targets.to(device)
+            with torch.no_grad():
+                soft_targets = weight * teacher(token_sequences) + (1 - weight) * targets
+            
+            optimizer.zero_grad()
+            loss = criterion(student(student_inputs(token_sequences, use_text)), soft_targets)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), max_norm=1.0)
+            optimizer.step()
+            
+            total_loss += loss.item()
+            num_batches += 1
+        
+        val_teacher_mse, val_target_mse = agreement(val_loader)
+        print(f"Epoch {epoch+1}: train {total_loss / num_batches:.6f} | "
+              f"val vs teacher {val_teacher_mse:.6f} | val vs target {val_target_mse:.6f}")
+        
+        if val_teacher_mse < best_val:
+            best_val = val_teacher_mse
+            torch.save(student.state_dict(), config['student_model_path'])
+            print("💾 New best student saved!")
+    
+    student.load_state_dict(torch.load(config['student_model_path'], map_location=device))
+    test_teacher_mse, test_target_mse = agreement(test_loader)
+    
+    # Per-sample latency of both tiers on the test tokens (batch of 1, CPU-style serving)
+    sample = next(iter(test_loader))[0][:1].to(device)
+    timings = {}
+    with torch.no_grad():
+        for name, model, inputs in (('teacher', teacher, sample),
+                                    ('student', student, student_inputs(sample, use_text))):
+            for _ in range(10):
+                model(inputs)
+            start = time.perf_counter()
+            for _ in range(200):
+                model(inputs)
+            timings[name] = (time.perf_counter() - start) / 200 * 1000
+    
+    results = {
+        'test_mse_vs_teacher': test_teacher_mse,
+        'test_mse_vs_target': test_target_mse,
+        'teacher_ms_per_sample': timings['teacher'],
+        'student_ms_per_sample': timings['student'],
+        'use_text_token': use_text
+    }
+    print(f"\n📊 Student test MSE vs teacher: {test_teacher_mse:.6f}, vs target: {test_target_mse:.6f}")
+    print(f"⏱️  Teacher {timings['teacher']:.3f} ms | Student {timings['student']:.3f} ms per sample "
+          f"(excluding text encoding)")
+    
+    with open(config['results_path'], 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Distillation results saved to {config['results_path']}")
+    return results
+
 def main():
     """Main training function."""
     print("🚀 Starting simple multimodal price prediction training")
@@ -153,6 +271,20 @@ def main():
                 print(f"📉 Learning rate reduced: {old_lr:.2e} → {new_lr:.2e}")
     
     verbose_scheduler = VerboseScheduler(scheduler)
+    
+    # On-the-fly noise augmentation
+    augmentation_config = TRAINING_CONFIG.get('noise_augmentation', {})
+    augmenter = None
+    if augmentation_config.get('enabled', False):
+        augmenter = NumericNoiseAugmenter.from_dataset(train_loader.dataset,
+                                                       projection_weight=load_numeric_projection(DATA_PATH),
+                                                       **augmentation_config)
+        print(f"🎲 Noise augmentation enabled (level={augmenter.noise_level}, "
+              f"token={augmenter.token_index}, seed={augmenter.seed})")
+        if not augmenter.in_feature_space:
+            print("   ⚠️ modality_projection.pth not found; approximating feature noise in token space "
+                  "(rerun INPUT_PREPARATION to save it)")
+    
     early_stopping = EarlyStopping(patience=TRAINING_CONFIG['patience'])
     
     # Training loop
@@ -165,7 +297,9 @@ def main():
         start_time = time.time()
         
         # Train
-        train_loss = train_epoch(model, train_loader, criterion, optimizer, device)
+        if augmenter is not None:
+            augmenter.set_epoch(epoch)
+        train_loss = train_epoch(model, train_loader, criterion, optimizer, device, augmenter)
         
         # Validate
         val_loss = validate(model, val_loader, criterion, device)
@@ -220,14 +354,16 @@ def main():
     # Evaluate on test set
     print("\n🧪 Evaluating on test set...")
     try:
-        results = evaluate_model(model, test_loader, transform_info, device)
+        results = evaluate_model(model, test_loader, transform_info, device,
+                                 category_names=load_category_names(DATA_PATH))
         
         if results:
             print(f"\n📊 Final Results:")
             print(f"RMSE: ₹{results['rmse']:.2f}")
             print(f"MAE:  ₹{results['mae']:.2f}")
-            print(f"R²:   {results['r2']:.4f}")
+            print(f"R²:   {format_r2(results['r2'])}")
             print(f"MAPE: {results['mape']:.2f}%")
+            print_breakdowns(results)
             
             # Save evaluation results
             with open(os.path.join(RESULTS_PATH, 'final_results.json'), 'w') as f:
@@ -241,7 +377,14 @@ def main():
         return None
 
 if __name__ == "__main__":
+    import sys
     try:
+        if '--distill' in sys.argv:
+            results = distill()
+            if results:
+                print("\n🎉 Distillation completed successfully!")
+            sys.exit(0)
+        
         results = main()
         if results:
             print("\n🎉 Training and evaluation completed successfully!")
@@ -0,0 +1,232 @@
+"""
+In-process latency histograms and counters with a Prometheus text endpoint.
+
+Recording is lock-free on the hot path. Each thread writes only to its own
+shard (a dict of series), and a scrape merges all shards. The registry lock
+is taken when a thread records for the first time, when a thread exits (its
+shard is folded into a retired total), and during scrapes.
+
+    with timed('transformer'):
+        ...
+    inc('cache_lookups_total', outcome='hit')
+
+Stages recorded by the predictor and the Flask routes go to
+predictcart_stage_seconds{stage=...}: parse, tokenize, text_encoder,
+projection, featurize, transformer, uncertainty and serialize. Series are per
+process: with several gunicorn workers, each worker is scraped separately.
+"""
+import bisect
+import threading
+import time
+import weakref
+
+from config import SERVING_CONFIG
+
+PREFIX = 'predictcart_'
+# Histogram upper bounds in seconds (+Inf is implicit)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+METRICS = {
+    'stage_seconds': ('histogram', 'Time spent in each prediction stage'),
+    'request_seconds': ('histogram', 'Request latency by endpoint'),
+    'requests_total': ('counter', 'Requests by endpoint and status code'),
+    'errors_total': ('counter', 'Requests that failed with a server error'),
+    'validation_failures_total': ('counter', 'Requests rejected with a 4xx validation error'),
+    'cache_lookups_total': ('counter', 'Prediction cache lookups by outcome'),
+    'predictions_total': ('counter', 'Rows predicted by tier')
+}
+
+
+class _Shard:
+    """One thread's series; {(name, labels): [bucket counts..., sum, count]} or {(name, labels): [value]}."""
+    __slots__ = ('series', '__weakref__')
+    
+    def __init__(self):
+        self.series = {}
+
+
+class MetricsRegistry:
+    """Per-thread sharded histograms and counters."""
+    
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live = {}     # id -> series dict of live threads
+        self._retired = {}  # Series of threads that have exited
+    
+    def _series(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._live[id(shard)] = shard.series
+            # Fold the shard into the retired totals when its thread exits
+            weakref.finalize(shard, self._retire, id(shard))
+        return shard.series
+    
+    def _retire(self, key):
+        with self._lock:
+            series = self._live.pop(key, None)
+            if series:
+                _merge_into(self._retired, series)
+    
+    def observe(self, name, seconds, **labels):
+        """Record one value in a histogram."""
+        if self.enabled:
+            self._observe((name, tuple(sorted(labels.items()))), seconds)
+    
+    def _observe(self, key, seconds):
+        series = self._series()
+        values = series.get(key)
+        if values is None:
+            values = series[key] = [0] * (len(BUCKETS) + 3)
+        values[bisect.bisect_left(BUCKETS, seconds)] += 1
+        values[-2] += seconds
+        values[-1] += 1
+    
+    def inc(self, name, amount=1, **labels):
+        """Add to a counter."""
+        if not self.enabled:
+            return
+        series = self._series()
+        key = (name, tuple(sorted(labels.items())))
+        values = series.get(key)
+        if values is None:
+            values = series[key] = [0]
+        values[0] += amount
+    
+    def timed(self, stage):
+        """Context manager recording its duration in stage_seconds{stage=...}."""
+        return _Timer(self, ('stage_seconds', (('stage', stage),))) if self.enabled else _NULL_TIMER
+    
+    def snapshot(self):
+        """Merged series across all threads."""
+        with self._lock:
+            shards = [list(series.items()) for series in self._live.values()]
+            merged = {key: list(values) for key, values in self._retired.items()}
+        for items in shards:
+            _merge_into(merged, dict(items))
+        return merged
+    
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        merged = self.snapshot()
+        lines = []
+        for name in sorted({key[0] for key in merged}):
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines.append(f'# HELP {PREFIX}{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}{name} {kind}')
+            for (series_name, labels), values in sorted(merged.items()):
+                if series_name != name:
+                    continue
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + (float('inf'),), values[:-2]):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{PREFIX}{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                    lines.append(f'{PREFIX}{name}_sum{_format_labels(labels)} {values[-2]!r}')
+                    lines.append(f'{PREFIX}{name}_count{_format_labels(labels)} {values[-1]}')
+                else:
+                    lines.append(f'{PREFIX}{name}{_format_labels(labels)} {values[0]}')
+        return '\n'.join(lines) + '\n'
+    
+    def reset(self):
+        with self._lock:
+            self._retired.clear()
+            for series in self._live.values():
+                series.clear()
+
+
+class _Timer:
+    __slots__ = ('registry', 'key', 'start')
+    
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.registry._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _merge_into(target, series):
+    for key, values in series.items():
+        existing = target.get(key)
+        if existing is None:
+            target[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                existing[i] += value
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+# Process-wide registry used by the predictor and the web apps
+registry = MetricsRegistry(enabled=SERVING_CONFIG['metrics_enabled'])
+observe = registry.observe
+inc = registry.inc
+timed = registry.timed
+render = registry.render
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def instrument_flask(app):
+    """Request latency / status counters for every route, plus GET /metrics."""
+    from flask import Response, g, request
+    
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+    
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None or not registry.enabled:
+            return response
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        status = response.status_code
+        
+        def record_latency():
+            registry.observe('request_seconds', time.perf_counter() - start, endpoint=endpoint)
+        
+        if response.is_streamed:
+            # Streamed bodies (batch / columnar) are generated after this hook; time until the response closes
+            response.call_on_close(record_latency)
+        else:
+            record_latency()
+        registry.inc('requests_total', endpoint=endpoint, status=str(status))
+        if status >= 500:
+            registry.inc('errors_total', endpoint=endpoint)
+        elif status >= 400:
+            registry.inc('validation_failures_total', endpoint=endpoint)
+        return response
+    
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """Prometheus scrape endpoint."""
+        return Response(render(), content_type=CONTENT_TYPE)
+    
+    return app
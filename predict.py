@@ -4,76 +4,331 @@ Handles model loading, input preprocessing, and prediction.
 """
 import torch
 import numpy as np
-import pickle
+import hashlib
 import os
-from transformers import AutoTokenizer, AutoModel
-from transformer import MultimodalPriceTransformer
-from config import MODEL_CONFIG, MODEL_SAVE_PATH, DATA_PATH
-from preprocessing_utils import FeaturePreparation
+import threading
+import time
+import zlib
+from transformer import (MultimodalPriceTransformer, InferencePriceTransformer, SimplePricePredictor,
+                         attention_rollout, TOKEN_NAMES)
+from config import (MODEL_CONFIG, MODEL_SAVE_PATH, DATA_PATH, DISTILLATION_CONFIG,
+                    TEXT_ENCODER_CONFIG, SERVING_CONFIG)
+from preprocessing_utils import load_feature_prep, load_transform_info
+from serving_bundle import ServingBundle
+from text_encoders import get_text_encoder, load_text_projection, text_space
+from catalog_index import load_catalog_index
+from metrics import timed, inc
+from profiling import profiled
+from uncertainty import (mc_dropout_model, mc_samples, samples_for_budget, intervals, interval_confidence,
+                         load_calibration)
+
+class ModelSet:
+    """
+    Price model, its inference copy and the optional student, served together
+    with the featurizer they were trained with.
+    
+    Never mutated: reloading builds a new ModelSet and swaps the reference, so a
+    request that picked up a ModelSet finishes on it even if a swap happens.
+    `mc_model` (dropout on) and `calibration` back the uncertainty intervals;
+    `transform_info`, `feature_prep` and `text_projection` come from the same
+    bundle (or DATA_PATH) as the weights. `catalog_index` is loaded with them;
+    `index_exact` says whether its stored tokens are in the text space this set
+    serves (if not, the index only provides neighbours).
+    """
+    
+    def __init__(self, model, inference_model, student_model, version, source, mc_model=None, calibration=None,
+                 transform_info=None, feature_prep=None, text_projection=None, catalog_index=None,
+                 index_exact=False):
+        self.model = model
+        self.inference_model = inference_model
+        self.student_model = student_model
+        self.version = version
+        self.source = source
+        self.mc_model = mc_model
+        self.calibration = calibration
+        self.transform_info = transform_info or {}
+        self.feature_prep = feature_prep
+        self.text_projection = text_projection
+        self.catalog_index = catalog_index
+        self.index_exact = index_exact
+
+
+def price_confidence(predicted_price):
+    """Confidence from typical price ranges (lower for extreme predictions); works on arrays."""
+    predicted_price = np.asarray(predicted_price)
+    return np.where((predicted_price < 100) | (predicted_price > 100000), 0.6,
+                    np.where((predicted_price < 500) | (predicted_price > 50000), 0.75, 0.9))
+
+
+def checkpoint_version(path):
+    """Version string for a checkpoint file: name + content hash prefix."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return f"{os.path.basename(path)}-{digest.hexdigest()[:12]}"
+
 
 class PricePredictor:
     """Handles all prediction operations for the frontend."""
     
-    def __init__(self, model_path=None, device=None):
+    def __init__(self, model_path=None, device=None, progress_callback=None):
+        """
+        Args:
+            progress_callback: optional fn(stage, fraction) reporting load progress
+        """
         print("🚀 Initializing Price Predictor...")
+        progress = progress_callback or (lambda stage, fraction: None)
         
         # Setup device
         self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         print(f"   Using device: {self.device}")
         
-        # Load BERT model for text embeddings
-        print("   Loading BERT model...")
-        self.tokenizer = AutoTokenizer.from_pretrained('bert-base-uncased')
-        self.bert_model = AutoModel.from_pretrained('bert-base-uncased').to(self.device)
-        self.bert_model.eval()
+        # Load text encoder backend (TEXT_ENCODER_CONFIG['backend'])
+        progress('text_encoder', 0.05)
+        print(f"   Loading '{TEXT_ENCODER_CONFIG['backend']}' text encoder...")
+        self.text_encoder = get_text_encoder(device=self.device)
+        print(f"   ✅ Text encoder: {self.text_encoder.describe()}")
+        
+        # Load price prediction model (+ optional student latency tier) and its featurizer
+        self.latency_ewma_ms = {'full': None, 'student': None}
+        self._last_full_time = 0.0
+        self._latency_lock = threading.Lock()  # Request threads update the EWMA concurrently
+        self._reload_lock = threading.Lock()
+        self.models = self.load_models(model_path, progress)
+        
+        progress('loaded', 1.0)
+        print(f"✅ Price Predictor ready! (model {self.model_version})")
+    
+    def load_models(self, model_path=None, progress=None):
+        """
+        Load the price model, student and featurizer into a new ModelSet.
+        
+        Uses the serving bundle when present (re-read on every call so a
+        rebuilt bundle is picked up), otherwise `model_path` / best_model.pth
+        with the featurizer from DATA_PATH.
         
-        # Load feature preprocessing info
+        Raises:
+            ValueError: if the bundle was built for a different text encoder
+                backend than the one loaded (restart to change backends)
+        """
+        progress = progress or (lambda stage, fraction: None)
+        bundle = None
+        if model_path is None and ServingBundle.exists(SERVING_CONFIG['bundle_path']):
+            bundle = ServingBundle(SERVING_CONFIG['bundle_path'])
+            print(f"   📦 Using serving bundle {bundle.version}")
+            backend = bundle.manifest.get('text_encoder', {}).get('backend')
+            if backend is not None and backend != self.text_encoder.name:
+                raise ValueError(f"Bundle {bundle.version} was built for the '{backend}' text encoder, "
+                                 f"but '{self.text_encoder.name}' is loaded")
+        
+        progress('feature_prep', 0.6)
+        transform_info, feature_prep, text_projection = self.load_featurizer(bundle)
+        
+        # Known-product index (exact matches skip the text encoder; neighbours give price context)
+        progress('catalog_index', 0.7)
+        catalog_index, index_exact = self.load_index(text_projection)
+        
+        progress('price_model', 0.75)
+        print("   Loading price prediction model...")
+        if bundle is not None:
+            model = bundle.load_model(self.device)
+            version, source = bundle.version, bundle.directory
+        else:
+            if model_path is None:
+                model_path = os.path.join(MODEL_SAVE_PATH, 'best_model.pth')
+            
+            model = MultimodalPriceTransformer(**MODEL_CONFIG).to(self.device)
+            
+            # Load checkpoint
+            checkpoint = torch.load(model_path, map_location=self.device)
+            if 'model_state_dict' in checkpoint:
+                model.load_state_dict(checkpoint['model_state_dict'])
+            else:
+                model.load_state_dict(checkpoint)
+            version, source = checkpoint_version(model_path), model_path
+        
+        model.eval()
+        
+        # Constant-folded, fast-path copy used for serving; the training module is kept for reference
+        inference_model = InferencePriceTransformer(model).to(self.device)
+        
+        # Optional distilled student used as a latency tier
+        student_model = None
+        student_path = DISTILLATION_CONFIG['student_model_path']
+        if bundle is not None:
+            student_model = bundle.load_student(self.device)
+        elif os.path.exists(student_path):
+            try:
+                student = SimplePricePredictor(MODEL_CONFIG['d_model']).to(self.device)
+                student.load_state_dict(torch.load(student_path, map_location=self.device))
+                student_model = student.eval()
+                print("   ✅ Distilled student loaded (latency tier)")
+            except Exception as e:
+                print(f"   ⚠️ Could not load student model: {e}")
+        
+        # Dropout-on copy for MC-dropout intervals, with its conformal calibration if fitted
+        return ModelSet(model, inference_model, student_model, version, source,
+                        mc_model=mc_dropout_model(model), calibration=load_calibration(version),
+                        transform_info=transform_info, feature_prep=feature_prep, text_projection=text_projection,
+                        catalog_index=catalog_index, index_exact=index_exact)
+    
+    def load_featurizer(self, bundle=None):
+        """
+        Target transform, feature preparation and text projection from `bundle` (or DATA_PATH).
+        
+        Returns:
+            (transform_info, feature_prep or None, text_projection or None)
+        """
+        artifacts_path = bundle.directory if bundle is not None else DATA_PATH
+        
+        # Fixed projection to d_model for backends that don't output it directly
+        text_projection = None
+        if self.text_encoder.output_dim != MODEL_CONFIG['d_model']:
+            if bundle is not None:
+                text_projection = bundle.load_text_projection(self.device)
+            if text_projection is None:
+                text_projection = load_text_projection(text_dim=self.text_encoder.output_dim).to(self.device)
+        
+        # Load feature preprocessing info (compact JSON/npz artifacts, legacy pickle fallback)
         print("   Loading feature preprocessors...")
-        transform_path = os.path.join(DATA_PATH, 'transform_info.pkl')
         try:
-            with open(transform_path, 'rb') as f:
-                self.transform_info = pickle.load(f)
+            transform_info = load_transform_info(artifacts_path)
         except Exception as e:
             print(f"   Warning: Could not load transform_info: {e}")
-            self.transform_info = {}
+            transform_info = {}
         
-        # Initialize feature preparation
-        self.feature_prep = FeaturePreparation()
-        
-        # Try to load feature prep if available
-        feature_prep_path = os.path.join(DATA_PATH, 'feature_prep.pkl')
         try:
-            with open(feature_prep_path, 'rb') as f:
-                loaded_prep = pickle.load(f)
-                if hasattr(loaded_prep, 'scalers'):
-                    self.feature_prep.scalers = loaded_prep.scalers
-                    self.feature_prep.fitted = loaded_prep.fitted
-                    print("   ✅ Loaded feature preprocessor from pickle")
+            feature_prep = load_feature_prep(artifacts_path)
         except Exception as e:
-            print(f"   Warning: Could not load feature_prep pickle: {e}")
-            print("   Using empty feature preparation")
+            print(f"   Warning: Could not load feature preparation: {e}")
+            feature_prep = None
         
-        # Load price prediction model
-        print("   Loading price prediction model...")
-        if model_path is None:
-            model_path = os.path.join(MODEL_SAVE_PATH, 'best_model.pth')
+        if feature_prep is not None and feature_prep.fitted:
+            print("   ✅ Loaded feature preprocessor")
+        else:
+            feature_prep = None
+            print("   Using fallback category encoding")
+        return transform_info, feature_prep, text_projection
+    
+    def load_index(self, text_projection=None):
+        """
+        Catalog index for a new ModelSet (re-read, so a rebuilt index is picked up on reload).
         
-        self.model = MultimodalPriceTransformer(**MODEL_CONFIG).to(self.device)
+        Returns:
+            (index or None, whether exact hits may use its stored tokens); the
+            tokens are only used when the index was built in the text space
+            this encoder and `text_projection` produce
+        """
+        index = load_catalog_index()
+        if index is None:
+            return None, False
+        if index.tokens.shape[1] != MODEL_CONFIG['d_model']:
+            print("   ⚠️ Catalog index dimension does not match the model; ignoring it")
+            return None, False
+        
+        space = text_space(self.text_encoder.name, self.text_encoder.version, text_projection)
+        if index.text_space != space:
+            print(f"   ⚠️ Catalog index tokens are in text space {index.text_space or '(unrecorded)'}, not {space}; "
+                  f"using it for neighbours only (rebuild with `python catalog_index.py build`)")
+            return index, False
+        return index, True
+    
+    def reload(self, model_path=None, batch_sizes=(1, 8, 32, 64)):
+        """
+        Load a new ModelSet, warm it up and swap it in atomically.
         
-        # Load checkpoint
-        checkpoint = torch.load(model_path, map_location=self.device)
-        if 'model_state_dict' in checkpoint:
-            self.model.load_state_dict(checkpoint['model_state_dict'])
-        else:
-            self.model.load_state_dict(checkpoint)
+        Requests already running keep the ModelSet they started with; new
+        requests see the new one as soon as the reference is replaced. The
+        featurizer, text projection and catalog index are reloaded with the
+        weights; the text encoder is not (restart to change backends).
+        
+        Returns:
+            (old_version, new_version)
+        """
+        with self._reload_lock:
+            candidate = self.load_models(model_path)
+            self.warm_up(batch_sizes, models=candidate)
+            previous = self.models
+            self.models = candidate
+            self.reset_latency()
+        print(f"🔄 Model swapped: {previous.version} → {candidate.version}")
+        return previous.version, candidate.version
+    
+    # Current ModelSet members (read self.models once when several are needed)
+    @property
+    def model(self):
+        return self.models.model
+    
+    @property
+    def inference_model(self):
+        return self.models.inference_model
+    
+    @property
+    def student_model(self):
+        return self.models.student_model
+    
+    @property
+    def model_version(self):
+        return self.models.version
+    
+    @property
+    def transform_info(self):
+        return self.models.transform_info
+    
+    @property
+    def feature_prep(self):
+        return self.models.feature_prep
+    
+    @property
+    def text_projection(self):
+        return self.models.text_projection
+    
+    @property
+    def catalog_index(self):
+        return self.models.catalog_index
+    
+    def warm_up(self, batch_sizes=(1, 8, 32, 64), models=None):
+        """
+        Run warm-up forwards so the first real requests don't pay one-time costs
+        (allocator growth, lazy kernel selection, text-encoder first call).
+        
+        Args:
+            models: ModelSet to warm (default: the current one, plus one full
+                predict_price through the text encoder)
+        
+        Returns:
+            dict of stage -> milliseconds
+        """
+        timings = {}
+        d_model = MODEL_CONFIG['d_model']
         
-        self.model.eval()
-        print("✅ Price Predictor ready!")
+        if models is None:
+            models = self.models
+            start = time.perf_counter()
+            self.predict_price('warm-up product', 'electronics')
+            timings['predict_price'] = (time.perf_counter() - start) * 1000
+        
+        for batch_size in batch_sizes:
+            tokens = torch.zeros(batch_size, 3, d_model, device=self.device)
+            start = time.perf_counter()
+            models.inference_model(tokens)
+            if models.student_model is not None:
+                with torch.inference_mode():
+                    models.student_model(tokens)
+            timings[f'batch_{batch_size}'] = (time.perf_counter() - start) * 1000
+        
+        # Warm-up latencies (and index lookups) are not representative of steady state
+        self.reset_latency()
+        if models.catalog_index is not None:
+            models.catalog_index.reset_stats()
+        return timings
     
     def get_available_categories(self):
         """Get list of available product categories."""
-        if 'category_encoder' in self.feature_prep:
-            categories = self.feature_prep['category_encoder'].classes_.tolist()
+        feature_prep = self.feature_prep
+        if feature_prep is not None:
+            categories = [c for c in feature_prep.vocabularies['main_category'] if c]
             return sorted(categories)
         else:
             # Fallback to common categories from your dataset
@@ -86,87 +341,142 @@ class PricePredictor:
             ])
     
     def encode_text(self, text):
-        """Encode product text using BERT."""
-        # Tokenize
-        inputs = self.tokenizer(
-            text,
-            return_tensors='pt',
-            padding=True,
-            truncation=True,
-            max_length=128
-        ).to(self.device)
-        
-        # Get BERT embeddings
-        with torch.no_grad():
-            outputs = self.bert_model(**inputs)
-            # Use CLS token embedding
-            text_embedding = outputs.last_hidden_state[:, 0, :]  # [1, 768]
-        
-            # Project to model dimension
-            d_model = MODEL_CONFIG['d_model']
-            if text_embedding.shape[-1] != d_model:
-                # Simple linear projection
-                projection = torch.nn.Linear(text_embedding.shape[-1], d_model).to(self.device)
-                projection.eval()
-                text_embedding = projection(text_embedding)
-        
-        return text_embedding.squeeze(0).detach().cpu().numpy()  # [d_model]
-    
-    def encode_category(self, category):
-        """Encode product category."""
-        d_model = MODEL_CONFIG['d_model']
+        """Encode product text with the configured text encoder."""
+        return self.encode_texts([text])[0]  # [d_model]
+    
+    def encode_texts(self, texts, models=None):
+        """Encode a batch of product texts in one text-encoder call ([N, d_model])."""
+        text_projection = (models or self.models).text_projection
+        text_embeddings = self.text_encoder.encode(list(texts))
+        if text_projection is None:
+            return text_embeddings
+        
+        # Project to model dimension
+        with timed('projection'), torch.inference_mode():
+            text_embeddings = text_projection(torch.as_tensor(text_embeddings, device=self.device))
+        return text_embeddings.cpu().numpy()
+    
+    def text_tokens(self, texts, models=None):
+        """
+        Text tokens for a batch, taking known products from the catalog index.
         
-        # Use encoder if available
-        if hasattr(self.feature_prep, 'encoders') and 'category_encoder' in self.feature_prep.encoders:
-            encoder = self.feature_prep.encoders['category_encoder']
-            try:
-                category_idx = encoder.transform([category])[0]
-            except:
-                # Unknown category - use mean encoding
-                category_idx = len(encoder.classes_) // 2
+        Only titles without an exact index match go through the text encoder
+        (and the text projection of `models`, default: the current ModelSet).
+        The index is only consulted when its tokens are in the set's text space.
+        
+        Returns:
+            (tokens [N, d_model], rows) where rows[i] is the matching index row or None
+        """
+        models = models or self.models
+        texts = list(texts)
+        index = models.catalog_index if models.index_exact else None
+        if index is not None:
+            with timed('index_lookup'):
+                rows = [index.exact(text) for text in texts]
         else:
-            # Simple hash-based encoding
-            category_idx = hash(category.lower()) % 100
+            rows = [None] * len(texts)
+        hits = [i for i, row in enumerate(rows) if row is not None]
+        misses = [i for i, row in enumerate(rows) if row is None]
+        
+        tokens = np.empty((len(texts), MODEL_CONFIG['d_model']), dtype=np.float32)
+        if hits:
+            tokens[hits] = index.tokens[[rows[i] for i in hits]]
+        if misses:
+            tokens[misses] = self.encode_texts([texts[i] for i in misses], models)
+        return tokens, rows
+    
+    def encode_category(self, category, models=None):
+        """Encode product category."""
+        d_model = MODEL_CONFIG['d_model']
         
         # Create embedding (simple one-hot style)
         category_embedding = np.zeros(d_model)
-        category_embedding[category_idx % d_model] = 1.0
+        category_embedding[self.category_index(category, models) % d_model] = 1.0
         
         return category_embedding
     
-    def prepare_numeric_features(self, ratings, no_of_ratings, discount_ratio=0.0):
-        """Prepare numeric features."""
-        d_model = MODEL_CONFIG['d_model']
+    def category_index(self, category, models=None):
+        """Category id used for the one-hot category token."""
+        feature_prep = (models or self.models).feature_prep
+        # Use fitted vocabulary if available
+        category_idx = -1
+        if feature_prep is not None:
+            category_idx = feature_prep.category_index('main_category', category)
+            if category_idx < 0:
+                # Unknown category - use mean encoding
+                category_idx = len(feature_prep.vocabularies['main_category']) // 2
         
-        # Create feature array
-        features = []
+        if category_idx < 0:
+            # Simple hash-based encoding (crc32 is stable across processes, unlike hash())
+            category_idx = zlib.crc32(category.lower().encode('utf-8')) % 100
         
-        # Ratings (0-5 scale)
-        features.append(ratings / 5.0)
+        return category_idx
+    
+    def prepare_numeric_features(self, ratings, no_of_ratings, discount_ratio=0.0):
+        """Prepare numeric features."""
+        return self.prepare_numeric_grid(ratings, no_of_ratings, discount_ratio)[0]
+    
+    def prepare_numeric_grid(self, ratings, no_of_ratings, discount_ratio):
+        """
+        Numeric tokens for arrays of inputs (broadcast against each other).
         
-        # Log number of ratings (log scale)
+        Returns:
+            [N, d_model] array, one numeric token per broadcast element
+        """
+        ratings, no_of_ratings, discount_ratio = (
+            np.ravel(a).astype(np.float64) for a in np.broadcast_arrays(ratings, no_of_ratings, discount_ratio)
+        )
         log_ratings = np.log1p(no_of_ratings)
-        features.append(log_ratings / 10.0)  # Normalize
-        
-        # Discount ratio (0-1)
-        features.append(discount_ratio)
         
-        # Popularity (derived from ratings count)
-        popularity = ratings * np.log1p(no_of_ratings)
-        features.append(popularity / 30.0)  # Normalize
+        features = np.stack([
+            ratings / 5.0,                  # Ratings (0-5 scale)
+            log_ratings / 10.0,             # Log number of ratings (normalized)
+            discount_ratio,                 # Discount ratio (0-1)
+            ratings * log_ratings / 30.0    # Popularity (derived from ratings count)
+        ], axis=1)
         
-        # Create embedding by repeating and padding
-        features = np.array(features)
-        numeric_embedding = np.zeros(d_model)
-        
-        # Repeat features to fill embedding
-        for i in range(d_model):
-            numeric_embedding[i] = features[i % len(features)]
+        # Repeat features to fill the embedding
+        d_model = MODEL_CONFIG['d_model']
+        return features[:, np.arange(d_model) % features.shape[1]]
+    
+    def choose_tier(self, latency_budget_ms=None, models=None, uncertainty_level=None):
+        """
+        Pick 'full' or 'student' for a request.
         
-        return numeric_embedding
+        The student answers only when a budget is given and the smoothed latency
+        of the full path would exceed it. After `probe_interval_s` without a full
+        measurement the estimate is treated as stale and the full path is retried.
+        A requested interval needs the MC-dropout model, so it always gets 'full'.
+        """
+        models = models or self.models
+        if latency_budget_ms is None or models.student_model is None or uncertainty_level is not None:
+            return 'full'
+        
+        with self._latency_lock:
+            full_ms, last_full_time = self.latency_ewma_ms['full'], self._last_full_time
+        stale = time.monotonic() - last_full_time > DISTILLATION_CONFIG['probe_interval_s']
+        if full_ms is None or stale or full_ms <= latency_budget_ms:
+            return 'full'
+        return 'student'
+    
+    def _record_latency(self, tier, elapsed_ms):
+        alpha = DISTILLATION_CONFIG['latency_ewma_alpha']
+        with self._latency_lock:
+            previous = self.latency_ewma_ms[tier]
+            self.latency_ewma_ms[tier] = elapsed_ms if previous is None else (
+                alpha * elapsed_ms + (1 - alpha) * previous)
+            if tier == 'full':
+                self._last_full_time = time.monotonic()
     
+    def reset_latency(self):
+        """Forget the smoothed tier latencies (after warm-up or a model swap)."""
+        with self._latency_lock:
+            self.latency_ewma_ms = {'full': None, 'student': None}
+    
+    @profiled
     def predict_price(self, product_name, category, ratings=4.0, no_of_ratings=100, 
-                     discount_ratio=0.0):
+                     discount_ratio=0.0, latency_budget_ms=None, return_details=False, neighbours=0,
+                     uncertainty_level=None):
         """
         Predict price for a product.
         
@@ -176,39 +486,238 @@ class PricePredictor:
             ratings: Product rating (0-5)
             no_of_ratings: Number of ratings
             discount_ratio: Discount ratio (0-1)
+            latency_budget_ms: Optional per-request budget; routes to the distilled
+                student when the full path is expected to miss it (ignored when an
+                interval is requested)
+            return_details: Also return a dict with the answering tier and latency
+            neighbours: Number of nearest known products (with prices) to add to details
+            uncertainty_level: Central coverage (e.g. 0.8) of an MC-dropout price interval;
+                confidence then comes from the interval width instead of price bands
         
         Returns:
             predicted_price: Predicted price in rupees
             confidence: Confidence score (0-1)
+            details: (only with return_details) {'tier', 'latency_ms', 'latency_budget_ms',
+                'model_version', 'index'} plus 'neighbours' and 'uncertainty' when requested;
+                'index' is 'exact' / 'miss' (None when the catalog index was not consulted)
         """
-        # Encode inputs
-        text_emb = self.encode_text(product_name)
-        category_emb = self.encode_category(category)
-        numeric_emb = self.prepare_numeric_features(ratings, no_of_ratings, discount_ratio)
-        
-        # Create 3-token sequence [text, category, numeric]
-        token_sequence = np.stack([text_emb, category_emb, numeric_emb], axis=0)  # [3, d_model]
-        token_sequence = torch.tensor(token_sequence, dtype=torch.float32).unsqueeze(0)  # [1, 3, d_model]
-        token_sequence = token_sequence.to(self.device)
+        start = time.perf_counter()
+        models = self.models  # Pinned for the whole request (hot reload may swap self.models)
+        tier = self.choose_tier(latency_budget_ms, models, uncertainty_level)
+        
+        # Encode inputs (the student skips BERT unless it was trained with the text token;
+        # known products take their token from the catalog index)
+        row, indexed, searchable = None, False, False
+        if tier == 'student' and not DISTILLATION_CONFIG['use_text_token']:
+            text_emb = np.zeros(MODEL_CONFIG['d_model'])
+        else:
+            text_emb, (row,) = self.text_tokens([product_name], models)
+            text_emb = text_emb[0]
+            indexed, searchable = models.index_exact, models.catalog_index is not None
+        with timed('featurize'):
+            category_emb = self.encode_category(category, models)
+            numeric_emb = self.prepare_numeric_features(ratings, no_of_ratings, discount_ratio)
+            
+            # Create 3-token sequence [text, category, numeric]
+            token_sequence = np.stack([text_emb, category_emb, numeric_emb], axis=0)  # [3, d_model]
+            token_sequence = torch.tensor(token_sequence, dtype=torch.float32).unsqueeze(0)  # [1, 3, d_model]
+            token_sequence = token_sequence.to(self.device)
         
         # Predict
-        with torch.no_grad():
-            log_price = self.model(token_sequence).squeeze().item()
+        with timed('transformer'):
+            if tier == 'student':
+                with torch.inference_mode():
+                    log_price = models.student_model(token_sequence).squeeze().item()
+            else:
+                log_price = models.inference_model(token_sequence).squeeze().item()
+        inc('predictions_total', tier=tier)
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._record_latency(tier, elapsed_ms)
         
         # Inverse transform to get actual price
         predicted_price = np.exp(log_price)
         
         # Calculate confidence (based on typical price ranges)
-        # Lower confidence for extreme predictions
-        if predicted_price < 100 or predicted_price > 100000:
-            confidence = 0.6
-        elif predicted_price < 500 or predicted_price > 50000:
-            confidence = 0.75
-        else:
-            confidence = 0.9
+        confidence = float(price_confidence(predicted_price))
+        
+        # The student approximates the full model, so report it slightly less confidently
+        if tier == 'student':
+            confidence -= 0.1
+        
+        # MC-dropout interval: K dropout passes over the same tokens as one batch
+        uncertainty = None
+        if uncertainty_level is not None:
+            mc_start = time.perf_counter()
+            num_samples = samples_for_budget(1)
+            with timed('uncertainty'):
+                interval = intervals(mc_samples(models.mc_model, token_sequence, num_samples),
+                                     uncertainty_level, models.calibration)
+            lower, upper = float(interval['lower'][0]), float(interval['upper'][0])
+            confidence = float(interval_confidence(predicted_price, lower, upper))
+            uncertainty = {
+                'level': uncertainty_level,
+                'lower': round(lower, 2),
+                'upper': round(upper, 2),
+                'std_log': round(float(interval['std_log'][0]), 4),
+                'samples': num_samples,
+                'calibrated': models.calibration is not None,
+                'latency_ms': round((time.perf_counter() - mc_start) * 1000, 3)
+            }
+        
+        if return_details:
+            details = {
+                'tier': tier,
+                'latency_ms': round(elapsed_ms, 3),
+                'latency_budget_ms': latency_budget_ms,
+                'model_version': models.version,
+                'index': ('exact' if row is not None else 'miss') if indexed else None
+            }
+            if neighbours > 0 and searchable:
+                details['neighbours'] = models.catalog_index.neighbours(text_emb, k=neighbours)
+            if uncertainty_level is not None:
+                details['uncertainty'] = uncertainty
+            return predicted_price, confidence, details
         
         return predicted_price, confidence
     
+    @profiled
+    def predict_sweep(self, product_name, category, discount_ratios, ratings=4.0, no_of_ratings=100):
+        """
+        Price curve for one product over a grid of discount ratios (and ratings).
+        
+        Text and category are encoded once; only the numeric token varies, and
+        the whole grid runs through the model as a single batch.
+        
+        Args:
+            discount_ratios: Discount values (0-1) to evaluate
+            ratings: A rating or a list of ratings; the grid is ratings x discounts
+        
+        Returns:
+            dict with 'points' (list of {'ratings', 'discount_ratio', 'price',
+            'confidence'}, ratings-major), 'model_version' and 'latency_ms'
+        """
+        start = time.perf_counter()
+        models = self.models
+        
+        discount_ratios = np.atleast_1d(np.asarray(discount_ratios, dtype=np.float64))
+        ratings = np.atleast_1d(np.asarray(ratings, dtype=np.float64))
+        if discount_ratios.ndim != 1 or ratings.ndim != 1:
+            raise ValueError("discount_ratios and ratings must be flat lists")
+        num_points = len(discount_ratios) * len(ratings)
+        if not 0 < num_points <= SERVING_CONFIG['sweep_max_points']:
+            raise ValueError(f"Sweep grid must have 1-{SERVING_CONFIG['sweep_max_points']} points, got {num_points}")
+        
+        grid_ratings, grid_discounts = (g.ravel() for g in np.meshgrid(ratings, discount_ratios, indexing='ij'))
+        
+        # Shared text/category tokens, one numeric token per grid point
+        d_model = MODEL_CONFIG['d_model']
+        token_sequences = torch.empty(num_points, 3, d_model, dtype=torch.float32)
+        token_sequences[:, 0] = torch.as_tensor(self.text_tokens([product_name], models)[0][0], dtype=torch.float32)
+        with timed('featurize'):
+            token_sequences[:, 1] = torch.as_tensor(self.encode_category(category, models), dtype=torch.float32)
+            token_sequences[:, 2] = torch.as_tensor(
+                self.prepare_numeric_grid(grid_ratings, no_of_ratings, grid_discounts), dtype=torch.float32
+            )
+        
+        with timed('transformer'):
+            log_prices = models.inference_model(token_sequences.to(self.device)).squeeze(-1).cpu().numpy()
+        inc('predictions_total', num_points, tier='sweep')
+        prices = np.exp(log_prices.astype(np.float64))
+        confidences = price_confidence(prices)
+        
+        points = [
+            {'ratings': float(r), 'discount_ratio': float(d), 'price': float(p), 'confidence': float(c)}
+            for r, d, p, c in zip(grid_ratings, grid_discounts, prices, confidences)
+        ]
+        return {
+            'points': points,
+            'model_version': models.version,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 3)
+        }
+    
+    @profiled
+    def predict_arrays(self, product_names, categories, ratings, no_of_ratings, discount_ratios,
+                       chunk_size=None, models=None):
+        """
+        Batched prediction over column arrays (no per-row Python dicts).
+        
+        Texts go through the text encoder and the model in chunks of
+        `chunk_size` rows (SERVING_CONFIG['batch_chunk_size']), so memory is
+        bounded by the chunk, not the input. `models` pins a ModelSet across calls.
+        
+        Returns:
+            dict with 'prices' and 'confidence' (float64 arrays) and 'model_version'
+        """
+        models = models or self.models
+        chunk_size = chunk_size or SERVING_CONFIG['batch_chunk_size']
+        categories, ratings, no_of_ratings, discount_ratios = self._columns(
+            len(product_names), categories, ratings, no_of_ratings, discount_ratios, models)
+        
+        log_prices = np.empty(len(product_names), dtype=np.float64)
+        for start in range(0, len(product_names), chunk_size):
+            end = min(start + chunk_size, len(product_names))
+            token_sequences = self._token_batch(product_names[start:end], categories[start:end], ratings[start:end],
+                                                no_of_ratings[start:end], discount_ratios[start:end], models)
+            with timed('transformer'):
+                log_prices[start:end] = models.inference_model(token_sequences).squeeze(-1).cpu().numpy()
+        inc('predictions_total', len(product_names), tier='batch')
+        
+        prices = np.exp(log_prices)
+        return {'prices': prices, 'confidence': price_confidence(prices), 'model_version': models.version}
+    
+    @profiled
+    def explain_arrays(self, product_names, categories, ratings, no_of_ratings, discount_ratios, models=None):
+        """
+        Batched prediction with token importance taken from the same forward pass.
+        
+        Returns:
+            dict with 'prices', 'confidence', 'importance' ([N, 3] attention rollout
+            over text/category/numeric), 'pooling' ([N, 3] pooling attention),
+            'layers' ([num_layers, N, 3, 3] head-averaged self-attention), 'tokens'
+            (the token names) and 'model_version'
+        """
+        models = models or self.models
+        columns = self._columns(len(product_names), categories, ratings, no_of_ratings, discount_ratios, models)
+        token_sequences = self._token_batch(product_names, *columns, models)
+        
+        with timed('transformer'):
+            log_prices, attention = models.inference_model(token_sequences, return_attention=True)
+        inc('predictions_total', len(product_names), tier='explain')
+        importance = attention_rollout(attention['layers'], attention['pooling'])
+        
+        prices = np.exp(log_prices.cpu().numpy().astype(np.float64))
+        return {
+            'prices': prices,
+            'confidence': price_confidence(prices),
+            'importance': importance.cpu().numpy().astype(np.float64),
+            'pooling': attention['pooling'].cpu().numpy().astype(np.float64),
+            'layers': attention['layers'].mean(dim=2).cpu().numpy().astype(np.float64),
+            'tokens': TOKEN_NAMES,
+            'model_version': models.version
+        }
+    
+    def _columns(self, num_rows, categories, ratings, no_of_ratings, discount_ratios, models=None):
+        """Category ids (once per distinct category) and numeric columns broadcast to `num_rows`."""
+        with timed('featurize'):
+            category_ids = {category: self.category_index(category, models) for category in set(categories)}
+            categories = np.fromiter((category_ids[c] for c in categories), dtype=np.int64,
+                                     count=num_rows) % MODEL_CONFIG['d_model']
+            return (categories, *(np.broadcast_to(np.asarray(column, dtype=np.float64), (num_rows,))
+                                  for column in (ratings, no_of_ratings, discount_ratios)))
+    
+    def _token_batch(self, product_names, category_ids, ratings, no_of_ratings, discount_ratios, models=None):
+        """[N, 3, d_model] model input on the predictor's device."""
+        text_tokens = self.text_tokens(product_names, models)[0]
+        with timed('featurize'):
+            token_sequences = torch.zeros(len(product_names), 3, MODEL_CONFIG['d_model'], dtype=torch.float32)
+            token_sequences[:, 0] = torch.as_tensor(text_tokens, dtype=torch.float32)
+            token_sequences[torch.arange(len(product_names)), 1, torch.as_tensor(category_ids)] = 1.0
+            token_sequences[:, 2] = torch.as_tensor(
+                self.prepare_numeric_grid(ratings, no_of_ratings, discount_ratios), dtype=torch.float32
+            )
+            return token_sequences.to(self.device)
+    
     def predict_batch(self, products):
         """
         Predict prices for multiple products.
@@ -219,33 +728,29 @@ class PricePredictor:
         Returns:
             List of (predicted_price, confidence) tuples
         """
-        results = []
-        for product in products:
-            price, confidence = self.predict_price(
-                product.get('product_name', ''),
-                product.get('category', 'electronics'),
-                product.get('ratings', 4.0),
-                product.get('no_of_ratings', 100),
-                product.get('discount_ratio', 0.0)
-            )
-            results.append((price, confidence))
-        
-        return results
+        result = self.predict_arrays(
+            [product.get('product_name', '') for product in products],
+            [product.get('category', 'electronics') for product in products],
+            [product.get('ratings', 4.0) for product in products],
+            [product.get('no_of_ratings', 100) for product in products],
+            [product.get('discount_ratio', 0.0) for product in products]
+        )
+        return [(float(p), float(c)) for p, c in zip(result['prices'], result['confidence'])]
 
 
 # Global predictor instance (singleton)
 _predictor = None
 
-def get_predictor():
-    """Get or create predictor instance."""
+def get_predictor(**kwargs):
+    """Get or create predictor instance (kwargs are used on first creation only)."""
     global _predictor
     if _predictor is None:
-        _predictor = PricePredictor()
+        _predictor = PricePredictor(**kwargs)
     return _predictor
 
 
-if __name__ == "__main__":
-    # Test the predictor
+def run_demo():
+    """Test the predictor on a few sample products."""
     print("\n" + "="*60)
     print("Testing Price Predictor")
     print("="*60 + "\n")
@@ -284,3 +789,32 @@ if __name__ == "__main__":
         print(f"Predicted Price: ₹{price:,.2f}")
         print(f"Confidence: {confidence*100:.1f}%")
         print("-" * 60)
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Price predictor: demo predictions or offline catalog scoring")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('demo', help='Predict a few sample products (default)')
+    
+    score_parser = subparsers.add_parser('score', help='Score a CSV/Parquet catalog into chunked outputs (resumable)')
+    score_parser.add_argument('input', help='Catalog file (.csv or .parquet)')
+    score_parser.add_argument('--output', required=True, help='Output directory (part files + manifest.json)')
+    score_parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    score_parser.add_argument('--threads', type=int, help='Torch threads per worker (default: cores / workers)')
+    score_parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per chunk / output file')
+    score_parser.add_argument('--column', action='append', default=[], metavar='FIELD=COLUMN',
+                              help='Map an input column, e.g. --column product_name=name (repeatable)')
+    score_parser.add_argument('--id-column', default='id', help='Column copied to the outputs when present')
+    score_parser.add_argument('--restart', action='store_true', help='Ignore the manifest and rescore everything')
+    args = parser.parse_args()
+    
+    if args.command == 'score':
+        from catalog_scoring import score_catalog
+        
+        score_catalog(args.input, args.output, workers=args.workers, chunk_size=args.chunk_size,
+                      threads=args.threads, columns=dict(c.split('=', 1) for c in args.column),
+                      id_column=args.id_column, restart=args.restart)
+    else:
+        run_demo()
@@ -0,0 +1,206 @@
+"""
+Response-level cache for repeated identical predictions.
+
+Entries are kept in LRU order up to `max_entries`, and each expires after
+`ttl_seconds`. Identical requests that arrive while the first is still being
+computed wait for that computation instead of starting their own
+(single-flight). The whole cache is dropped when the model version changes,
+so a hot reload never serves stale prices.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config import SERVING_CONFIG
+from metrics import inc
+
+# Outcome of a lookup, reported to clients
+HIT = 'hit'
+MISS = 'miss'
+COALESCED = 'coalesced'
+
+
+class _Flight:
+    """One in-progress computation that identical requests can wait on."""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PredictionCache:
+    """Thread-safe TTL + LRU cache with single-flight computation."""
+    
+    def __init__(self, max_entries=None, ttl_seconds=None, clock=time.monotonic):
+        self.max_entries = SERVING_CONFIG['prediction_cache_size'] if max_entries is None else max_entries
+        self.ttl_seconds = SERVING_CONFIG['prediction_cache_ttl_seconds'] if ttl_seconds is None else ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._flights = {}
+        self._version = None
+        self.hits = self.misses = self.coalesced = 0
+        self.evictions = self.expirations = self.invalidations = 0
+    
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl_seconds > 0
+    
+    def _check_version(self, version):
+        # Called with the lock held
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+    
+    def _lookup(self, key):
+        # Called with the lock held; the live entry for `key` or None
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                return entry
+            del self._entries[key]
+            self.expirations += 1
+        return None
+    
+    def get(self, key, version=None):
+        """
+        Cached value for `key` without computing or waiting; None when absent.
+        
+        Counts a hit or a miss like get_or_compute.
+        """
+        if not self.enabled:
+            return None
+        
+        with self._lock:
+            self._check_version(version)
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+    
+    def get_or_compute(self, key, compute, version=None, cacheable=None):
+        """
+        Cached value for `key`, computing it at most once across concurrent callers.
+        
+        Args:
+            compute: zero-argument function producing the value
+            version: model version the value depends on; a new version clears the cache
+            cacheable: optional predicate; values it rejects are returned but not stored
+        
+        Returns:
+            (value, outcome) with outcome HIT, MISS or COALESCED
+        """
+        if not self.enabled:
+            return compute(), MISS
+        
+        with self._lock:
+            self._check_version(version)
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1], HIT
+            
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, COALESCED
+        
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and self._version == version and (cacheable is None or cacheable(flight.value)):
+                    self._entries[key] = (self._clock() + self.ttl_seconds, flight.value)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            flight.done.set()
+        return flight.value, MISS
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Counters and hit rate for health endpoints (coalesced requests count as hits)."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'model_version': self._version
+            }
+
+
+def prediction_key(product_name, category, ratings, no_of_ratings, discount_ratio, neighbours=0,
+                   uncertainty_level=None):
+    """Cache key for a normalized /api/predict input."""
+    return (product_name.strip(), category.strip().lower(), float(ratings), int(no_of_ratings), float(discount_ratio),
+            int(neighbours), uncertainty_level)
+
+
+def cached_predict_price(cache, predictor, product_name, category, ratings=4.0, no_of_ratings=100,
+                         discount_ratio=0.0, latency_budget_ms=None, neighbours=0, uncertainty_level=None):
+    """
+    predict_price through the cache; returns (price, confidence, details).
+    
+    details gains 'cache' (hit / miss / coalesced); on a hit or coalesced answer
+    'latency_ms' is this request's own wait, not the original computation's.
+    Only full-model answers are stored or shared. Requests routed to the full
+    tier are computed without a budget, so every request coalesced onto them
+    gets the full model; requests routed to the student take a stored full
+    answer when there is one and otherwise compute their own.
+    """
+    start = time.perf_counter()
+    # The predictor sees the same normalized input the key is built from
+    product_name, category = product_name.strip(), category.strip().lower()
+    key = prediction_key(product_name, category, ratings, no_of_ratings, discount_ratio, neighbours,
+                         uncertainty_level)
+    
+    def predict(budget_ms):
+        return predictor.predict_price(product_name, category, ratings, no_of_ratings, discount_ratio,
+                                       latency_budget_ms=budget_ms, return_details=True,
+                                       neighbours=neighbours, uncertainty_level=uncertainty_level)
+    
+    if predictor.choose_tier(latency_budget_ms, uncertainty_level=uncertainty_level) == 'full':
+        result, outcome = cache.get_or_compute(key, lambda: predict(None), version=predictor.model_version,
+                                               cacheable=lambda result: result[2]['tier'] == 'full')
+    else:
+        result, outcome = cache.get(key, version=predictor.model_version), HIT
+        if result is None:
+            result, outcome = predict(latency_budget_ms), MISS
+    inc('cache_lookups_total', outcome=outcome)
+    
+    price, confidence, details = result
+    details = {**details, 'latency_budget_ms': latency_budget_ms, 'cache': outcome}
+    if outcome != MISS:
+        details['latency_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return price, confidence, details
@@ -0,0 +1,398 @@
+"""
+Background predictor loading for the web apps.
+
+The predictor (text encoder + transformer) is loaded in a daemon thread at
+process start and warmed up before it is reported ready, so no request ever
+blocks on model load. Health endpoints read `status()` to distinguish
+liveness (the process is serving) from readiness (predictions can be made).
+
+In preload mode (SERVING_CONFIG['preload'], set by gunicorn.conf.py) the
+master process loads synchronously instead, moves every model tensor into
+shared memory and freezes the GC heap, so forked workers map the weights
+read-only rather than each holding a private copy. `process_memory()` reports
+per-process unique memory (USS) to confirm the sharing.
+
+Hot reload: `PredictorLoader.reload()` (admin endpoint) or a `ModelWatcher`
+(SERVING_CONFIG['watch_models']) loads new weights in a background thread,
+warms them up and swaps them in with `PricePredictor.reload`; requests keep
+being served by the old model until the swap and in-flight ones finish on it.
+Reloaded weights are private to the process, so under pre-fork each worker
+reloads (and pays the memory) on its own.
+"""
+import gc
+import hmac
+import os
+import threading
+import time
+import traceback
+
+from config import SERVING_CONFIG, MODEL_SAVE_PATH
+from prediction_cache import PredictionCache
+
+# Loader states, in order
+IDLE = 'idle'
+LOADING = 'loading'
+WARMING_UP = 'warming_up'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class PredictorLoader:
+    """Loads and warms up the predictor once, in the background."""
+    
+    def __init__(self, factory=None, warmup_batch_sizes=None):
+        self._factory = factory
+        self.warmup_batch_sizes = warmup_batch_sizes or SERVING_CONFIG['warmup_batch_sizes']
+        self._lock = threading.Lock()
+        self._ready_event = threading.Event()
+        self._thread = None
+        self._predictor = None
+        self.state = IDLE
+        self.stage = None
+        self.progress = 0.0
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+        self._reload_thread = None
+        self.reload_state = None
+        self.reload_error = None
+        self.reloaded_at = None
+        self.previous_version = None
+    
+    def start(self, background=True):
+        """Start loading in a daemon thread, or in the caller's thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self.state = LOADING
+            self.started_at = time.time()
+            if background:
+                self._thread = threading.Thread(target=self._run, name='predictor-loader', daemon=True)
+                self._thread.start()
+                return self
+            self._thread = threading.current_thread()
+        self._run()
+        return self
+    
+    def _update(self, stage, progress):
+        self.stage = stage
+        self.progress = round(progress, 3)
+    
+    def _run(self):
+        try:
+            print("🔧 Loading predictor...")
+            self._update('importing', 0.02)
+            if self._factory is None:
+                from predict import get_predictor
+                predictor = get_predictor(progress_callback=lambda stage, p: self._update(stage, 0.9 * p))
+            else:
+                predictor = self._factory(lambda stage, p: self._update(stage, 0.9 * p))
+            
+            self.state = WARMING_UP
+            self._update('warming_up', 0.9)
+            timings = predictor.warm_up(self.warmup_batch_sizes)
+            print("🔥 Warm-up done: " + ', '.join(f"{k}={v:.1f}ms" for k, v in timings.items()))
+            
+            self._predictor = predictor
+            self.state = READY
+            self.ready_at = time.time()
+            self._update('ready', 1.0)
+            print(f"✅ Predictor ready in {self.ready_at - self.started_at:.1f}s")
+        except Exception as e:
+            self.error = str(e)
+            self.state = FAILED
+            print(f"❌ Failed to load predictor: {e}")
+            traceback.print_exc()
+        finally:
+            self._ready_event.set()
+    
+    @property
+    def ready(self):
+        return self.state == READY
+    
+    def get(self):
+        """The predictor if ready, else None (never blocks; starts loading if idle)."""
+        if self.state == IDLE:
+            self.start()
+        return self._predictor if self.state == READY else None
+    
+    def wait(self, timeout=None):
+        """Block until loading finishes (ready or failed); returns the predictor or None."""
+        self.start()
+        self._ready_event.wait(timeout)
+        return self.get()
+    
+    def reload(self, model_path=None, background=True):
+        """
+        Hot-reload the model weights (see PricePredictor.reload).
+        
+        Returns:
+            False if the predictor is not ready or a reload is already running
+        """
+        predictor = self.get()
+        if predictor is None:
+            return False
+        with self._lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return False
+            self.reload_state = 'reloading'
+            self.reload_error = None
+            if background:
+                self._reload_thread = threading.Thread(
+                    target=self._run_reload, args=(predictor, model_path),
+                    name='predictor-reload', daemon=True
+                )
+                self._reload_thread.start()
+                return True
+        self._run_reload(predictor, model_path)
+        return self.reload_state == 'reloaded'
+    
+    def _run_reload(self, predictor, model_path):
+        try:
+            print(f"🔄 Reloading model{f' from {model_path}' if model_path else ''}...")
+            self.previous_version, _ = predictor.reload(model_path, self.warmup_batch_sizes)
+            self.reloaded_at = time.time()
+            self.reload_state = 'reloaded'
+        except Exception as e:
+            # The old model keeps serving
+            self.reload_error = str(e)
+            self.reload_state = 'failed'
+            print(f"❌ Model reload failed, keeping {predictor.model_version}: {e}")
+            traceback.print_exc()
+    
+    def _catalog_index_status(self):
+        # Index stats plus whether exact hits currently use its tokens (False: neighbours only)
+        models = getattr(self._predictor, 'models', None)
+        index = getattr(models, 'catalog_index', None)
+        if index is None:
+            return None
+        return {**index.stats(), 'exact_tokens': models.index_exact}
+    
+    def status(self):
+        """Liveness/readiness snapshot for health endpoints."""
+        now = time.time()
+        return {
+            'live': True,
+            'ready': self.ready,
+            'state': self.state,
+            'stage': self.stage,
+            'progress': self.progress,
+            'error': self.error,
+            'loading_seconds': round((self.ready_at or now) - self.started_at, 1) if self.started_at else None,
+            'model_version': self._predictor.model_version if self.ready else None,
+            'catalog_index': self._catalog_index_status() if self.ready else None,
+            'reload': {
+                'state': self.reload_state,
+                'error': self.reload_error,
+                'previous_version': self.previous_version,
+                'reloaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.reloaded_at))
+                if self.reloaded_at else None
+            }
+        }
+
+
+def check_admin_token(token):
+    """True if `token` matches SERVING_CONFIG['admin_token'] (always False when none is configured)."""
+    expected = SERVING_CONFIG['admin_token']
+    return bool(expected) and token is not None and hmac.compare_digest(token, expected)
+
+
+def resolve_model_path(name):
+    """
+    Resolve a checkpoint requested through the admin API, confined to MODEL_SAVE_PATH.
+    
+    Raises:
+        ValueError: if the path escapes MODEL_SAVE_PATH or does not exist
+    """
+    root = os.path.realpath(MODEL_SAVE_PATH)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"model_path must be inside {MODEL_SAVE_PATH}")
+    if not os.path.isfile(path):
+        raise ValueError(f"model_path not found: {name}")
+    return path
+
+
+def watched_artifact():
+    """File whose change triggers a reload: the bundle manifest if present, else best_model.pth."""
+    manifest = os.path.join(SERVING_CONFIG['bundle_path'], 'bundle.json')
+    if os.path.exists(manifest):
+        return manifest
+    return os.path.join(MODEL_SAVE_PATH, 'best_model.pth')
+
+
+class ModelWatcher:
+    """
+    Polls the served model artifact and triggers a reload when it changes.
+    
+    A change must be seen unchanged on two consecutive polls (same mtime and
+    size) before reloading, so a checkpoint that is still being written is
+    never picked up half-way.
+    """
+    
+    def __init__(self, loader, poll_seconds=None, path_fn=watched_artifact):
+        self.loader = loader
+        self.poll_seconds = poll_seconds or SERVING_CONFIG['reload_poll_seconds']
+        self.path_fn = path_fn
+        self._stop = threading.Event()
+        self._thread = None
+        self._loaded = self._signature()
+        self._pending = None
+    
+    def _signature(self):
+        path = self.path_fn()
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return path, stat.st_mtime_ns, stat.st_size
+    
+    def check(self):
+        """One poll; returns True if a reload was started."""
+        signature = self._signature()
+        if signature is None or signature == self._loaded:
+            self._pending = None
+            return False
+        if signature != self._pending:
+            self._pending = signature  # Changed: wait one more poll for it to settle
+            return False
+        if not self.loader.reload():
+            return False  # Not ready or busy: retry on the next poll
+        self._loaded, self._pending = signature, None
+        return True
+    
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️ Model watcher error: {e}")
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+            self._thread.start()
+            print(f"👀 Watching {self.path_fn()} for new models (every {self.poll_seconds:g}s)")
+        return self
+    
+    def stop(self):
+        self._stop.set()
+
+
+def _predictor_modules(predictor):
+    """All nn.Modules held by the predictor, its current ModelSet and its text encoder."""
+    import torch
+    
+    modules = []
+    for owner in (predictor, getattr(predictor, 'models', None), getattr(predictor, 'text_encoder', None)):
+        if owner is None:
+            continue
+        for value in vars(owner).values():
+            if isinstance(value, torch.nn.Module) and all(value is not m for m in modules):
+                modules.append(value)
+    return modules
+
+
+def share_predictor_memory(predictor):
+    """
+    Move the predictor's CPU tensors into shared memory and freeze the GC heap.
+    
+    Call in the master right before forking: tensor data then lives in shared
+    mappings that workers never copy, and gc.freeze() keeps the collector from
+    writing to (and so copying) pages of the pre-fork object graph.
+    
+    Returns:
+        number of tensor bytes shared
+    """
+    shared_bytes = 0
+    seen = set()
+    for module in _predictor_modules(predictor):
+        module.share_memory()
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            storage = tensor.untyped_storage()
+            if storage.data_ptr() not in seen:
+                seen.add(storage.data_ptr())
+                shared_bytes += storage.nbytes()
+    
+    gc.collect()
+    gc.freeze()
+    return shared_bytes
+
+
+def process_memory(pid='self'):
+    """
+    RSS / PSS / USS / shared memory of a process in MB, from /proc/<pid>/smaps_rollup.
+    
+    USS (private clean + private dirty) is what a worker would free if it
+    exited; with working pre-fork sharing it stays far below RSS.
+    Returns None where smaps_rollup is unavailable (non-Linux).
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+    
+    def mb(*names):
+        return round(sum(fields.get(name, 0) for name in names) / 1024, 1)
+    
+    return {
+        'pid': os.getpid() if pid == 'self' else int(pid),
+        'rss_mb': mb('Rss'),
+        'pss_mb': mb('Pss'),
+        'uss_mb': mb('Private_Clean', 'Private_Dirty'),
+        'shared_mb': mb('Shared_Clean', 'Shared_Dirty')
+    }
+
+
+# Process-wide loader shared by the web apps
+_loader = None
+_loader_lock = threading.Lock()
+
+def get_loader(start=None):
+    """
+    Get (and by default start) the process-wide PredictorLoader.
+    
+    In preload mode the first call loads synchronously and shares the weights
+    for forked workers; otherwise loading happens in a background thread.
+    `start` defaults to SERVING_CONFIG['autoload'].
+    """
+    global _loader
+    with _loader_lock:
+        if _loader is None:
+            _loader = PredictorLoader()
+    if start is None:
+        start = SERVING_CONFIG['autoload'] or SERVING_CONFIG['preload']
+    if start:
+        preload = SERVING_CONFIG['preload']
+        _loader.start(background=not preload)
+        if preload and _loader.ready and not getattr(_loader, 'shared_bytes', None):
+            _loader.shared_bytes = share_predictor_memory(_loader.get())
+            print(f"🔗 Shared {_loader.shared_bytes / 1024 ** 2:.1f} MB of model tensors for forked workers")
+    return _loader
+
+
+_watcher = None
+_prediction_cache = None
+
+def start_watching(loader=None):
+    """Start the process-wide ModelWatcher (call per worker, after fork)."""
+    global _watcher
+    loader = loader or get_loader()
+    with _loader_lock:
+        if _watcher is None:
+            _watcher = ModelWatcher(loader).start()
+    return _watcher
+
+
+def get_prediction_cache():
+    """Process-wide PredictionCache shared by the web apps."""
+    global _prediction_cache
+    with _loader_lock:
+        if _prediction_cache is None:
+            _prediction_cache = PredictionCache()
+    return _prediction_cache
@@ -1,19 +1,46 @@
 """
 Feature Preprocessing Utilities for E-Commerce Price Prediction
 Extracted from PREPROCESSING_PIPELINE.ipynb for use in the web application.
+
+Fitted state is saved as a compact, versioned artifact (JSON vocabularies plus an
+.npz of scaler parameters) so serving never has to import sklearn or unpickle it.
 """
+import json
+import os
+import pickle
+
 import numpy as np
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+# Bump when the on-disk layout of the compact artifact changes
+FEATURE_PREP_FORMAT = 'predictcart.feature_prep'
+FEATURE_PREP_VERSION = 1
+FEATURE_PREP_JSON = 'feature_prep.json'
+FEATURE_PREP_NPZ = 'feature_prep.npz'
+TRANSFORM_INFO_JSON = 'transform_info.json'
+
+CATEGORY_COLUMNS = ['main_category', 'sub_category']
+CATEGORY_ENCODINGS = ('onehot', 'index')
+NUMERIC_FEATURES = ['discount_price', 'actual_price', 'discount_ratio',
+                    'popularity', 'ratings', 'log_no_of_ratings']
 
 
 class FeaturePreparation:
-    def __init__(self, scale_target=False):
+    def __init__(self, scale_target=False, category_encoding='onehot'):
         """
         Enhanced Feature Preparation with CRITICAL FIX for negative values issue.
-        
+
         Args:
             scale_target: Whether to scale target variable (DISABLED to prevent negative values)
+            category_encoding: 'onehot' for dense float64 one-hot matrices, or 'index' for
+                int32 vocabulary ids (unknown categories map to id len(vocabulary)),
+                meant for an embedding lookup downstream
         """
+        if category_encoding not in CATEGORY_ENCODINGS:
+            raise ValueError(f"category_encoding must be one of {CATEGORY_ENCODINGS}")
+
+        # sklearn is only needed for fitting; load() restores without it
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
         # Updated parameter from 'sparse' to 'sparse_output'
         self.main_category_encoder = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
         self.sub_category_encoder = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
@@ -22,10 +49,16 @@ class FeaturePreparation:
         # CRITICAL FIX: Target scaler conditionally initialized
         self.scale_target = scale_target
         self.target_scaler = StandardScaler() if scale_target else None
+        self.category_encoding = category_encoding
 
         self.fitted = False
         self.target_fitted = False
 
+        # Plain-numpy copies of the fitted state, used by transform() and save()
+        self.vocabularies = {}
+        self.numeric_params = {}
+        self.target_params = {}
+
         # Enhanced statistics storage for debugging
         self.original_target_stats = {}
         self.log_transformed_stats = {}
@@ -42,16 +75,15 @@ class FeaturePreparation:
         print(f"   - Will use log-transformed targets directly for training")
         if not scale_target:
             print(f"   - 🔧 FIX: Prevents negative values that break inverse transformation")
-    
+
     def fit(self, df):
         """Fit encoders and scalers to the data."""
         print("Fitting category encoders and numeric scaler...")
         self.main_category_encoder.fit(df[['main_category']])
         self.sub_category_encoder.fit(df[['sub_category']])
 
-        numeric_features = ['discount_price', 'actual_price', 'discount_ratio',
-                            'popularity', 'ratings', 'log_no_of_ratings']
-        self.numeric_scaler.fit(df[numeric_features])
+        self.numeric_scaler.fit(df[NUMERIC_FEATURES])
+        self._sync_fitted_params()
         self.fitted = True
 
         print("✅ Feature fitting complete!")
@@ -80,7 +112,7 @@ class FeaturePreparation:
                 print(f"⚠️  WARNING: Found {np.sum(y < 0)} negative values in log-transformed data!")
             else:
                 print(f"✅ GOOD: All {len(y)} log-transformed values are non-negative")
-        
+
         if self.scale_target and self.target_scaler is not None:
             # Fit the scaler only if enabled
             y_reshaped = y.reshape(-1, 1)
@@ -88,10 +120,11 @@ class FeaturePreparation:
             print(f"✅ Target scaler fitted!")
             print(f"   Scaler mean_: {self.target_scaler.mean_[0]:.4f}")
             print(f"   Scaler scale_: {self.target_scaler.scale_[0]:.4f}")
+            self.target_params = _scaler_params(self.target_scaler)
         else:
             print(f"🔧 Target scaling DISABLED - using log-transformed values directly")
             print(f"   This prevents negative values that break inverse transformation")
-        
+
         self.target_fitted = True
         return self
 
@@ -100,10 +133,10 @@ class FeaturePreparation:
         if not self.target_fitted:
             raise ValueError("Target scaler is not fitted yet.")
 
-        if self.scale_target and self.target_scaler is not None:
-            y_transformed = self.target_scaler.transform(y.reshape(-1, 1)).flatten()
+        if self.scale_target and self.target_params:
+            y_transformed = _standardize(y.reshape(-1, 1), self.target_params).flatten()
             print(f"Target scaling: {np.min(y):.4f}-{np.max(y):.4f} → {np.min(y_transformed):.4f}-{np.max(y_transformed):.4f}")
-            
+
             # CRITICAL CHECK: Warn if scaling creates negative values
             if np.any(y_transformed < 0):
                 neg_count = np.sum(y_transformed < 0)
@@ -121,8 +154,9 @@ class FeaturePreparation:
         if not self.target_fitted:
             raise ValueError("Target scaler is not fitted yet.")
 
-        if self.scale_target and self.target_scaler is not None:
-            y_unscaled = self.target_scaler.inverse_transform(y_scaled.reshape(-1, 1)).flatten()
+        if self.scale_target and self.target_params:
+            y_unscaled = (y_scaled.reshape(-1, 1) * self.target_params['scale']
+                          + self.target_params['mean']).flatten()
             print(f"Inverse scaling: {np.min(y_scaled):.4f}-{np.max(y_scaled):.4f} → {np.min(y_unscaled):.4f}-{np.max(y_unscaled):.4f}")
             return y_unscaled
         else:
@@ -137,20 +171,26 @@ class FeaturePreparation:
 
         print("Transforming features...")
 
-        # One-hot encode categories
-        main_cat_encoded = self.main_category_encoder.transform(df[['main_category']])
-        sub_cat_encoded = self.sub_category_encoder.transform(df[['sub_category']])
-        
+        # Encode categories: one-hot (unknown -> all-zero row) or vocabulary ids (unknown -> OOV id)
+        if self.category_encoding == 'index':
+            main_cat_encoded = self.category_ids('main_category', df['main_category'])
+            sub_cat_encoded = self.category_ids('sub_category', df['sub_category'])
+        else:
+            main_cat_encoded = self._one_hot('main_category', df['main_category'])
+            sub_cat_encoded = self._one_hot('sub_category', df['sub_category'])
+
         # Scale numeric features
-        numeric_features = ['discount_price', 'actual_price', 'discount_ratio',
-                           'popularity', 'ratings', 'log_no_of_ratings']
-        numeric_scaled = self.numeric_scaler.transform(df[numeric_features])
+        numeric_values = np.asarray(df[NUMERIC_FEATURES], dtype=np.float64)
+        numeric_scaled = _standardize(numeric_values, self.numeric_params)
 
-        # Optionally add Gaussian noise to numeric features (for uncertainty modeling)
+        # Optionally add Gaussian noise to numeric features (for uncertainty modeling).
+        # This bakes in one fixed draw; prefer TRAINING_CONFIG['noise_augmentation'],
+        # which redraws noise for every training batch.
         if add_noise:
             noise = np.random.normal(0, noise_level, numeric_scaled.shape)
             numeric_scaled = numeric_scaled + noise
             print(f"Adding Gaussian noise (level={noise_level})...")
+            print("   ⚠️  Fixed noise draw - use TRAINING_CONFIG['noise_augmentation'] for per-batch noise")
 
         print("✅ Feature transformation complete!")
 
@@ -164,3 +204,294 @@ class FeaturePreparation:
         """Convenience method to fit and transform in one step."""
         self.fit(df)
         return self.transform(df, add_noise, noise_level)
+
+    def category_index(self, column, value):
+        """Vocabulary index of a category value, or -1 if it was not seen in fit."""
+        return self._category_lookup(column).get(_vocab_key(value), -1)
+
+    def category_ids(self, column, values):
+        """
+        Vocabulary ids for a column of category values.
+
+        Unknown values get the reserved OOV id len(vocabulary), which the
+        embedding lookup maps to the same output as an all-zero one-hot row.
+        """
+        ids = self._lookup_ids(column, values)
+        ids[ids < 0] = len(self.vocabularies[column])
+        return ids.astype(np.int32)
+
+    @property
+    def category_vocab_sizes(self):
+        """Vocabulary size per category column (excluding the OOV id)."""
+        return {column: len(vocab) for column, vocab in self.vocabularies.items()}
+
+    def _lookup_ids(self, column, values):
+        lookup = self._category_lookup(column)
+        return np.fromiter((lookup.get(_vocab_key(v), -1) for v in values),
+                           dtype=np.int64, count=len(values))
+
+    def _category_lookup(self, column):
+        # Built lazily so that load() stays cheap for large vocabularies
+        lookups = self.__dict__.setdefault('_lookups', {})
+        if column not in lookups:
+            lookups[column] = {v: i for i, v in enumerate(self.vocabularies[column])}
+        return lookups[column]
+
+    def _one_hot(self, column, values):
+        ids = self._lookup_ids(column, values)
+        encoded = np.zeros((len(ids), len(self.vocabularies[column])), dtype=np.float64)
+        known = ids >= 0
+        encoded[np.nonzero(known)[0], ids[known]] = 1.0
+        return encoded
+
+    def _sync_fitted_params(self):
+        """Copy fitted sklearn state into the plain-numpy attributes."""
+        self.vocabularies = {
+            'main_category': [_vocab_key(v) for v in self.main_category_encoder.categories_[0]],
+            'sub_category': [_vocab_key(v) for v in self.sub_category_encoder.categories_[0]],
+        }
+        self.numeric_params = _scaler_params(self.numeric_scaler)
+        self.__dict__.pop('_lookups', None)
+
+    # ------------------------------------------------------------------
+    # Compact serialization
+    # ------------------------------------------------------------------
+    def save(self, directory):
+        """
+        Save fitted state as feature_prep.json + feature_prep.npz.
+
+        Returns:
+            (json_path, npz_path)
+        """
+        if not self.fitted:
+            raise ValueError("FeaturePreparation is not fitted yet.")
+
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, FEATURE_PREP_JSON)
+        npz_path = os.path.join(directory, FEATURE_PREP_NPZ)
+
+        arrays = {f'numeric_{k}': v for k, v in self.numeric_params.items()}
+        arrays.update({f'target_{k}': v for k, v in self.target_params.items()})
+        np.savez(npz_path, **arrays)
+
+        meta = {
+            'format': FEATURE_PREP_FORMAT,
+            'version': FEATURE_PREP_VERSION,
+            'scale_target': self.scale_target,
+            'category_encoding': self.category_encoding,
+            'fitted': self.fitted,
+            'target_fitted': self.target_fitted,
+            'numeric_features': NUMERIC_FEATURES,
+            'vocabularies': self.vocabularies,
+            'original_target_stats': self.original_target_stats,
+            'log_transformed_stats': self.log_transformed_stats,
+            'scaled_target_stats': self.scaled_target_stats,
+            'transformation_metadata': self.transformation_metadata,
+        }
+        with open(json_path, 'w') as f:
+            json.dump(_to_jsonable(meta), f, indent=2)
+
+        print(f"💾 Saved feature preparation to {json_path} (+ {FEATURE_PREP_NPZ})")
+        return json_path, npz_path
+
+    @classmethod
+    def load(cls, directory):
+        """Load a compact artifact written by save(). Does not import sklearn."""
+        with open(os.path.join(directory, FEATURE_PREP_JSON)) as f:
+            meta = json.load(f)
+
+        if meta.get('format') != FEATURE_PREP_FORMAT:
+            raise ValueError(f"Not a feature preparation artifact: {directory}")
+        if meta.get('version', 0) > FEATURE_PREP_VERSION:
+            raise ValueError(f"Feature preparation artifact version {meta['version']} is newer "
+                             f"than supported version {FEATURE_PREP_VERSION}")
+        if meta['numeric_features'] != NUMERIC_FEATURES:
+            raise ValueError(f"Artifact numeric features {meta['numeric_features']} "
+                             f"do not match {NUMERIC_FEATURES}")
+
+        with np.load(os.path.join(directory, FEATURE_PREP_NPZ)) as arrays:
+            numeric_params = {k[len('numeric_'):]: arrays[k] for k in arrays.files if k.startswith('numeric_')}
+            target_params = {k[len('target_'):]: arrays[k] for k in arrays.files if k.startswith('target_')}
+
+        prep = cls.__new__(cls)
+        prep.scale_target = meta['scale_target']
+        prep.category_encoding = meta.get('category_encoding', 'onehot')
+        prep.fitted = meta['fitted']
+        prep.target_fitted = meta['target_fitted']
+        prep.vocabularies = meta['vocabularies']
+        prep.numeric_params = numeric_params
+        prep.target_params = target_params
+        prep.original_target_stats = meta.get('original_target_stats', {})
+        prep.log_transformed_stats = meta.get('log_transformed_stats', {})
+        prep.scaled_target_stats = meta.get('scaled_target_stats', {})
+        prep.transformation_metadata = meta.get('transformation_metadata', {})
+
+        # sklearn objects are rebuilt on demand by to_sklearn()
+        prep.main_category_encoder = None
+        prep.sub_category_encoder = None
+        prep.numeric_scaler = None
+        prep.target_scaler = None
+        return prep
+
+    @classmethod
+    def from_pickle(cls, path):
+        """Load a legacy feature_prep.pkl pickled from the preprocessing notebook."""
+        with open(path, 'rb') as f:
+            return cls.from_fitted(_LegacyUnpickler(f).load())
+
+    @classmethod
+    def from_fitted(cls, fitted):
+        """Copy of a FeaturePreparation fitted elsewhere (e.g. the notebooks' own class)."""
+        prep = cls.__new__(cls)
+        prep.__dict__.update(vars(fitted))
+        prep.__dict__.setdefault('target_params', {})
+        prep.__dict__.setdefault('category_encoding', 'onehot')
+        if prep.fitted:
+            prep._sync_fitted_params()
+        if prep.scale_target and prep.target_scaler is not None and prep.target_fitted:
+            prep.target_params = _scaler_params(prep.target_scaler)
+        return prep
+
+    def to_sklearn(self):
+        """Rebuild fitted sklearn encoders/scalers (identical to the originals) for training."""
+        import pandas as pd
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+        for column in CATEGORY_COLUMNS:
+            encoder = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
+            encoder.fit(pd.DataFrame({column: self.vocabularies[column]}))
+            setattr(self, f'{column}_encoder', encoder)
+
+        self.numeric_scaler = _restore_scaler(StandardScaler(), self.numeric_params, NUMERIC_FEATURES)
+        if self.scale_target:
+            self.target_scaler = StandardScaler()
+            if self.target_params:
+                _restore_scaler(self.target_scaler, self.target_params)
+        else:
+            self.target_scaler = None
+        return self
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """Resolves FeaturePreparation pickled from a notebook's __main__."""
+
+    def find_class(self, module, name):
+        if name == 'FeaturePreparation':
+            return FeaturePreparation
+        return super().find_class(module, name)
+
+
+def _vocab_key(value):
+    """JSON-safe vocabulary key (missing values map to None)."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return str(value)
+
+
+def _scaler_params(scaler):
+    return {
+        'mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scale': np.asarray(scaler.scale_, dtype=np.float64),
+        'var': np.asarray(scaler.var_, dtype=np.float64),
+        'n_samples_seen': np.asarray(scaler.n_samples_seen_, dtype=np.int64),
+    }
+
+
+def _restore_scaler(scaler, params, feature_names=None):
+    scaler.mean_ = params['mean'].copy()
+    scaler.scale_ = params['scale'].copy()
+    scaler.var_ = params['var'].copy()
+    n_seen = params['n_samples_seen']
+    scaler.n_samples_seen_ = int(n_seen) if n_seen.ndim == 0 else n_seen.copy()
+    scaler.n_features_in_ = len(scaler.mean_)
+    if feature_names is not None:
+        scaler.feature_names_in_ = np.asarray(feature_names, dtype=object)
+    return scaler
+
+
+def _standardize(values, params):
+    # Same operation order as StandardScaler.transform, so results match exactly
+    values = values - params['mean']
+    values /= params['scale']
+    return values
+
+
+def _to_jsonable(obj):
+    if isinstance(obj, dict):
+        return {str(k): _to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_jsonable(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def save_transform_info(transform_info, directory):
+    """Save transform_info as JSON next to the feature preparation artifact."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, TRANSFORM_INFO_JSON)
+    with open(path, 'w') as f:
+        json.dump(_to_jsonable(transform_info), f, indent=2)
+    return path
+
+
+def load_transform_info(directory):
+    """Load transform_info, preferring the JSON file over the legacy pickle."""
+    json_path = os.path.join(directory, TRANSFORM_INFO_JSON)
+    if os.path.exists(json_path):
+        with open(json_path) as f:
+            return json.load(f)
+
+    with open(os.path.join(directory, 'transform_info.pkl'), 'rb') as f:
+        return pickle.load(f)
+
+
+def load_feature_prep(directory):
+    """
+    Load FeaturePreparation from directory.
+
+    Uses the compact artifact when present and falls back to the legacy
+    feature_prep.pkl (which needs sklearn). Returns None if neither loads.
+    """
+    if os.path.exists(os.path.join(directory, FEATURE_PREP_JSON)):
+        return FeaturePreparation.load(directory)
+
+    pickle_path = os.path.join(directory, 'feature_prep.pkl')
+    if os.path.exists(pickle_path):
+        prep = FeaturePreparation.from_pickle(pickle_path)
+        print(f"   ⚠️  Loaded legacy {pickle_path}; run "
+              f"`python preprocessing_utils.py convert {directory}` for faster startup")
+        return prep
+
+    return None
+
+
+def save_feature_artifacts(feature_prep, transform_info, directory):
+    """Write feature_prep.json/.npz and transform_info.json for a fitted FeaturePreparation (any class)."""
+    FeaturePreparation.from_fitted(feature_prep).save(directory)
+    path = save_transform_info(transform_info, directory)
+    print(f"💾 Saved transform info to {path}")
+
+
+def convert_legacy_artifacts(directory):
+    """Convert feature_prep.pkl / transform_info.pkl into the compact formats."""
+    prep = FeaturePreparation.from_pickle(os.path.join(directory, 'feature_prep.pkl'))
+    prep.save(directory)
+
+    legacy_info = os.path.join(directory, 'transform_info.pkl')
+    if os.path.exists(legacy_info):
+        with open(legacy_info, 'rb') as f:
+            path = save_transform_info(pickle.load(f), directory)
+        print(f"💾 Saved transform info to {path}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 3 and sys.argv[1] == 'convert':
+        convert_legacy_artifacts(sys.argv[2])
+    else:
+        print("Usage: python preprocessing_utils.py convert <data_dir>")
+        sys.exit(1)
@@ -0,0 +1,212 @@
+"""
+On-demand profiling of the live predictor (POST /api/admin/profile).
+
+Two modes, at most one session at a time per process:
+
+- torch: the next N predictions run under torch.profiler. Each one writes a
+  Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+- sample: a background thread samples every thread's Python stack at a fixed
+  interval for a time window. It writes one collapsed-stack file for
+  flamegraph.pl or speedscope.
+
+Files go to SERVING_CONFIG['profile_dir']. When no session is running, the
+sampler thread does not exist and the torch profiler is never started.
+`@profiled` prediction methods then cost one attribute check.
+Sessions are per process: with several gunicorn workers, only the worker that
+handled the admin request is profiled.
+
+    @profiled
+    def predict_price(self, ...):
+        ...
+"""
+import collections
+import functools
+import os
+import sys
+import threading
+import time
+
+from config import SERVING_CONFIG
+
+
+class Profiler:
+    """Arms torch.profiler for the next N predictions, or runs a wall-clock stack sampler."""
+    
+    def __init__(self, output_dir=None):
+        self.output_dir = output_dir or SERVING_CONFIG['profile_dir']
+        self.tracing = False  # Checked on every @profiled call; everything else is off the hot path
+        self._lock = threading.Lock()
+        self._trace_lock = threading.Lock()  # torch.profiler supports one active profile per process
+        self._remaining = 0
+        self._traced = 0
+        self._session = None
+        self._sampler = None
+        self._sampling_until = None
+        self._files = collections.deque(maxlen=50)
+    
+    def trace_predictions(self, count):
+        """
+        Profile the next `count` predictions with torch.profiler.
+        
+        Returns:
+            False if a session is already running
+        
+        Raises:
+            ValueError: if count is outside [1, profile_max_predictions]
+        """
+        if not 1 <= count <= SERVING_CONFIG['profile_max_predictions']:
+            raise ValueError(f"predictions must be between 1 and {SERVING_CONFIG['profile_max_predictions']}")
+        with self._lock:
+            if self._busy():
+                return False
+            self._remaining, self._traced = count, 0
+            self._session = self._stamp()
+            self.tracing = True
+        print(f"🔬 Profiling the next {count} predictions with torch.profiler")
+        return True
+    
+    def start_sampling(self, seconds, interval_ms=None):
+        """
+        Sample all thread stacks every `interval_ms` for `seconds` (background thread).
+        
+        Returns:
+            False if a session is already running
+        
+        Raises:
+            ValueError: if seconds or interval_ms are out of range
+        """
+        interval_ms = interval_ms or SERVING_CONFIG['profile_interval_ms']
+        if not 0 < seconds <= SERVING_CONFIG['profile_max_seconds']:
+            raise ValueError(f"seconds must be in (0, {SERVING_CONFIG['profile_max_seconds']}]")
+        if not 1 <= interval_ms <= 1000:
+            raise ValueError("interval_ms must be between 1 and 1000")
+        with self._lock:
+            if self._busy():
+                return False
+            self._session = self._stamp()
+            self._sampling_until = time.time() + seconds
+            self._sampler = threading.Thread(target=self._sample, args=(seconds, interval_ms / 1000.0, self._session),
+                                             name='predictcart-sampler', daemon=True)
+            self._sampler.start()
+        print(f"🔬 Sampling stacks every {interval_ms:g} ms for {seconds:g} s")
+        return True
+    
+    def wait(self, timeout=None):
+        """Block until the sampling window (if any) has finished."""
+        sampler = self._sampler
+        if sampler is not None:
+            sampler.join(timeout)
+    
+    def status(self):
+        with self._lock:
+            sampling = self._sampler is not None and self._sampler.is_alive()
+            return {
+                'tracing': self.tracing,
+                'remaining_predictions': self._remaining if self.tracing else 0,
+                'sampling': sampling,
+                'sampling_until': self._sampling_until if sampling else None,
+                'output_dir': self.output_dir,
+                'files': list(self._files)
+            }
+    
+    def _busy(self):
+        return self.tracing or (self._sampler is not None and self._sampler.is_alive())
+    
+    def _stamp(self):
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    
+    def _path(self, name):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, name)
+        self._files.append(path)
+        return path
+    
+    def call(self, name, fn, args, kwargs):
+        """Run one prediction, under torch.profiler if a trace slot is left."""
+        # Concurrent predictions while another is being traced run unprofiled
+        if not self._trace_lock.acquire(blocking=False):
+            return fn(*args, **kwargs)
+        slot = False
+        try:
+            with self._lock:
+                slot = self._remaining > 0
+                if slot:
+                    self._remaining -= 1
+                    self._traced += 1
+                    index, session = self._traced, self._session
+            if not slot:
+                return fn(*args, **kwargs)
+            
+            import torch
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            with torch.profiler.profile(activities=activities, record_shapes=True) as prof:
+                with torch.profiler.record_function(name):
+                    result = fn(*args, **kwargs)
+            
+            try:
+                prof.export_chrome_trace(self._path(f"trace-{session}-{index:03d}-{name.split('.')[-1]}.json"))
+            except Exception as e:
+                print(f"   ⚠️ Could not write profiler trace: {e}")
+            return result
+        finally:
+            # End the session after its last slot, even if that prediction raised
+            if slot:
+                with self._lock:
+                    if self._remaining <= 0 and self.tracing:
+                        self.tracing = False
+                        print(f"✅ Profiled {index} predictions → {self.output_dir}")
+            self._trace_lock.release()
+    
+    def _sample(self, seconds, interval, session):
+        own = threading.get_ident()
+        counts = collections.Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        next_sample = time.perf_counter()
+        while next_sample < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    counts[collapse_stack(frame, names.get(ident, f'thread-{ident}'))] += 1
+            samples += 1
+            next_sample += interval
+            time.sleep(max(0.0, next_sample - time.perf_counter()))
+        
+        try:
+            path = self._path(f"sample-{session}.collapsed")
+            with open(path, 'w') as f:
+                for stack, count in counts.most_common():
+                    f.write(f"{stack} {count}\n")
+            print(f"✅ Sampled {samples} stacks → {path}")
+        except Exception as e:
+            print(f"   ⚠️ Could not write stack samples: {e}")
+
+
+def collapse_stack(frame, thread_name):
+    """'thread;file:function;...' from the root to `frame` (collapsed-stack format)."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ';'.join(reversed(names)).replace(' ', '_')
+
+
+# Process-wide profiler controlled by /api/admin/profile
+profiler = Profiler()
+
+
+def profiled(fn):
+    """Decorator: route calls through the profiler while a torch trace session is armed."""
+    name = fn.__qualname__
+    
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not profiler.tracing:
+            return fn(*args, **kwargs)
+        return profiler.call(name, fn, args, kwargs)
+    
+    return wrapper
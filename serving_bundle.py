@@ -0,0 +1,318 @@
+"""
+Versioned serving bundle: everything PricePredictor needs in one directory.
+
+    serving_bundle/
+        bundle.json            format/version, model config, text encoder, tensor index
+        weights.safetensors    model, optional student and text projection weights
+        transform_info.json    target transform
+        feature_prep.json/.npz featurizer parameters (when available)
+
+Weights use the safetensors layout (8-byte header length, JSON header, raw
+little-endian data) and are read by parsing the header and mapping the file
+with mmap: tensors are torch.frombuffer views into the mapping and modules are
+built on the meta device and filled with load_state_dict(assign=True), so no
+weight bytes are copied or unpickled at startup and pages are only faulted in
+when first used.
+
+Usage:
+    python serving_bundle.py build [--output DIR] [--model PATH]
+    python serving_bundle.py benchmark [--bundle DIR] [--repeats N]
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+
+import torch
+import torch.nn as nn
+
+from config import (MODEL_CONFIG, MODEL_SAVE_PATH, DATA_PATH, DISTILLATION_CONFIG,
+                    TEXT_ENCODER_CONFIG, SERVING_CONFIG)
+from preprocessing_utils import (load_feature_prep, load_transform_info, save_transform_info,
+                                 FEATURE_PREP_JSON, FEATURE_PREP_NPZ)
+
+BUNDLE_FORMAT = 'predictcart.serving_bundle'
+BUNDLE_VERSION = 1
+BUNDLE_JSON = 'bundle.json'
+WEIGHTS_FILE = 'weights.safetensors'
+
+# safetensors dtype codes
+_DTYPE_CODES = {
+    torch.float64: 'F64', torch.float32: 'F32', torch.float16: 'F16', torch.bfloat16: 'BF16',
+    torch.int64: 'I64', torch.int32: 'I32', torch.int16: 'I16', torch.int8: 'I8',
+    torch.uint8: 'U8', torch.bool: 'BOOL'
+}
+_CODE_DTYPES = {code: dtype for dtype, code in _DTYPE_CODES.items()}
+
+
+def save_safetensors(tensors, path, metadata=None):
+    """Write a dict of tensors in the safetensors format."""
+    header = {}
+    offset = 0
+    blobs = []
+    for name, tensor in tensors.items():
+        tensor = tensor.detach().cpu().contiguous()
+        data = tensor.numpy().tobytes() if tensor.dtype != torch.bfloat16 else \
+            tensor.view(torch.int16).numpy().tobytes()
+        header[name] = {
+            'dtype': _DTYPE_CODES[tensor.dtype],
+            'shape': list(tensor.shape),
+            'data_offsets': [offset, offset + len(data)]
+        }
+        blobs.append(data)
+        offset += len(data)
+    if metadata:
+        header['__metadata__'] = {k: str(v) for k, v in metadata.items()}
+    
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * (-len(header_bytes) % 8)  # Keep tensor data 8-byte aligned
+    
+    # Write aside and rename: a live server keeps its mapping of the old file intact
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for data in blobs:
+            f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+class SafetensorsFile:
+    """Read-only safetensors file: header parsed eagerly, tensor data mmap'd and viewed lazily."""
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header_length = struct.unpack('<Q', f.read(8))[0]
+            header = json.loads(f.read(header_length))
+            # ACCESS_COPY: private copy-on-write mapping, so frombuffer gets a writable
+            # buffer while clean pages stay shared through the page cache
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        
+        self.metadata = header.pop('__metadata__', {})
+        self._header = header
+        self._data_start = 8 + header_length
+    
+    def keys(self):
+        return list(self._header)
+    
+    def get(self, name):
+        """Zero-copy tensor view into the mapped file."""
+        info = self._header[name]
+        dtype = _CODE_DTYPES[info['dtype']]
+        start, end = info['data_offsets']
+        if end == start:
+            return torch.empty(info['shape'], dtype=dtype)
+        
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        tensor = torch.frombuffer(self._mmap, dtype=dtype, count=count, offset=self._data_start + start)
+        return tensor.reshape(info['shape'])
+    
+    def state_dict(self, prefix=''):
+        """Tensors whose name starts with `prefix`, with the prefix stripped."""
+        return {name[len(prefix):]: self.get(name) for name in self._header if name.startswith(prefix)}
+    
+    def has_prefix(self, prefix):
+        return any(name.startswith(prefix) for name in self._header)
+
+
+def _materialize(module_factory, state_dict, device):
+    """Build a module on the meta device and adopt the given tensors (no init, no copy on CPU)."""
+    with torch.device('meta'):
+        module = module_factory()
+    module.load_state_dict(state_dict, assign=True)
+    return module.to(device).eval()
+
+
+class ServingBundle:
+    """Lazily opened serving bundle directory."""
+    
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, BUNDLE_JSON)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != BUNDLE_FORMAT:
+            raise ValueError(f"Not a serving bundle: {directory}")
+        if self.manifest.get('format_version', 0) > BUNDLE_VERSION:
+            raise ValueError(f"Serving bundle format {self.manifest['format_version']} is newer than supported")
+        self._weights = None
+    
+    @staticmethod
+    def exists(directory):
+        return bool(directory) and os.path.exists(os.path.join(directory, BUNDLE_JSON))
+    
+    @property
+    def version(self):
+        return self.manifest['bundle_version']
+    
+    @property
+    def model_config(self):
+        return self.manifest['model_config']
+    
+    @property
+    def weights(self):
+        if self._weights is None:
+            self._weights = SafetensorsFile(os.path.join(self.directory, WEIGHTS_FILE))
+        return self._weights
+    
+    def load_model(self, device='cpu'):
+        from transformer import MultimodalPriceTransformer
+        return _materialize(lambda: MultimodalPriceTransformer(**self.model_config),
+                            self.weights.state_dict('model.'), device)
+    
+    def load_student(self, device='cpu'):
+        """Distilled student, or None if the bundle has none."""
+        from transformer import SimplePricePredictor
+        if not self.weights.has_prefix('student.'):
+            return None
+        return _materialize(lambda: SimplePricePredictor(self.model_config['d_model']),
+                            self.weights.state_dict('student.'), device)
+    
+    def load_text_projection(self, device='cpu'):
+        """Fixed text projection, or None if the bundle has none."""
+        if not self.weights.has_prefix('text_projection.'):
+            return None
+        state = self.weights.state_dict('text_projection.')
+        out_features, in_features = state['weight'].shape
+        return _materialize(lambda: nn.Linear(in_features, out_features), state, device)
+    
+    def load_transform_info(self):
+        return load_transform_info(self.directory)
+    
+    def load_feature_prep(self):
+        return load_feature_prep(self.directory)
+
+
+def build_bundle(output_dir=None, model_path=None, data_path=DATA_PATH):
+    """
+    Package the current model, student, text projection and featurizer as a bundle.
+    
+    Returns:
+        path of bundle.json
+    """
+    output_dir = output_dir or SERVING_CONFIG['bundle_path']
+    model_path = model_path or os.path.join(MODEL_SAVE_PATH, 'best_model.pth')
+    os.makedirs(output_dir, exist_ok=True)
+    
+    checkpoint = torch.load(model_path, map_location='cpu')
+    tensors = {f'model.{k}': v for k, v in checkpoint.get('model_state_dict', checkpoint).items()}
+    
+    student_path = DISTILLATION_CONFIG['student_model_path']
+    if os.path.exists(student_path):
+        tensors.update({f'student.{k}': v for k, v in torch.load(student_path, map_location='cpu').items()})
+    
+    projection_path = TEXT_ENCODER_CONFIG['text_projection_path']
+    if os.path.exists(projection_path):
+        tensors.update({f'text_projection.{k}': v
+                        for k, v in torch.load(projection_path, map_location='cpu').items()})
+    
+    weights_path = os.path.join(output_dir, WEIGHTS_FILE)
+    save_safetensors(tensors, weights_path, {'format': BUNDLE_FORMAT})
+    with open(weights_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    
+    # Featurizer: compact artifacts copied as-is (legacy pickles are converted on load)
+    save_transform_info(load_transform_info(data_path), output_dir)
+    feature_prep = load_feature_prep(data_path)
+    if feature_prep is not None:
+        feature_prep.save(output_dir)
+    else:
+        for name in (FEATURE_PREP_JSON, FEATURE_PREP_NPZ):
+            stale = os.path.join(output_dir, name)
+            if os.path.exists(stale):
+                os.remove(stale)
+    
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'format_version': BUNDLE_VERSION,
+        'bundle_version': f"{time.strftime('%Y%m%d-%H%M%S')}-{digest[:12]}",
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'weights_sha256': digest,
+        'model_config': MODEL_CONFIG,
+        'text_encoder': {'backend': TEXT_ENCODER_CONFIG['backend']},
+        'components': sorted({name.split('.', 1)[0] for name in tensors}),
+        'has_feature_prep': feature_prep is not None,
+        'source_model': os.path.basename(model_path)
+    }
+    # Manifest last and atomically: it is what hot reload watches (predictor_service.ModelWatcher)
+    manifest_path = os.path.join(output_dir, BUNDLE_JSON)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    
+    size_mb = os.path.getsize(weights_path) / 1024 ** 2
+    print(f"📦 Serving bundle {manifest['bundle_version']} written to {output_dir} "
+          f"({len(tensors)} tensors, {size_mb:.1f} MB, components: {', '.join(manifest['components'])})")
+    return manifest_path
+
+
+def _load_legacy(model_path, data_path):
+    """Today's startup path: pickled state dict + pickled/JSON featurizer artifacts."""
+    from transformer import MultimodalPriceTransformer
+    model = MultimodalPriceTransformer(**MODEL_CONFIG)
+    checkpoint = torch.load(model_path, map_location='cpu')
+    model.load_state_dict(checkpoint.get('model_state_dict', checkpoint))
+    model.eval()
+    student_path = DISTILLATION_CONFIG['student_model_path']
+    if os.path.exists(student_path):
+        torch.load(student_path, map_location='cpu')
+    return model, load_transform_info(data_path), load_feature_prep(data_path)
+
+
+def _load_bundle(directory):
+    bundle = ServingBundle(directory)
+    return bundle.load_model(), bundle.load_student(), bundle.load_transform_info(), bundle.load_feature_prep()
+
+
+def benchmark(bundle_dir=None, model_path=None, data_path=DATA_PATH, repeats=20):
+    """
+    Median startup time of the legacy load path vs the bundle (text encoder excluded,
+    it is identical for both). Returns a dict of milliseconds.
+    """
+    import contextlib
+    import io
+    
+    bundle_dir = bundle_dir or SERVING_CONFIG['bundle_path']
+    model_path = model_path or os.path.join(MODEL_SAVE_PATH, 'best_model.pth')
+    
+    def timed(fn):
+        samples = []
+        for _ in range(repeats):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                fn()
+                samples.append((time.perf_counter() - start) * 1000)
+        return sorted(samples)[len(samples) // 2]
+    
+    results = {
+        'legacy_ms': timed(lambda: _load_legacy(model_path, data_path)),
+        'bundle_ms': timed(lambda: _load_bundle(bundle_dir))
+    }
+    results['speedup'] = results['legacy_ms'] / results['bundle_ms']
+    print(f"⏱️  Startup (median of {repeats}): legacy {results['legacy_ms']:.1f} ms | "
+          f"bundle {results['bundle_ms']:.1f} ms | {results['speedup']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build or benchmark the serving bundle")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    build_parser = subparsers.add_parser('build', help='Package model + featurizer into a bundle')
+    build_parser.add_argument('--output', help='Bundle directory')
+    build_parser.add_argument('--model', help='Model checkpoint (default: best_model.pth)')
+    
+    bench_parser = subparsers.add_parser('benchmark', help='Compare startup time with the legacy path')
+    bench_parser.add_argument('--bundle', help='Bundle directory')
+    bench_parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+    
+    if args.command == 'build':
+        build_bundle(args.output, args.model)
+    else:
+        benchmark(args.bundle, repeats=args.repeats)
@@ -55,6 +55,10 @@ def test_health_endpoint():
         
         print(f"Status: {data.get('status')}")
         print(f"Model Loaded: {data.get('model_loaded')}")
+        print(f"Loading: {data.get('stage')} ({data.get('progress', 0) * 100:.0f}%)")
+        
+        ready = requests.get(f"{BASE_URL}/api/health/ready", timeout=5)
+        print(f"Readiness probe: {ready.status_code}")
         
         if data.get('model_loaded'):
             print_success("Model is loaded and ready")
@@ -0,0 +1,165 @@
+"""
+Tests for bulk prediction I/O (no model artifacts needed).
+
+    python -m pytest -q test_batch_io.py
+"""
+import io
+import json
+
+import numpy as np
+import pytest
+
+import batch_io
+from batch_io import iter_json_rows, stream_predictions, score_columns
+
+
+ROWS = [{'id': i, 'product_name': f'item {i}', 'category': 'Books', 'ratings': 4.0, 'discount_ratio': 0.1}
+        for i in range(10)]
+
+
+class FakePredictor:
+    """predict_arrays stand-in: price = ratings * 100 + no_of_ratings."""
+    
+    class models:
+        version = 'fake-1'
+    
+    def __init__(self):
+        self.calls = []
+    
+    def predict_arrays(self, names, categories, ratings, no_of_ratings, discounts, models=None):
+        self.calls.append(len(names))
+        prices = np.asarray(ratings) * 100 + np.asarray(no_of_ratings)
+        return {'prices': prices, 'confidence': np.full(len(names), 0.9), 'model_version': models.version}
+
+
+def read_rows(body, read_size=7):
+    batch_io.READ_SIZE = read_size  # Small reads split rows across chunks
+    try:
+        return list(iter_json_rows(io.BytesIO(body.encode('utf-8')), max_row_bytes=200))
+    finally:
+        batch_io.READ_SIZE = 64 * 1024
+
+
+def test_ndjson_and_array_bodies_decode_the_same_rows():
+    ndjson = '\n'.join(json.dumps(row) for row in ROWS) + '\n'
+    array = '  [' + ', '.join(json.dumps(row) for row in ROWS) + ']'
+    
+    for body in (ndjson, array):
+        rows = read_rows(body)
+        assert [row for row, _ in rows] == ROWS
+        assert all(error is None for _, error in rows)
+
+
+def test_bad_ndjson_lines_only_fail_their_row():
+    body = '\n'.join([json.dumps(ROWS[0]), '{"broken', json.dumps({'x': 'y' * 300}), json.dumps(ROWS[1])])
+    
+    rows = read_rows(body)
+    
+    assert [row for row, _ in rows] == [ROWS[0], None, None, ROWS[1]]
+    assert 'Malformed JSON' in str(rows[1][1])
+    assert 'exceeds' in str(rows[2][1])
+
+
+def test_stream_keeps_order_and_reports_row_errors():
+    rows = [(ROWS[0], None), ({'product_name': 'x'}, None), (None, ValueError('Malformed JSON')),
+            ({**ROWS[1], 'no_of_ratings': 7}, None)]
+    predictor = FakePredictor()
+    
+    lines = [json.loads(line) for chunk in stream_predictions(predictor, iter(rows), chunk_size=2)
+             for line in chunk.splitlines()]
+    
+    assert predictor.calls == [1, 1]  # One model call per micro-batch of valid rows
+    assert [line.get('index') for line in lines[:-1]] == [0, 1, 2, 3]
+    assert lines[0] == {'index': 0, 'id': 0, 'price': 500.0, 'confidence': 90.0}
+    assert lines[1]['error'] == 'Missing required field: category'
+    assert lines[2]['error'] == 'Malformed JSON'
+    assert lines[3]['price'] == 407.0
+    assert lines[-1]['done'] and lines[-1]['rows'] == 4 and lines[-1]['errors'] == 2
+
+
+def test_score_columns_validates_with_array_ops():
+    columns = {
+        'product_name': ['a', None, 'c', '  ', 'e'],
+        'category': ['Books', 'books', 'books', 'books', 'books'],
+        'ratings': [4.0, 4.0, 7.0, 4.0, np.nan],
+        'no_of_ratings': np.array([1, 2, 3, 4, 5])
+    }
+    predictor = FakePredictor()
+    
+    scored = score_columns(predictor, columns, FakePredictor.models, offset=100)
+    
+    assert predictor.calls == [1]
+    assert scored['index'].tolist() == [100, 101, 102, 103, 104]
+    assert scored['price'][0] == 401.0 and np.isnan(scored['price'][1:]).all()
+    assert scored['error'].tolist() == [None, 'Missing required field: product_name', 'Ratings must be between 0 and 5',
+                                        'Missing required field: product_name', 'Ratings must be between 0 and 5']
+
+
+def test_msgpack_stream_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    body = b''.join(msgpack.packb({'id': [r['id'] for r in ROWS[i:i + 4]],
+                                   'product_name': [r['product_name'] for r in ROWS[i:i + 4]],
+                                   'category': [r['category'] for r in ROWS[i:i + 4]]})
+                    for i in range(0, len(ROWS), 4))
+    
+    chunks = batch_io.stream_msgpack_predictions(FakePredictor(), io.BytesIO(body))
+    results = list(msgpack.Unpacker(io.BytesIO(b''.join(chunks)), raw=False))
+    
+    assert [len(r['index']) for r in results[:-1]] == [4, 4, 2]
+    assert results[2]['id'] == [8, 9] and results[2]['price'] == [500.0, 500.0]
+    assert results[-1]['done'] and results[-1]['rows'] == 10 and results[-1]['model_version'] == 'fake-1'
+
+
+def test_arrow_stream_round_trip():
+    pa = pytest.importorskip('pyarrow')
+    table = pa.table({'id': [r['id'] for r in ROWS], 'product_name': [r['product_name'] for r in ROWS],
+                      'category': [r['category'] for r in ROWS], 'ratings': [4.5] * 9 + [None]})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=6):
+            writer.write_batch(batch)
+    
+    chunks = batch_io.stream_arrow_predictions(FakePredictor(), pa.BufferReader(sink.getvalue()))
+    result = pa.ipc.open_stream(b''.join(chunks)).read_all()
+    
+    assert result.schema.metadata[b'model_version'] == b'fake-1'
+    assert result.column('id').to_pylist() == list(range(10))
+    assert result.column('price').to_pylist() == [550.0] * 9 + [None]
+    assert result.column('error').to_pylist()[-1] == 'Ratings must be between 0 and 5'
+
+
+def test_small_ndjson_body_within_one_read():
+    body = '\n'.join(json.dumps(row) for row in ROWS[:3]) + '\n'
+    
+    for text in (body, body.rstrip('\n'), '\n\n' + body):
+        rows = read_rows(text, read_size=batch_io.READ_SIZE)  # Default size: the whole body in the first read
+        assert [row for row, _ in rows] == ROWS[:3] and all(error is None for _, error in rows)
+
+
+def test_infinite_rating_counts_are_row_errors():
+    rows = read_rows('\n'.join([json.dumps(ROWS[0]), '{"product_name": "a", "category": "b", "no_of_ratings": 1e400}',
+                                json.dumps(ROWS[1])]))
+    lines = [json.loads(line) for chunk in stream_predictions(FakePredictor(), iter(rows))
+             for line in chunk.splitlines()]
+    
+    assert [line.get('price') for line in lines[:3]] == [500.0, None, 500.0]
+    assert 'Invalid input' in lines[1]['error'] and lines[-1]['done'] and lines[-1]['errors'] == 1
+    
+    columns = {'product_name': ['a', 'b', 'c'], 'category': ['x'] * 3, 'no_of_ratings': [10, np.inf, -np.inf]}
+    scored = score_columns(FakePredictor(), columns, FakePredictor.models)
+    assert scored['price'][0] == 410.0 and np.isnan(scored['price'][1:]).all()
+    assert scored['error'].tolist() == [None] + ['Invalid input: no_of_ratings must be finite'] * 2
+
+
+def test_msgpack_scalar_columns_are_rejected():
+    msgpack = pytest.importorskip('msgpack')
+    body = msgpack.packb({'product_name': 'abc', 'category': ['books'] * 3})
+    
+    with pytest.raises(ValueError, match='product_name'):
+        next(batch_io.stream_msgpack_predictions(FakePredictor(), io.BytesIO(body)))
+
+
+def test_columnar_format_only_accepts_streams():
+    assert batch_io.columnar_format('application/vnd.apache.arrow.stream; charset=binary') == 'arrow'
+    assert batch_io.columnar_format('application/vnd.apache.arrow.file') is None
+    assert batch_io.columnar_format('application/x-msgpack') == 'msgpack'
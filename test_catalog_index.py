@@ -0,0 +1,52 @@
+"""
+Tests for the known-product catalog index (synthetic catalog, no model artifacts needed).
+
+    python -m pytest -q test_catalog_index.py
+"""
+import numpy as np
+
+from catalog_index import CatalogIndex, evaluate, normalize_title
+
+
+def make_index(num_products=3000, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(300, dim))
+    labels = rng.integers(0, 300, num_products)
+    embeddings = centers[labels] + 0.5 * rng.normal(size=(num_products, dim))
+    titles = [f'Product {i} Model {labels[i]}' for i in range(num_products)]
+    planes = rng.standard_normal((8, dim, 10))
+    return CatalogIndex(embeddings, np.arange(num_products) * 10.0, titles, planes)
+
+
+def test_exact_lookup_normalizes_titles_and_counts_hits():
+    index = make_index()
+    
+    assert normalize_title('  Product 7\tMODEL  x ') == 'product 7 model x'
+    assert index.exact(index.titles[42].upper() + '  ') == 42
+    assert index.exact('not in the catalog') is None
+    
+    stats = index.stats()
+    assert stats['lookups'] == 2 and stats['exact_hits'] == 1 and stats['served_from_index'] == 0.5
+
+
+def test_search_recall_against_brute_force():
+    index = make_index()
+    
+    rows, similarities = index.search(index.tokens[5], k=3)
+    assert rows[0] == 5 and similarities[0] > 0.999
+    assert np.all(np.diff(similarities) <= 0)
+    
+    assert evaluate(index, num_queries=200, k=5, probes=2)['recall@5'] >= 0.8
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = make_index(num_products=500)
+    index.metadata['evaluation'] = {'recall@5': 0.9}
+    path = str(tmp_path / 'catalog_index.npz')
+    
+    loaded = CatalogIndex.load(index.save(path))
+    
+    assert loaded.titles == index.titles and np.allclose(loaded.tokens, index.tokens)
+    assert loaded.exact('product 17 model ' + index.titles[17].split()[-1]) == 17
+    assert loaded.neighbours(index.tokens[17], k=1)[0]['price'] == 170.0
+    assert loaded.stats()['evaluation'] == {'recall@5': 0.9}
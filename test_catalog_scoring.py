@@ -0,0 +1,128 @@
+"""
+Tests for offline catalog scoring helpers (no model artifacts needed).
+
+    python -m pytest -q test_catalog_scoring.py
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import catalog_scoring
+from test_batch_io import FakePredictor
+
+
+def test_iter_chunks_renames_and_coerces_numeric_columns(tmp_path):
+    path = tmp_path / 'catalog.csv'
+    pd.DataFrame({
+        'name': ['a', 'b', 'c'],
+        'main_category': ['books'] * 3,
+        'no_of_ratings': ['1,234', '7', 'n/a']
+    }).to_csv(path, index=False)
+    
+    chunks = list(catalog_scoring.iter_chunks(str(path), 2, {'product_name': 'name', 'category': 'main_category'}))
+    
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert list(chunks[0].columns) == ['product_name', 'category', 'no_of_ratings']
+    assert chunks[0]['no_of_ratings'].tolist() == [1234, 7]
+    assert chunks[1]['no_of_ratings'].isna().all()  # Unparsable -> row error, not a failed chunk
+
+
+def test_score_chunk_writes_part_file_with_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_scoring, '_worker_predictor', FakePredictor())
+    columns = {'sku': ['x', 'y'], 'product_name': ['a', None], 'category': ['books', 'books']}
+    output_path = str(tmp_path / 'part-00003.csv')
+    
+    stats = catalog_scoring._score_chunk(3, 300, columns, output_path, 'sku')
+    
+    part = pd.read_csv(output_path)
+    assert stats['rows'] == 2 and stats['errors'] == 1 and stats['model_version'] == 'fake-1'
+    assert part['sku'].tolist() == ['x', 'y'] and part['index'].tolist() == [300, 301]
+    assert part['price'].iloc[0] == 500.0 and part['error'].iloc[1] == 'Missing required field: product_name'
+
+
+class InProcessExecutor(ThreadPoolExecutor):
+    """ProcessPoolExecutor stand-in: same initializer contract, workers are threads."""
+    
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers, initializer=initializer, initargs=initargs)
+
+
+class ScriptedPredictor(FakePredictor):
+    """Records the first row index of each scored chunk; fails on rows named in `fail_on`."""
+    
+    def __init__(self, run):
+        super().__init__()
+        self.run = run
+        self.models = type('models', (), {'version': run['version']})
+    
+    def predict_arrays(self, names, *args, models=None):
+        if self.run['fail_on'] & set(names):
+            raise RuntimeError('worker crashed')
+        self.run['scored'].append(names[0])
+        return super().predict_arrays(names, *args, models=models)
+
+
+@pytest.fixture
+def run(monkeypatch):
+    state = {'version': 'fake-1', 'fail_on': set(), 'scored': []}
+    
+    def init_worker(threads):
+        catalog_scoring._worker_predictor = ScriptedPredictor(state)
+    
+    monkeypatch.setattr(catalog_scoring, 'ProcessPoolExecutor', InProcessExecutor)
+    monkeypatch.setattr(catalog_scoring, '_init_worker', init_worker)
+    monkeypatch.setattr(catalog_scoring, '_worker_predictor', None)
+    return state
+
+
+def test_interrupted_run_resumes_without_rescoring(tmp_path, run):
+    input_path = str(tmp_path / 'catalog.csv')
+    pd.DataFrame({'id': range(10), 'product_name': [f'item {i}' for i in range(10)],
+                  'category': ['books'] * 10}).to_csv(input_path, index=False)
+    output_dir = str(tmp_path / 'scores')
+    
+    run['fail_on'] = {'item 6'}  # Chunk 3 of 5 (2 rows per chunk)
+    with pytest.raises(RuntimeError, match='worker crashed'):
+        catalog_scoring.score_catalog(input_path, output_dir, workers=1, chunk_size=2)
+    interrupted = catalog_scoring.load_manifest(output_dir)
+    done = {int(chunk) for chunk in interrupted['chunks']}
+    assert not interrupted['complete'] and done and 3 not in done
+    assert interrupted['model_version'] == 'fake-1'
+    
+    run['fail_on'], run['scored'] = set(), []
+    os.remove(os.path.join(output_dir, interrupted['chunks']['0']['file']))  # Recorded but its part file is gone
+    manifest = catalog_scoring.score_catalog(input_path, output_dir, workers=1, chunk_size=2)
+    
+    assert sorted(run['scored']) == sorted(f'item {2 * chunk}' for chunk in range(5) if chunk not in done - {0})
+    assert manifest['complete'] and manifest['rows'] == 10 and manifest['errors'] == 0
+    scores = catalog_scoring.read_scores(output_dir)
+    assert scores['index'].tolist() == list(range(10)) and scores['id'].tolist() == list(range(10))
+    
+    # Finished run: nothing left to score
+    run['scored'] = []
+    catalog_scoring.score_catalog(input_path, output_dir, workers=1, chunk_size=2)
+    assert run['scored'] == []
+
+
+def test_resume_refuses_other_settings_and_models(tmp_path, run):
+    input_path = str(tmp_path / 'catalog.csv')
+    pd.DataFrame({'product_name': ['a', 'b', 'c'], 'category': ['books'] * 3}).to_csv(input_path, index=False)
+    output_dir = str(tmp_path / 'scores')
+    
+    run['fail_on'] = {'c'}
+    with pytest.raises(RuntimeError):
+        catalog_scoring.score_catalog(input_path, output_dir, workers=1, chunk_size=2)
+    
+    run['fail_on'] = set()
+    with pytest.raises(ValueError, match='chunk size'):
+        catalog_scoring.score_catalog(input_path, output_dir, workers=1, chunk_size=3)
+    
+    run['version'] = 'fake-2'
+    with pytest.raises(RuntimeError, match='Model changed'):
+        catalog_scoring.score_catalog(input_path, output_dir, workers=1, chunk_size=2)
+    
+    run['scored'] = []
+    manifest = catalog_scoring.score_catalog(input_path, output_dir, workers=1, chunk_size=3, restart=True)
+    assert run['scored'] == ['a'] and manifest['model_version'] == 'fake-2' and manifest['rows'] == 3
@@ -0,0 +1,96 @@
+"""
+Tests for token building and training-time noise augmentation in dataloader.py.
+
+    python -m pytest -q test_dataloader.py
+"""
+import numpy as np
+import torch
+
+from dataloader import NumericNoiseAugmenter, PricePredictionDataset, as_category_ids, prepare_token_sequences
+from text_encoders import HashingTextEncoder
+from transformer import ModalityProjection
+
+
+def make_split(num_rows=50, num_main=4, num_sub=7, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'text_embeddings': rng.normal(size=(num_rows, 768)).astype(np.float32),
+        'main_category': rng.integers(0, num_main + 1, num_rows).astype(np.int32),  # num_main is the OOV id
+        'sub_category': rng.integers(0, num_sub + 1, num_rows).astype(np.int32),
+        'numeric_features': rng.normal(size=(num_rows, 6)),
+        'y': rng.normal(7.0, 1.0, num_rows)
+    }
+
+
+def one_hot(ids, num_categories):
+    rows = np.zeros((len(ids), num_categories))
+    known = ids < num_categories
+    rows[np.nonzero(known)[0], ids[known]] = 1.0
+    return rows
+
+
+def test_id_and_one_hot_splits_build_the_same_tokens():
+    torch.manual_seed(0)
+    onehot_projection = ModalityProjection(4, 7, category_encoding='onehot')
+    index_projection = onehot_projection.to_index_encoding()
+    split = make_split()
+    onehot_split = dict(split, main_category=one_hot(split['main_category'], 4),
+                        sub_category=one_hot(split['sub_category'], 7))
+    
+    gathered = prepare_token_sequences(split, index_projection, batch_size=16)
+    dense = prepare_token_sequences(onehot_split, onehot_projection, batch_size=16)
+    converted = prepare_token_sequences(onehot_split, index_projection, batch_size=64)  # Older one-hot split
+    
+    assert gathered['token_sequences'].shape == (50, 3, 128) and gathered['token_sequences'].dtype == np.float32
+    np.testing.assert_allclose(gathered['token_sequences'], dense['token_sequences'], rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(gathered['token_sequences'], converted['token_sequences'], rtol=1e-5, atol=1e-5)
+    for result in (gathered, dense):
+        assert result['main_category'].dtype == np.int32
+        np.testing.assert_array_equal(result['main_category'], split['main_category'])
+    np.testing.assert_array_equal(as_category_ids(onehot_split['sub_category'], 7), split['sub_category'])
+
+
+def test_tokens_from_a_d_model_text_backend():
+    """'hashing' / 'distilled' outputs are already text tokens: no second projection."""
+    names = [f'product {i} steel bottle' for i in range(50)]
+    encoder = HashingTextEncoder(num_features=2 ** 12).fit_idf(names)
+    split = dict(make_split(), text_embeddings=encoder.encode(names))
+    projection = ModalityProjection(4, 7, text_dim=encoder.output_dim, category_encoding='onehot')
+    
+    result = prepare_token_sequences(split, projection.to_index_encoding(), batch_size=16)
+    
+    assert result['token_sequences'].shape == (50, 3, 128)
+    expected = split['text_embeddings'] + projection.positional_encoding[0].numpy()
+    np.testing.assert_allclose(result['token_sequences'][:, 0], expected, rtol=1e-6, atol=1e-6)
+    assert 'text_projection.weight' not in projection.state_dict()
+
+
+def test_noise_is_added_in_standardized_feature_space():
+    torch.manual_seed(0)
+    projection = ModalityProjection(4, 7, category_encoding='index')
+    split = make_split(num_rows=32)
+    tokens = torch.as_tensor(prepare_token_sequences(split, projection)['token_sequences'])
+    augmenter = NumericNoiseAugmenter(projection_weight=projection.numeric_projection.weight.detach(),
+                                      noise_level=0.1, seed=3)
+    augmenter.set_epoch(2)
+    
+    augmented = augmenter(tokens)
+    
+    # Same draw added to the 6 standardized features, then projected
+    feature_noise = torch.randn(32, 6, generator=torch.Generator().manual_seed(5)) * 0.1
+    noisy_split = dict(split, numeric_features=split['numeric_features'] + feature_noise.double().numpy())
+    expected = torch.as_tensor(prepare_token_sequences(noisy_split, projection)['token_sequences'])
+    torch.testing.assert_close(augmented, expected, rtol=1e-4, atol=1e-5)
+    torch.testing.assert_close(augmented[:, :2], tokens[:, :2], rtol=0, atol=0)
+    assert not torch.equal(augmenter(tokens), augmented)  # Next batch gets a fresh draw
+
+
+def test_fallback_scales_noise_by_token_std():
+    tokens = torch.randn(4096, 3, 128) * torch.linspace(0.1, 2.0, 128)
+    augmenter = NumericNoiseAugmenter.from_dataset(PricePredictionDataset(tokens.numpy(), np.full(4096, 7.0)),
+                                                   noise_level=0.5)
+    
+    noise = augmenter(tokens)[:, 2] - tokens[:, 2]
+    
+    assert not augmenter.in_feature_space
+    torch.testing.assert_close(noise.std(dim=0), 0.5 * tokens[:, 2].std(dim=0), rtol=0.1, atol=0.01)
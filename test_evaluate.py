@@ -0,0 +1,137 @@
+"""
+Tests for streaming evaluation (metrics, breakdowns, density and checkpoint comparison).
+
+    python -m pytest -q test_evaluate.py
+"""
+import json
+import types
+
+import numpy as np
+import pytest
+import torch
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+import config
+import dataloader
+from evaluate import (LOG_PRICE_CLIP, PredictionDensity, StreamingMetrics, compare_checkpoints, count_parameters,
+                      format_r2, print_breakdowns)
+from transformer import MultimodalPriceTransformer
+
+
+def make_batches(num_rows=5000, batch_size=333, seed=0):
+    rng = np.random.default_rng(seed)
+    log_targets = rng.normal(7.0, 1.2, num_rows)
+    log_predictions = log_targets + rng.normal(0.0, 0.3, num_rows)
+    categories = rng.integers(0, 5, num_rows)
+    return [(log_predictions[i:i + batch_size], log_targets[i:i + batch_size], categories[i:i + batch_size])
+            for i in range(0, num_rows, batch_size)], (log_predictions, log_targets, categories)
+
+
+def reference_metrics(log_predictions, log_targets):
+    predictions, targets = np.expm1(log_predictions), np.expm1(log_targets)
+    return {
+        'rmse': np.sqrt(mean_squared_error(targets, predictions)),
+        'mae': mean_absolute_error(targets, predictions),
+        'r2': r2_score(targets, predictions),
+        'mape': np.mean(np.abs(targets - predictions) / np.maximum(targets, 1)) * 100
+    }
+
+
+def test_streaming_metrics_match_sklearn_overall_and_per_group():
+    batches, (log_predictions, log_targets, categories) = make_batches()
+    metrics = StreamingMetrics(category_names=['a', 'b', 'c', 'd'])
+    for batch in batches:
+        metrics.update(*batch)
+    
+    result = metrics.compute()
+    
+    expected = reference_metrics(log_predictions, log_targets)
+    for key, value in expected.items():
+        assert result[key] == pytest.approx(value, rel=1e-9)
+    assert result['num_samples'] == len(log_targets)
+    
+    for category_id, name in enumerate(['a', 'b', 'c', 'd', 'unknown']):
+        rows = categories == category_id
+        expected = reference_metrics(log_predictions[rows], log_targets[rows])
+        assert result['per_category'][name]['mae'] == pytest.approx(expected['mae'], rel=1e-9)
+        assert result['per_category'][name]['r2'] == pytest.approx(expected['r2'], rel=1e-9)
+    
+    deciles = result['per_price_quantile']
+    assert result['num_price_quantiles'] == 10 and len(deciles) == 10
+    assert sum(entry['num_samples'] for entry in deciles) == len(log_targets)
+    assert all(400 <= entry['num_samples'] <= 600 for entry in deciles)
+    assert all(a['price_max'] <= b['price_min'] + 1e-6 for a, b in zip(deciles, deciles[1:]))
+
+
+def test_constant_targets_and_custom_quantiles_print(capsys):
+    metrics = StreamingMetrics(num_price_quantiles=4)
+    metrics.update(np.log1p([90.0, 110.0, 100.0]), np.log1p([100.0, 100.0, 100.0]), [0, 0, 1])
+    
+    result = metrics.compute()
+    print_breakdowns(result)
+    
+    assert result['r2'] is None and format_r2(result['r2']) == 'n/a'
+    out = capsys.readouterr().out
+    assert 'Per main category' in out
+    assert 'Per price quantile' in out and 'Q3' in out  # One occupied bin, in the middle quantile
+
+
+def test_prediction_density_matches_histogram2d_and_drops_scatter_points():
+    _, (log_predictions, log_targets, _) = make_batches()
+    log_predictions[:3] = [-1.0, 20.0, LOG_PRICE_CLIP[1]]  # Out-of-range values land in the edge bins
+    density = PredictionDensity(num_bins=50, scatter_threshold=1000)
+    
+    seen = 0
+    for start in range(0, len(log_targets), 333):
+        rows = slice(start, start + 333)
+        density.update(log_predictions[rows], log_targets[rows], np.expm1(log_predictions[rows]),
+                       np.expm1(log_targets[rows]))
+        seen += len(log_targets[rows])
+        if seen <= 1000:
+            targets, predictions = density.points
+            assert len(targets) == len(predictions) == seen
+    
+    expected, _, _ = np.histogram2d(np.clip(log_targets, *LOG_PRICE_CLIP), np.clip(log_predictions, *LOG_PRICE_CLIP),
+                                    bins=[density.bin_edges, density.bin_edges])
+    assert np.array_equal(density.counts, expected.astype(np.int64))
+    assert density.count == density.counts.sum() == len(log_targets)
+    assert density.points is None
+
+
+def test_compare_checkpoints_scores_each_file_and_counts_quantized_params(tmp_path, monkeypatch):
+    torch.manual_seed(0)
+    model = MultimodalPriceTransformer(**config.MODEL_CONFIG).eval()
+    with torch.no_grad():
+        model.price_head[-1].bias.fill_(7.0)
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    paths = {name: str(tmp_path / name) for name in ('best_model.pth', 'quantized_model.pth', 'broken.pth')}
+    torch.save({'model_state_dict': model.state_dict()}, paths['best_model.pth'])
+    torch.save(quantized.state_dict(), paths['quantized_model.pth'])
+    with open(paths['broken.pth'], 'w') as f:
+        f.write('not a checkpoint')
+    
+    generator = torch.Generator().manual_seed(1)
+    split = types.SimpleNamespace(token_sequences=torch.randn(300, 3, config.MODEL_CONFIG['d_model'], generator=generator),
+                                  targets=torch.rand(300, generator=generator) * 4 + 5,
+                                  main_category=np.arange(300) % 3)
+    monkeypatch.setattr(dataloader, 'load_split', lambda data_path, name: split)
+    monkeypatch.setattr(config, 'DATA_PATH', str(tmp_path))
+    
+    save_path = str(tmp_path / 'comparison.json')
+    results = compare_checkpoints(list(paths.values()) + [str(tmp_path / 'missing.pth')], num_workers=2,
+                                  batch_size=64, save_path=save_path)
+    
+    assert [result['checkpoint'] for result in results] == list(paths.values())  # Missing files are skipped
+    full, packed, broken = results
+    assert 'error' in broken and 'error' not in full and 'error' not in packed
+    
+    with torch.no_grad():
+        expected = StreamingMetrics()
+        expected.update(model(split.token_sequences).numpy(), split.targets.numpy(), split.main_category)
+        expected = expected.compute()
+    assert full['rmse'] == pytest.approx(expected['rmse'], rel=1e-5)
+    assert full['num_samples'] == packed['num_samples'] == 300
+    assert full['num_parameters'] == packed['num_parameters'] == count_parameters(model)
+    assert packed['file_size_mb'] < full['file_size_mb']
+    with open(save_path) as f:
+        assert [result['checkpoint'] for result in json.load(f)] == list(paths.values())
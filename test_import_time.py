@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Import-time regression tests: light entry points must not pull in heavy
+dependencies and `import app` must stay within budget.
+Run with: python -m pytest test_import_time.py
+"""
+import pytest
+
+from import_report import measure_import, HEAVY_MODULES
+
+# Cumulative import time budget for `import app` (Flask itself is ~200 ms)
+APP_IMPORT_BUDGET_MS = 1000
+
+
+@pytest.mark.parametrize('module', ['app', 'app_quick', 'config', 'check_setup', 'predictor_service'])
+def test_no_heavy_imports(module):
+    report = measure_import(module)
+    heavy = [m for m in HEAVY_MODULES if m in report['imported']]
+    assert not heavy, f"import {module} pulled in {heavy}"
+
+
+def test_app_import_budget():
+    report = measure_import('app')
+    assert report['total_ms'] < APP_IMPORT_BUDGET_MS, \
+        f"import app took {report['total_ms']:.0f} ms (budget {APP_IMPORT_BUDGET_MS} ms)"
+
+
+def test_evaluate_defers_matplotlib():
+    report = measure_import('evaluate')
+    assert 'matplotlib' not in report['imported']
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,91 @@
+"""
+Tests for the sharded metrics registry and its Prometheus output.
+
+    python -m pytest -q test_metrics.py
+"""
+import gc
+import threading
+import time
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry
+
+
+def test_threads_record_into_shards_that_survive_thread_exit():
+    registry = MetricsRegistry()
+    
+    def work():
+        for _ in range(500):
+            with registry.timed('transformer'):
+                pass
+            registry.inc('cache_lookups_total', outcome='hit')
+    
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    del threads
+    gc.collect()
+    
+    registry.inc('cache_lookups_total', outcome='miss')
+    merged = registry.snapshot()
+    
+    assert len(registry._live) == 1  # Only this thread's shard is still live
+    assert merged[('cache_lookups_total', (('outcome', 'hit'),))] == [2000]
+    assert merged[('stage_seconds', (('stage', 'transformer'),))][-1] == 2000
+
+
+def test_render_is_prometheus_text():
+    registry = MetricsRegistry()
+    registry.observe('stage_seconds', 0.003, stage='parse')
+    registry.observe('stage_seconds', 7.0, stage='parse')
+    registry.inc('validation_failures_total', endpoint='/api/predict')
+    
+    text = registry.render()
+    
+    assert '# TYPE predictcart_stage_seconds histogram' in text
+    assert 'predictcart_stage_seconds_bucket{stage="parse",le="0.0025"} 0' in text
+    assert 'predictcart_stage_seconds_bucket{stage="parse",le="0.005"} 1' in text
+    assert 'predictcart_stage_seconds_bucket{stage="parse",le="+Inf"} 2' in text
+    assert 'predictcart_stage_seconds_count{stage="parse"} 2' in text
+    assert 'predictcart_validation_failures_total{endpoint="/api/predict"} 1' in text
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    with registry.timed('parse'):
+        registry.inc('errors_total')
+    assert registry.snapshot() == {} and registry.render() == '\n'
+
+
+def test_streamed_requests_are_timed_until_the_body_is_sent(monkeypatch):
+    flask = pytest.importorskip('flask')
+    monkeypatch.setattr(metrics, 'registry', MetricsRegistry())
+    app = metrics.instrument_flask(flask.Flask(__name__))
+    
+    @app.route('/stream')
+    def stream():
+        def body():
+            for chunk in range(3):
+                time.sleep(0.05)
+                yield f'{chunk}\n'
+        return flask.Response(body(), mimetype='application/x-ndjson')
+    
+    @app.route('/fast')
+    def fast():
+        return 'ok'
+    
+    client = app.test_client()
+    response = client.get('/stream')
+    assert response.get_data(as_text=True) == '0\n1\n2\n'
+    response.close()
+    client.get('/fast').close()
+    
+    merged = metrics.registry.snapshot()
+    streamed = merged[('request_seconds', (('endpoint', '/stream'),))]
+    assert streamed[-1] == 1 and streamed[-2] >= 0.15  # [buckets..., sum, count]
+    assert merged[('request_seconds', (('endpoint', '/fast'),))][-2] < 0.15
+    assert merged[('requests_total', (('endpoint', '/stream'), ('status', '200')))] == [1]
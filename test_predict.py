@@ -0,0 +1,272 @@
+"""
+Tests for the predictor's vectorized feature helpers, hot reload and price sweeps
+(models are built in tmp_path; no trained artifacts needed).
+
+    python -m pytest -q test_predict.py
+"""
+import importlib
+import json
+import threading
+import types
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+import predict
+from catalog_index import build_catalog_index, normalize_title
+from config import (DISTILLATION_CONFIG, MODEL_CONFIG, SERVING_CONFIG, TEXT_ENCODER_CONFIG, UNCERTAINTY_CONFIG)
+from predict import PricePredictor, price_confidence
+from preprocessing_utils import NUMERIC_FEATURES, FeaturePreparation, save_transform_info
+from serving_bundle import build_bundle
+from text_encoders import BertTextEncoder, build_text_projection, save_embedding_cache
+from transformer import MultimodalPriceTransformer
+
+
+def reference_numeric_features(ratings, no_of_ratings, discount_ratio):
+    """Original per-request loop, kept as the reference for the vectorized grid."""
+    features = [ratings / 5.0, np.log1p(no_of_ratings) / 10.0, discount_ratio,
+                ratings * np.log1p(no_of_ratings) / 30.0]
+    return np.array([features[i % 4] for i in range(MODEL_CONFIG['d_model'])])
+
+
+def test_numeric_grid_matches_per_request_features():
+    predictor = PricePredictor.__new__(PricePredictor)  # Helpers don't touch loaded state
+    ratings = np.array([0.0, 3.5, 4.5])[:, None]
+    discounts = np.array([0.0, 0.1, 0.55, 1.0])[None, :]
+    
+    grid = predictor.prepare_numeric_grid(ratings, 250, discounts)
+    
+    assert grid.shape == (12, MODEL_CONFIG['d_model'])
+    expected = [reference_numeric_features(r, 250, d) for r in ratings[:, 0] for d in discounts[0]]
+    np.testing.assert_array_equal(grid, np.stack(expected))
+    np.testing.assert_array_equal(predictor.prepare_numeric_features(3.5, 250, 0.1), expected[5])
+
+
+def test_price_confidence_bands():
+    prices = np.array([50, 300, 1000, 60000, 200000])
+    np.testing.assert_array_equal(price_confidence(prices), [0.6, 0.75, 0.9, 0.75, 0.6])
+    assert float(price_confidence(1000.0)) == 0.9
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self):
+        return self.now
+
+
+def test_choose_tier_routes_on_smoothed_full_latency(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(predict, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    predictor = PricePredictor.__new__(PricePredictor)
+    predictor.latency_ewma_ms = {'full': None, 'student': None}
+    predictor._last_full_time = 0.0
+    predictor._latency_lock = threading.Lock()
+    predictor.models = types.SimpleNamespace(student_model=object())
+    
+    assert predictor.choose_tier(20.0) == 'full'  # Nothing measured yet
+    predictor._record_latency('full', 50.0)
+    assert predictor.choose_tier() == 'full'  # No budget
+    assert predictor.choose_tier(100.0) == 'full'
+    assert predictor.choose_tier(20.0) == 'student'
+    assert predictor.choose_tier(20.0, types.SimpleNamespace(student_model=None)) == 'full'
+    assert predictor.choose_tier(20.0, uncertainty_level=0.8) == 'full'  # Only the full tier has intervals
+    
+    predictor._record_latency('full', 10.0)
+    alpha = DISTILLATION_CONFIG['latency_ewma_alpha']
+    assert predictor.latency_ewma_ms['full'] == pytest.approx(alpha * 10.0 + (1 - alpha) * 50.0)
+    
+    # On the student for longer than probe_interval_s: probe the full path again
+    clock.now += DISTILLATION_CONFIG['probe_interval_s'] + 0.1
+    predictor._record_latency('student', 5.0)
+    assert predictor.choose_tier(20.0) == 'full'
+    predictor._record_latency('full', 60.0)
+    assert predictor.choose_tier(20.0) == 'student'
+    
+    predictor.reset_latency()
+    assert predictor.latency_ewma_ms == {'full': None, 'student': None}
+    assert predictor.choose_tier(20.0) == 'full'
+
+
+class FakeTextEncoder:
+    name = TEXT_ENCODER_CONFIG['backend']
+    version = None
+    output_dim = MODEL_CONFIG['d_model']
+    
+    def encode(self, texts):
+        return np.zeros((len(texts), self.output_dim), dtype=np.float32)
+    
+    def describe(self):
+        return {'name': self.name}
+
+
+def build_test_bundle(tmp_path, name, main_categories, seed, max_price=None, price_bias=None):
+    """Bundle with its own weights and featurizer (vocabulary and target range)."""
+    torch.manual_seed(seed)
+    model_path = str(tmp_path / f'{name}.pth')
+    model = MultimodalPriceTransformer(**MODEL_CONFIG)
+    if price_bias is not None:
+        with torch.no_grad():
+            model.price_head[-1].bias.fill_(price_bias)  # Away from the clamp, so prices vary with inputs
+    torch.save(model.state_dict(), model_path)
+    
+    data_path = str(tmp_path / f'{name}_data')
+    frame = pd.DataFrame({'main_category': main_categories, 'sub_category': ['sub'] * len(main_categories)})
+    for column in NUMERIC_FEATURES:
+        frame[column] = np.arange(len(frame), dtype=np.float64)
+    FeaturePreparation().fit(frame).save(data_path)
+    save_transform_info({'log_transform': True, 'original_range': [1.0, max_price or 1000.0]}, data_path)
+    return build_bundle(str(tmp_path / 'bundle'), model_path, data_path)
+
+
+@pytest.fixture
+def serving_paths(tmp_path, monkeypatch):
+    """Serving artifacts under tmp_path and a fake text encoder."""
+    monkeypatch.setitem(SERVING_CONFIG, 'bundle_path', str(tmp_path / 'bundle'))
+    monkeypatch.setitem(SERVING_CONFIG, 'catalog_index_path', str(tmp_path / 'no_index.npz'))
+    monkeypatch.setitem(TEXT_ENCODER_CONFIG, 'text_projection_path', str(tmp_path / 'no_projection.pth'))
+    monkeypatch.setitem(DISTILLATION_CONFIG, 'student_model_path', str(tmp_path / 'no_student.pth'))
+    monkeypatch.setitem(UNCERTAINTY_CONFIG, 'calibration_path', str(tmp_path / 'no_calibration.json'))
+    monkeypatch.setattr(predict, 'get_text_encoder', lambda device: FakeTextEncoder())
+    return tmp_path
+
+
+def test_reload_swaps_weights_and_featurizer_together(serving_paths):
+    tmp_path = serving_paths
+    build_test_bundle(tmp_path, 'v1', ['books', 'music', 'toys'], seed=0)
+    predictor = PricePredictor(device=torch.device('cpu'))
+    first = predictor.models
+    assert predictor.get_available_categories() == ['books', 'music', 'toys']
+    
+    manifest_path = build_test_bundle(tmp_path, 'v2', ['appliances', 'books', 'computers', 'music'], seed=1,
+                                      max_price=5000.0)
+    old_version, new_version = predictor.reload(batch_sizes=(1,))
+    
+    assert (old_version, new_version) == (first.version, predictor.model_version) and old_version != new_version
+    assert predictor.get_available_categories() == ['appliances', 'books', 'computers', 'music']
+    assert predictor.transform_info['original_range'] == [1.0, 5000.0]
+    assert predictor.category_index('music') == 3 and predictor.category_index('music', first) == 1
+    assert first.feature_prep.vocabularies['main_category'][:3] == ['books', 'music', 'toys']  # Old set untouched
+    assert predictor.predict_arrays(['kettle'], ['music'], 4.0, 100, 0.1)['model_version'] == new_version
+    
+    # A bundle for another text encoder backend is refused; the current set keeps serving
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest['text_encoder']['backend'] = 'some-other-backend'
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    current = predictor.models
+    with pytest.raises(ValueError):
+        predictor.reload(batch_sizes=(1,))
+    assert predictor.models is current
+
+
+@pytest.fixture
+def sweep_predictor(serving_paths):
+    build_test_bundle(serving_paths, 'v1', ['books', 'home & kitchen', 'toys'], seed=0, price_bias=7.0)
+    return PricePredictor(device=torch.device('cpu'))
+
+
+def test_sweep_matches_per_point_predictions(sweep_predictor):
+    discounts, ratings = [0.0, 0.15, 0.4, 0.9], [2.5, 4.5]
+    
+    sweep = sweep_predictor.predict_sweep('steel bottle', 'home & kitchen', discounts, ratings=ratings,
+                                          no_of_ratings=250)
+    
+    points = sweep['points']
+    assert [(p['ratings'], p['discount_ratio']) for p in points] == [(r, d) for r in ratings for d in discounts]
+    for point in points:
+        price, confidence = sweep_predictor.predict_price('steel bottle', 'home & kitchen', point['ratings'], 250,
+                                                          point['discount_ratio'])
+        assert point['price'] == pytest.approx(price, rel=1e-5)
+        assert point['confidence'] == pytest.approx(confidence)
+    assert len({round(p['price'], 6) for p in points}) > 1  # The grid actually moves the price
+    assert sweep['model_version'] == sweep_predictor.model_version
+    
+    with pytest.raises(ValueError):
+        sweep_predictor.predict_sweep('steel bottle', 'toys', [])
+
+
+@pytest.fixture
+def client(sweep_predictor, monkeypatch):
+    monkeypatch.setitem(SERVING_CONFIG, 'autoload', False)
+    app = importlib.import_module('app')
+    monkeypatch.setattr(app, 'get_predictor_instance', lambda: sweep_predictor)
+    return app.app.test_client()
+
+
+def test_sweep_endpoint_validates_its_input(client, monkeypatch):
+    body = {'product_name': ' Steel Bottle ', 'category': 'Home & Kitchen', 'ratings': [3.0, 4.0]}
+    
+    response = client.post('/api/predict/sweep', json=body)
+    assert response.status_code == 200
+    assert len(response.get_json()['curve']) == 22  # 2 ratings x the default 11 discounts
+    
+    monkeypatch.setitem(SERVING_CONFIG, 'sweep_max_points', 20)
+    invalid = [
+        ({}, 'Missing required field: product_name'),
+        ({'product_name': 'bottle'}, 'Missing required field: category'),
+        (body, 'Sweep grid must have 1-20 points'),
+        ({**body, 'discount_ratios': [0.1, 1.5]}, 'Discount ratios must be between 0 and 1'),
+        ({**body, 'discount_ratios': [-0.1]}, 'Discount ratios must be between 0 and 1'),
+        ({**body, 'ratings': [4.0, 6.0]}, 'Ratings must be between 0 and 5'),
+        ({**body, 'ratings': 'high'}, 'Invalid input'),
+    ]
+    for payload, error in invalid:
+        response = client.post('/api/predict/sweep', json=payload)
+        assert response.status_code == 400, payload
+        assert error in response.get_json()['error'], payload
+
+
+class FakeBertEncoder:
+    """768-d 'bert' stand-in: deterministic per-title vectors, projected like BERT CLS vectors."""
+    name = 'bert'
+    version = BertTextEncoder.version
+    output_dim = 768
+    
+    def encode(self, texts):
+        return np.stack([np.random.default_rng(zlib.crc32(normalize_title(t).encode())).normal(size=768)
+                         for t in texts]).astype(np.float32)
+    
+    def describe(self):
+        return {'name': self.name}
+
+
+def test_exact_hits_and_misses_share_the_text_space(serving_paths, monkeypatch):
+    tmp_path = serving_paths
+    projection_path = str(tmp_path / 'text_projection.pth')
+    monkeypatch.setitem(TEXT_ENCODER_CONFIG, 'backend', 'bert')
+    monkeypatch.setitem(TEXT_ENCODER_CONFIG, 'text_projection_path', projection_path)
+    monkeypatch.setitem(SERVING_CONFIG, 'catalog_index_path', str(tmp_path / 'catalog_index.npz'))
+    monkeypatch.setattr(predict, 'get_text_encoder', lambda device: FakeBertEncoder())
+    
+    titles = [f'Steel Bottle {i} Litre' for i in range(40)]
+    cache_path = str(tmp_path / 'text_embedding_cache.npz')
+    save_embedding_cache(titles, FakeBertEncoder().encode(titles), cache_path, prices=np.arange(40) * 100.0)
+    build_text_projection(projection_path, str(tmp_path / 'missing.pth'), seed=0)
+    build_catalog_index(cache_path, num_tables=2, num_bits=4)
+    build_test_bundle(tmp_path, 'v1', ['home & kitchen'], seed=0)
+    predictor = PricePredictor(device=torch.device('cpu'))
+    
+    assert predictor.models.index_exact
+    hit, rows = predictor.text_tokens(['  steel BOTTLE 7 litre'])
+    assert rows == [7]
+    np.testing.assert_allclose(hit, predictor.encode_texts(['Steel Bottle 7 Litre']), rtol=1e-5, atol=1e-6)
+    
+    # A bundle with another projection: the index tokens no longer match, so exact hits are not used
+    build_text_projection(projection_path, str(tmp_path / 'missing.pth'), seed=1)
+    build_test_bundle(tmp_path, 'v2', ['home & kitchen'], seed=0)
+    previous = predictor.models
+    predictor.reload(batch_sizes=(1,))
+    
+    assert predictor.catalog_index is not previous.catalog_index and not predictor.models.index_exact
+    tokens, rows = predictor.text_tokens(['steel bottle 7 litre'])
+    assert rows == [None]
+    np.testing.assert_allclose(tokens, predictor.encode_texts(['steel bottle 7 litre']), rtol=1e-5, atol=1e-6)
+    _, _, details = predictor.predict_price('Steel Bottle 7 Litre', 'home & kitchen', return_details=True,
+                                            neighbours=2)
+    assert details['index'] is None and len(details['neighbours']) == 2  # Neighbours only
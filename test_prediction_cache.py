@@ -0,0 +1,149 @@
+"""
+Tests for the prediction response cache.
+
+    python -m pytest -q test_prediction_cache.py
+"""
+import threading
+import time
+
+import pytest
+
+from prediction_cache import PredictionCache, HIT, MISS, COALESCED, cached_predict_price
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_lru_and_version_invalidation():
+    clock = FakeClock()
+    cache = PredictionCache(max_entries=2, ttl_seconds=10, clock=clock)
+    
+    assert cache.get_or_compute('a', lambda: 1, version='v1') == (1, MISS)
+    assert cache.get_or_compute('a', lambda: 2, version='v1') == (1, HIT)
+    
+    cache.get_or_compute('b', lambda: 3, version='v1')
+    cache.get_or_compute('a', lambda: 0, version='v1')  # 'a' becomes most recent
+    cache.get_or_compute('c', lambda: 4, version='v1')  # Evicts 'b'
+    assert cache.get_or_compute('b', lambda: 5, version='v1') == (5, MISS)
+    
+    clock.now = 11
+    assert cache.get_or_compute('b', lambda: 6, version='v1') == (6, MISS)  # Expired
+    
+    assert cache.get_or_compute('b', lambda: 7, version='v2') == (7, MISS)  # New model
+    stats = cache.stats()
+    assert stats['evictions'] >= 1 and stats['expirations'] == 1 and stats['invalidations'] == 1
+    assert stats['model_version'] == 'v2'
+
+
+def test_concurrent_identical_requests_compute_once():
+    cache = PredictionCache(max_entries=10, ttl_seconds=60)
+    release = threading.Event()
+    calls = []
+    
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 42
+    
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 5:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in results) == [COALESCED] * 5 + [MISS]
+    assert {value for value, _ in results} == {42}
+    assert cache.stats()['hit_rate'] == pytest.approx(5 / 6, abs=1e-4)
+
+
+def test_errors_and_uncacheable_values_are_not_stored():
+    cache = PredictionCache(max_entries=10, ttl_seconds=60)
+    
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('k', lambda: (_ for _ in ()).throw(RuntimeError('boom')))
+    assert cache.get_or_compute('k', lambda: 'student', cacheable=lambda v: v == 'full') == ('student', MISS)
+    assert cache.get_or_compute('k', lambda: 'full', cacheable=lambda v: v == 'full') == ('full', MISS)
+    assert cache.get_or_compute('k', lambda: 'other') == ('full', HIT)
+
+
+class FakePredictor:
+    """Answers with the tier a budget would pick; full calls block until released."""
+    model_version = 'v1'
+    
+    def __init__(self, slow_full=False):
+        self.slow_full = slow_full
+        self.release = threading.Event()
+        self.calls = []
+    
+    def choose_tier(self, latency_budget_ms=None, models=None, uncertainty_level=None):
+        if latency_budget_ms is None or uncertainty_level is not None:
+            return 'full'
+        return 'full' if latency_budget_ms >= 50 else 'student'
+    
+    def predict_price(self, product_name, category, ratings, no_of_ratings, discount_ratio, latency_budget_ms=None,
+                      return_details=False, neighbours=0, uncertainty_level=None):
+        tier = self.choose_tier(latency_budget_ms, uncertainty_level=uncertainty_level)
+        self.calls.append((product_name, category, latency_budget_ms))
+        if tier == 'full' and self.slow_full:
+            self.release.wait(5)
+        price = 100.0 if tier == 'full' else 90.0
+        return price, 0.8, {'tier': tier, 'latency_ms': 1000.0, 'latency_budget_ms': latency_budget_ms,
+                            'model_version': self.model_version}
+
+
+def test_predictor_sees_the_normalized_input():
+    cache, predictor = PredictionCache(max_entries=10, ttl_seconds=60), FakePredictor()
+    
+    cached_predict_price(cache, predictor, '  Steel Bottle ', ' Home & Kitchen ')
+    _, _, details = cached_predict_price(cache, predictor, 'Steel Bottle', 'home & kitchen')
+    
+    assert predictor.calls == [('Steel Bottle', 'home & kitchen', None)]
+    assert details['cache'] == HIT and details['latency_ms'] < 1000.0  # This request's own time
+
+
+def test_student_answers_are_never_shared_with_full_requests():
+    cache, predictor = PredictionCache(max_entries=10, ttl_seconds=60), FakePredictor()
+    
+    price, _, details = cached_predict_price(cache, predictor, 'bottle', 'home', latency_budget_ms=5)
+    assert (price, details['tier'], details['cache']) == (90.0, 'student', MISS)
+    price, _, details = cached_predict_price(cache, predictor, 'bottle', 'home')
+    assert (price, details['tier'], details['cache']) == (100.0, 'full', MISS)
+    
+    # A stored full answer is better than the student and costs nothing
+    price, _, details = cached_predict_price(cache, predictor, 'bottle', 'home', latency_budget_ms=5)
+    assert (price, details['tier'], details['cache'], details['latency_budget_ms']) == (100.0, 'full', HIT, 5)
+    assert len(predictor.calls) == 2
+    
+    # An interval needs the full model whatever the budget
+    _, _, details = cached_predict_price(cache, predictor, 'mug', 'home', latency_budget_ms=5, uncertainty_level=0.8)
+    assert (details['tier'], details['cache']) == ('full', MISS)
+
+
+def test_budgeted_requests_coalesce_onto_a_full_computation():
+    cache, predictor = PredictionCache(max_entries=10, ttl_seconds=60), FakePredictor(slow_full=True)
+    results = []
+    budgets = [100, None, 60, None]
+    threads = [threading.Thread(target=lambda budget=budget: results.append(
+        cached_predict_price(cache, predictor, 'bottle', 'home', latency_budget_ms=budget))) for budget in budgets]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 3:
+        time.sleep(0.001)
+    predictor.release.set()
+    for thread in threads:
+        thread.join()
+    
+    assert predictor.calls == [('bottle', 'home', None)]  # The leader runs without its budget
+    assert {details['tier'] for _, _, details in results} == {'full'}
+    assert sorted(details['cache'] for _, _, details in results) == [COALESCED] * 3 + [MISS]
@@ -0,0 +1,142 @@
+"""
+Tests for background predictor loading (loader state machine).
+
+    python -m pytest -q test_predictor_service.py
+"""
+import os
+import threading
+import types
+
+import pytest
+import torch
+
+import predictor_service
+from predict import ModelSet
+from predictor_service import (FAILED, IDLE, LOADING, READY, WARMING_UP, ModelWatcher, PredictorLoader,
+                               _predictor_modules, resolve_model_path)
+
+
+class FakePredictor:
+    model_version = 'v1'
+    catalog_index = None
+    
+    def __init__(self, warm_up_started=None, release=None):
+        self.warm_up_started = warm_up_started or threading.Event()
+        self.release = release
+        self.warmed = None
+    
+    def warm_up(self, batch_sizes):
+        self.warm_up_started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        self.warmed = batch_sizes
+        return {'batch_1': 1.0}
+
+
+def test_loader_reports_each_state_until_ready():
+    loading, release_load = threading.Event(), threading.Event()
+    predictor = FakePredictor(release=threading.Event())
+    
+    def factory(progress):
+        progress('text_encoder', 0.5)
+        loading.set()
+        release_load.wait(5)
+        return predictor
+    
+    loader = PredictorLoader(factory, warmup_batch_sizes=(1, 4))
+    assert loader.status()['state'] == IDLE and loader.status()['loading_seconds'] is None
+    
+    loader.start()
+    assert loading.wait(5)
+    status = loader.status()
+    assert (status['state'], status['stage'], status['progress']) == (LOADING, 'text_encoder', 0.45)
+    assert not status['ready'] and status['live'] and loader.get() is None  # Never blocks
+    
+    release_load.set()
+    assert predictor.warm_up_started.wait(5)
+    assert loader.state == WARMING_UP and loader.get() is None
+    
+    predictor.release.set()
+    assert loader.wait(5) is predictor
+    status = loader.status()
+    assert status['ready'] and (status['state'], status['progress'], status['model_version']) == (READY, 1.0, 'v1')
+    assert predictor.warmed == (1, 4)
+    assert loader.start() is loader and loader.get() is predictor  # Loads once
+
+
+def test_loader_failure_is_reported_not_raised():
+    def factory(progress):
+        raise RuntimeError('no checkpoint')
+    
+    loader = PredictorLoader(factory).start(background=False)
+    
+    assert loader.state == FAILED and loader.wait(1) is None
+    status = loader.status()
+    assert not status['ready'] and status['error'] == 'no checkpoint' and status['model_version'] is None
+    assert loader.reload() is False  # Nothing to reload
+
+
+def test_predictor_modules_without_a_text_encoder():
+    projection = torch.nn.Linear(4, 2)
+    predictor = types.SimpleNamespace(text_encoder=None, text_projection=projection, alias=projection, version='v1')
+    
+    assert _predictor_modules(predictor) == [projection]
+
+
+def test_predictor_modules_include_the_model_set():
+    model, inference, student, mc_model, projection = (torch.nn.Linear(4, 4) for _ in range(5))
+    models = ModelSet(model, inference, student, 'v1', 'bundle', mc_model=mc_model, text_projection=projection)
+    encoder_model = torch.nn.Linear(2, 2)
+    predictor = types.SimpleNamespace(models=models, text_encoder=types.SimpleNamespace(model=encoder_model))
+    
+    modules = _predictor_modules(predictor)
+    assert len(modules) == 6
+    assert all(any(module is m for m in modules) for module in (model, inference, student, mc_model, projection,
+                                                                 encoder_model))
+
+
+class FakeLoader:
+    def __init__(self):
+        self.accept = True
+        self.reloads = 0
+    
+    def reload(self):
+        self.reloads += 1
+        return self.accept
+
+
+def test_watcher_reloads_once_a_change_has_settled(tmp_path):
+    path = tmp_path / 'bundle.json'
+    path.write_text('v1')
+    loader = FakeLoader()
+    watcher = ModelWatcher(loader, poll_seconds=1, path_fn=lambda: str(path))
+    
+    assert not watcher.check() and loader.reloads == 0  # Unchanged
+    
+    path.write_text('v2 (larger)')
+    assert not watcher.check()  # Changed: wait one poll
+    path.write_text('v3 (still writing)')
+    assert not watcher.check() and loader.reloads == 0  # Changed again: wait again
+    
+    loader.accept = False
+    assert not watcher.check() and loader.reloads == 1  # Settled, but the loader is busy
+    loader.accept = True
+    assert watcher.check() and loader.reloads == 2
+    assert not watcher.check() and loader.reloads == 2  # Loaded: nothing to do
+    
+    path.unlink()
+    assert not watcher.check() and loader.reloads == 2
+
+
+def test_resolve_model_path_stays_inside_model_dir(tmp_path, monkeypatch):
+    models_dir = tmp_path / 'simple_models'
+    (models_dir / 'archive').mkdir(parents=True)
+    (models_dir / 'archive' / 'v2.pth').write_bytes(b'')
+    (tmp_path / 'outside.pth').write_bytes(b'')
+    os.symlink(tmp_path / 'outside.pth', models_dir / 'link.pth')
+    monkeypatch.setattr(predictor_service, 'MODEL_SAVE_PATH', str(models_dir))
+    
+    assert resolve_model_path('archive/v2.pth') == os.path.realpath(models_dir / 'archive' / 'v2.pth')
+    for name in ('../outside.pth', str(tmp_path / 'outside.pth'), 'link.pth', 'missing.pth', 'archive'):
+        with pytest.raises(ValueError):
+            resolve_model_path(name)
@@ -0,0 +1,89 @@
+"""
+Tests for the compact FeaturePreparation artifact (save -> load -> transform).
+
+    python -m pytest -q test_preprocessing_utils.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessing_utils import (FeaturePreparation, NUMERIC_FEATURES, load_feature_prep, load_transform_info,
+                                 save_feature_artifacts)
+
+
+def make_frame(num_rows=200, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'main_category': rng.choice(['appliances', 'tv, audio & cameras', 'books'], num_rows),
+        'sub_category': rng.choice([f'sub {i}' for i in range(12)], num_rows)
+    })
+    for column in NUMERIC_FEATURES:
+        df[column] = rng.normal(5.0, 3.0, num_rows)
+    return df
+
+
+@pytest.mark.parametrize('category_encoding', ['onehot', 'index'])
+def test_save_load_transform_round_trip(tmp_path, category_encoding):
+    df = make_frame()
+    prep = FeaturePreparation(scale_target=True, category_encoding=category_encoding).fit(df)
+    prep.fit_target(np.random.default_rng(1).normal(7.0, 1.0, len(df)))
+    prep.save(str(tmp_path))
+    
+    loaded = FeaturePreparation.load(str(tmp_path))
+    unseen = df.copy()
+    unseen.loc[0, 'main_category'] = 'not in the vocabulary'
+    
+    expected, actual = prep.transform(unseen), loaded.transform(unseen)
+    for key in expected:
+        assert np.array_equal(expected[key], actual[key]) and expected[key].dtype == actual[key].dtype
+    if category_encoding == 'onehot':
+        assert not actual['main_category'][0].any()
+        assert np.array_equal(actual['main_category'][1:], prep.main_category_encoder.transform(df[['main_category']][1:]))
+    else:
+        assert actual['main_category'][0] == len(loaded.vocabularies['main_category'])
+    assert np.array_equal(actual['numeric_features'], prep.numeric_scaler.transform(unseen[NUMERIC_FEATURES]))
+    
+    y = np.array([6.5, 8.0])
+    assert np.allclose(loaded.inverse_transform_target(loaded.transform_target(y)), y)
+
+
+def test_notebook_class_is_saved_as_compact_artifact(tmp_path):
+    """save_feature_artifacts accepts the notebooks' own FeaturePreparation (fitted sklearn attributes)."""
+    df = make_frame()
+    fitted = FeaturePreparation().fit(df)
+    
+    class NotebookFeaturePreparation:
+        pass
+    
+    notebook_prep = NotebookFeaturePreparation()
+    notebook_prep.__dict__.update({key: value for key, value in vars(fitted).items()
+                                   if key not in ('vocabularies', 'numeric_params', 'target_params',
+                                                  'category_encoding')})
+    transform_info = {'log_transform': True, 'original_range': (np.float64(1.0), np.float64(9.5))}
+    
+    save_feature_artifacts(notebook_prep, transform_info, str(tmp_path))
+    
+    loaded = load_feature_prep(str(tmp_path))
+    assert loaded.category_encoding == 'onehot'
+    assert np.array_equal(loaded.transform(df)['sub_category'], fitted.transform(df)['sub_category'])
+    assert load_transform_info(str(tmp_path)) == {'log_transform': True, 'original_range': [1.0, 9.5]}
+
+
+def test_to_sklearn_rebuilds_fitted_encoders_and_scalers(tmp_path):
+    df = make_frame()
+    prep = FeaturePreparation(scale_target=True).fit(df)
+    y = np.random.default_rng(1).normal(7.0, 1.0, len(df))
+    prep.fit_target(y)
+    prep.save(str(tmp_path))
+    
+    rebuilt = FeaturePreparation.load(str(tmp_path)).to_sklearn()
+    unseen = df.copy()
+    unseen.loc[0, 'sub_category'] = 'not in the vocabulary'
+    
+    expected = prep.transform(unseen)
+    for column in ('main_category', 'sub_category'):
+        encoder = getattr(rebuilt, f'{column}_encoder')
+        assert np.array_equal(encoder.transform(unseen[[column]]), expected[column]), column
+    assert not expected['sub_category'][0].any()
+    assert np.allclose(rebuilt.numeric_scaler.transform(unseen[NUMERIC_FEATURES]), expected['numeric_features'])
+    assert np.allclose(rebuilt.target_scaler.transform(y.reshape(-1, 1)).flatten(), prep.transform_target(y))
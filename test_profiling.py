@@ -0,0 +1,86 @@
+"""
+Tests for on-demand profiling (torch traces for the next N calls, stack sampling).
+
+    python -m pytest -q test_profiling.py
+"""
+import json
+import threading
+
+import pytest
+import torch
+
+import profiling
+from profiling import Profiler, profiled
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    instance = Profiler(output_dir=str(tmp_path))
+    monkeypatch.setattr(profiling, 'profiler', instance)
+    return instance
+
+
+@profiled
+def model_call(x):
+    return torch.nn.functional.linear(x, torch.ones(4, 4)).sum().item()
+
+
+def test_traces_exactly_the_next_n_calls(profiler):
+    x = torch.ones(2, 4)
+    assert model_call(x) == 32.0 and profiler.status()['files'] == []  # Off: plain call
+    
+    assert profiler.trace_predictions(2)
+    assert not profiler.trace_predictions(1)  # One session at a time
+    for _ in range(3):
+        assert model_call(x) == 32.0
+    
+    status = profiler.status()
+    assert not status['tracing'] and len(status['files']) == 2
+    with open(status['files'][0]) as f:
+        events = json.load(f)['traceEvents']
+    assert any(event.get('name') == 'model_call' for event in events)
+    
+    with pytest.raises(ValueError):
+        profiler.trace_predictions(0)
+
+
+def test_a_raising_last_call_ends_the_session(profiler):
+    @profiled
+    def failing_call():
+        raise RuntimeError('bad input')
+    
+    assert profiler.trace_predictions(2)
+    assert model_call(torch.ones(2, 4)) == 32.0
+    with pytest.raises(RuntimeError):
+        failing_call()
+    
+    status = profiler.status()
+    assert not status['tracing'] and status['remaining_predictions'] == 0
+    assert profiler.trace_predictions(1)  # A new session can start
+
+
+def test_sampler_writes_collapsed_stacks(profiler):
+    stop = threading.Event()
+    
+    def busy_worker():
+        while not stop.is_set():
+            sum(range(1000))
+    
+    worker = threading.Thread(target=busy_worker, name='busy')
+    worker.start()
+    try:
+        assert profiler.start_sampling(0.2, interval_ms=5)
+        assert profiler.status()['sampling']
+        assert not profiler.trace_predictions(1)
+        profiler.wait(5)
+    finally:
+        stop.set()
+        worker.join()
+    
+    (path,) = profiler.status()['files']
+    with open(path) as f:
+        lines = f.read().splitlines()
+    stacks = {line.rsplit(' ', 1)[0]: int(line.rsplit(' ', 1)[1]) for line in lines}
+    busy = sum(count for stack, count in stacks.items() if stack.startswith('busy;'))
+    assert busy >= 10
+    assert any('test_profiling.py:busy_worker' in stack for stack in stacks)
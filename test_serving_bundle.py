@@ -0,0 +1,71 @@
+"""
+Tests for the serving bundle's safetensors writer/reader and zero-copy module loading.
+
+    python -m pytest -q test_serving_bundle.py
+"""
+import pytest
+import torch
+
+from serving_bundle import SafetensorsFile, _DTYPE_CODES, _materialize, save_safetensors
+
+
+def make_tensors():
+    generator = torch.Generator().manual_seed(0)
+    tensors = {f'dtype.{dtype}': (torch.randn(3, 5, generator=generator) * 50).to(dtype) for dtype in _DTYPE_CODES}
+    tensors.update({
+        'bf16.values': torch.tensor([1.0, -2.5, 3.140625, 1e30], dtype=torch.bfloat16),
+        'empty.matrix': torch.empty(0, 4),
+        'empty.vector': torch.empty(0, dtype=torch.int64),
+        'scalar': torch.tensor(7, dtype=torch.int32),
+        'transposed': torch.arange(12, dtype=torch.float32).reshape(3, 4).t()  # Non-contiguous
+    })
+    return tensors
+
+
+def test_round_trip_keeps_dtype_shape_values_and_metadata(tmp_path):
+    tensors = make_tensors()
+    path = str(tmp_path / 'weights.safetensors')
+    save_safetensors(tensors, path, {'format': 'test', 'version': 3})
+    
+    weights = SafetensorsFile(path)
+    assert weights.keys() == list(tensors)
+    assert weights.metadata == {'format': 'test', 'version': '3'}
+    assert weights._data_start % 8 == 0
+    for name, expected in tensors.items():
+        loaded = weights.get(name)
+        assert loaded.dtype == expected.dtype and loaded.shape == expected.shape, name
+        assert torch.equal(loaded, expected), name
+    
+    assert set(weights.state_dict('empty.')) == {'matrix', 'vector'}
+    assert weights.has_prefix('bf16.') and not weights.has_prefix('student.')
+
+
+def test_materialize_adopts_mapped_tensors(tmp_path):
+    torch.manual_seed(0)
+    source = torch.nn.Sequential(torch.nn.Linear(6, 4), torch.nn.BatchNorm1d(4)).eval()
+    source[1].running_mean.uniform_()
+    path = str(tmp_path / 'weights.safetensors')
+    save_safetensors({f'model.{k}': v for k, v in source.state_dict().items()}, path)
+    
+    weights = SafetensorsFile(path)
+    module = _materialize(lambda: torch.nn.Sequential(torch.nn.Linear(6, 4), torch.nn.BatchNorm1d(4)),
+                          weights.state_dict('model.'), 'cpu')
+    
+    assert not module.training
+    assert all(not t.is_meta for t in list(module.parameters()) + list(module.buffers()))
+    x = torch.randn(8, 6)
+    with torch.no_grad():
+        assert torch.equal(module(x), source(x))
+    # Zero-copy: the weight is a view into the file mapping, not a fresh allocation
+    assert module[0].weight.data_ptr() == weights.get('model.0.weight').data_ptr()
+
+
+def test_files_are_readable_by_the_safetensors_library(tmp_path):
+    safetensors_torch = pytest.importorskip('safetensors.torch')
+    tensors = make_tensors()
+    path = str(tmp_path / 'weights.safetensors')
+    save_safetensors(tensors, path, {'format': 'test'})
+    
+    loaded = safetensors_torch.load_file(path)
+    for name, expected in tensors.items():
+        assert loaded[name].dtype == expected.dtype and torch.equal(loaded[name], expected), name
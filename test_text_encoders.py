@@ -0,0 +1,53 @@
+"""
+Tests for the fixed text projection (built offline, only loaded when serving).
+
+    python -m pytest -q test_text_encoders.py
+"""
+import numpy as np
+import pytest
+import torch
+
+from text_encoders import build_text_projection, load_text_projection, save_embedding_cache
+from transformer import ModalityProjection
+
+
+def test_projection_is_copied_from_the_token_building_projection(tmp_path):
+    modality_projection = ModalityProjection(5, 9, d_model=16, text_dim=24)
+    source = str(tmp_path / 'modality_projection.pth')
+    torch.save(modality_projection.state_dict(), source)
+    path = str(tmp_path / 'text_projection.pth')
+    
+    build_text_projection(path, source)
+    projection = load_text_projection(path, text_dim=24, d_model=16)
+    
+    text = torch.randn(3, 24)
+    with torch.no_grad():
+        assert torch.equal(projection(text), modality_projection.text_projection(text))
+    with pytest.raises(ValueError):
+        load_text_projection(path, text_dim=768, d_model=16)
+
+
+def test_serving_never_creates_a_projection(tmp_path):
+    path = str(tmp_path / 'text_projection.pth')
+    with pytest.raises(FileNotFoundError):
+        load_text_projection(path, text_dim=8, d_model=4)
+    assert not (tmp_path / 'text_projection.pth').exists()
+    
+    # Without a token-building projection the build step falls back to a seeded one
+    rng_state = torch.random.get_rng_state()
+    build_text_projection(path, str(tmp_path / 'missing.pth'), text_dim=8, d_model=4)
+    assert torch.equal(torch.random.get_rng_state(), rng_state)
+    first = load_text_projection(path, text_dim=8, d_model=4).weight.clone()
+    build_text_projection(path, str(tmp_path / 'missing.pth'), text_dim=8, d_model=4)
+    assert torch.equal(load_text_projection(path, text_dim=8, d_model=4).weight, first)
+
+
+def test_embedding_cache_only_accepts_cls_vectors(tmp_path):
+    path = str(tmp_path / 'text_embedding_cache.npz')
+    with pytest.raises(ValueError):
+        save_embedding_cache(['a', 'b'], np.zeros((2, 128)), path)  # A d_model backend's output
+    
+    save_embedding_cache(['a', 'b'], np.ones((2, 768)), path, prices=[10, 20], categories=['x', 'y'])
+    cache = np.load(path, allow_pickle=True)
+    assert cache['embeddings'].shape == (2, 768) and cache['embeddings'].dtype == np.float32
+    assert cache['prices'].tolist() == [10.0, 20.0]
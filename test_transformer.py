@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Parity tests for the inference-optimized transformer.
+Run with: python -m pytest test_transformer.py  (or python test_transformer.py)
+"""
+import os
+import tempfile
+
+import torch
+
+from transformer import (MultimodalPriceTransformer, InferencePriceTransformer, ModalityProjection, attention_rollout)
+
+D_MODEL = 128
+
+
+def make_trained_model(seed=0):
+    """Model with non-trivial weights everywhere (init leaves some at zero/one)."""
+    torch.manual_seed(seed)
+    model = MultimodalPriceTransformer(d_model=D_MODEL, nhead=4, num_layers=2, dropout=0.2)
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.add_(torch.randn_like(parameter) * 0.05)
+        # Keep predictions inside the clamp range so the comparison is meaningful
+        model.price_head[-1].bias.fill_(7.0)
+    return model.eval()
+
+
+def random_tokens(batch_size, seed=1):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn(batch_size, 3, D_MODEL, generator=generator)
+
+
+def test_parity_across_batch_sizes():
+    model = make_trained_model()
+    fast = InferencePriceTransformer(model)
+    
+    for batch_size in (1, 7, 64, 513):
+        tokens = random_tokens(batch_size, seed=batch_size)
+        with torch.no_grad():
+            expected = model(tokens)
+        actual = fast(tokens)
+        assert actual.shape == expected.shape
+        torch.testing.assert_close(actual, expected, rtol=1e-5, atol=1e-5)
+
+
+def test_parity_from_checkpoint():
+    model = make_trained_model(seed=3)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.pth')
+        torch.save(model.state_dict(), path)
+        fast = InferencePriceTransformer.from_checkpoint(path, d_model=D_MODEL)
+    
+    tokens = random_tokens(32)
+    with torch.no_grad():
+        expected = model(tokens)
+    torch.testing.assert_close(fast(tokens), expected, rtol=1e-5, atol=1e-5)
+
+
+def test_clamp_matches_training_module():
+    model = make_trained_model()
+    with torch.no_grad():
+        model.price_head[-1].bias.fill_(50.0)
+    fast = InferencePriceTransformer(model)
+    
+    tokens = random_tokens(8)
+    assert torch.all(fast(tokens) == model.max_price_log)
+
+
+def test_is_eval_only_and_independent_of_source():
+    model = make_trained_model()
+    fast = InferencePriceTransformer(model)
+    tokens = random_tokens(4)
+    before = fast(tokens).clone()
+    
+    # Later changes to the training module do not leak into the folded copy
+    with torch.no_grad():
+        model.pos_encoding.add_(1.0)
+    torch.testing.assert_close(fast(tokens), before)
+    
+    assert not any(p.requires_grad for p in fast.parameters())
+    try:
+        fast.train()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("train() should be rejected")
+
+
+def test_attention_comes_from_the_same_pass():
+    model = make_trained_model()
+    fast = InferencePriceTransformer(model)
+    tokens = random_tokens(16)
+    
+    with torch.no_grad():
+        expected = model(tokens)
+        price, attention = model(tokens, return_attention=True)
+        pooling = model.get_attention_weights(tokens)
+    fast_price, fast_attention = fast(tokens, return_attention=True)
+    
+    torch.testing.assert_close(price, expected, rtol=1e-5, atol=1e-5)
+    torch.testing.assert_close(fast_price, expected, rtol=1e-5, atol=1e-5)
+    assert fast_attention['layers'].shape == (2, 16, 4, 3, 3)
+    torch.testing.assert_close(fast_attention['layers'], attention['layers'], rtol=1e-5, atol=1e-5)
+    torch.testing.assert_close(fast_attention['pooling'], pooling.squeeze(1), rtol=1e-5, atol=1e-5)
+    
+    importance = attention_rollout(fast_attention['layers'], fast_attention['pooling'])
+    torch.testing.assert_close(importance.sum(dim=-1), torch.ones(16))
+
+
+
+def test_index_encoding_matches_one_hot_projection():
+    torch.manual_seed(0)
+    onehot = ModalityProjection(5, 11, d_model=D_MODEL, category_encoding='onehot')
+    index = onehot.to_index_encoding()
+    
+    main_ids = torch.tensor([0, 4, 2, 5])  # 5 is the OOV id
+    sub_ids = torch.tensor([10, 0, 11, 3])
+    main_rows = torch.nn.functional.one_hot(main_ids, 6)[:, :5].float()  # OOV -> all-zero row
+    sub_rows = torch.nn.functional.one_hot(sub_ids, 12)[:, :11].float()
+    text, numeric = torch.randn(4, 768), torch.randn(4, 6)
+    
+    with torch.no_grad():
+        expected = onehot(text, main_rows, sub_rows, numeric)
+        tokens = index(text, main_ids, sub_ids, numeric)
+    
+    assert tokens.shape == (4, 3, D_MODEL)
+    torch.testing.assert_close(tokens, expected, rtol=1e-5, atol=1e-5)
+
+
+if __name__ == "__main__":
+    import sys
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,53 @@
+"""
+Tests for MC-dropout intervals and their conformal calibration (no model artifacts needed).
+
+    python -m pytest -q test_uncertainty.py
+"""
+import numpy as np
+import torch
+
+from test_transformer import make_trained_model, random_tokens
+from uncertainty import mc_dropout_model, mc_samples, intervals, fit_calibration, interval_confidence
+
+
+def test_mc_samples_are_one_repeated_batch_with_dropout_on():
+    model = make_trained_model()
+    mc_model = mc_dropout_model(model)
+    tokens = random_tokens(5)
+    
+    samples = mc_samples(mc_model, tokens, num_samples=16, max_rows=7)  # Chunked across the repeats
+    
+    assert samples.shape == (16, 5)
+    assert np.all(samples.std(axis=0) > 0)
+    assert not model.training and mc_model.training  # Source model left in eval mode
+    
+    # Without dropout every repeat reproduces its own row of the deterministic output
+    for module in mc_model.modules():
+        if isinstance(module, torch.nn.Dropout):
+            module.p = 0.0
+        elif isinstance(module, torch.nn.MultiheadAttention):
+            module.dropout = 0.0
+    with torch.no_grad():
+        deterministic = model(tokens).numpy()
+    np.testing.assert_allclose(mc_samples(mc_model, tokens, num_samples=3, max_rows=4),
+                               np.tile(deterministic, (3, 1)), rtol=1e-5, atol=1e-5)
+
+
+def test_calibration_fixes_overconfident_spread():
+    rng = np.random.default_rng(0)
+    centers = rng.uniform(4, 9, 4000)
+    samples = centers + 0.1 * rng.standard_normal((32, 4000))  # MC spread 0.1
+    targets = centers + 0.3 * rng.standard_normal(4000)        # True spread 0.3
+    
+    calibration = fit_calibration(samples, targets, levels=[0.8, 0.9])
+    
+    coverage = calibration['coverage']['0.80']
+    assert coverage['raw'] < 0.5
+    assert abs(coverage['calibrated'] - 0.8) < 0.03
+    assert abs(calibration['scales']['0.90'] - 3 * 1.645) < 0.5
+    
+    calibrated = intervals(samples[:, :3], 0.8, calibration)
+    raw = intervals(samples[:, :3], 0.8)
+    assert np.all(calibrated['lower'] < raw['lower']) and np.all(calibrated['upper'] > raw['upper'])
+    assert np.all(interval_confidence(calibrated['median'], calibrated['lower'], calibrated['upper'])
+                  < interval_confidence(raw['median'], raw['lower'], raw['upper']))
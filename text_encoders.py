@@ -0,0 +1,681 @@
+"""
+Pluggable text encoders for product names.
+
+Every backend implements the TextEncoder interface and declares its `name`,
+`version` and `output_dim`. Backends are registered by name and selected with
+TEXT_ENCODER_CONFIG['backend'], both when generating training data and in
+PricePredictor:
+
+- 'bert':      bert-base-uncased CLS vector (768-d, needs transformers)
+- 'distilled': bag-of-subwords student regressing projected CLS vectors (d_model)
+- 'hashing':   hashed word/char n-gram TF-IDF + learned projection (d_model);
+               no transformer model or tokenizer vocabulary at all
+
+Backends whose output_dim differs from d_model go through the fixed text
+projection (text_projection.pth) to become the text token. It is written once by
+`build-projection` and only loaded when serving.
+
+Usage:
+    python text_encoders.py build-projection [--source PATH]
+    python text_encoders.py distill [--cache PATH] [--vocab PATH] [--epochs N]
+    python text_encoders.py fit-hashing [--cache PATH] [--epochs N]
+    python text_encoders.py list
+"""
+import glob
+import hashlib
+import os
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from config import DATA_PATH, MODEL_CONFIG, TEXT_ENCODER_CONFIG
+from metrics import timed
+
+
+# Registry of text encoder backends
+TEXT_ENCODERS = {}
+
+
+def register_text_encoder(name):
+    """Class decorator registering a TextEncoder backend under `name`."""
+    def decorator(cls):
+        cls.name = name
+        TEXT_ENCODERS[name] = cls
+        return cls
+    return decorator
+
+
+def available_text_encoders():
+    return sorted(TEXT_ENCODERS)
+
+
+def get_text_encoder(backend=None, device='cpu'):
+    """Create the configured text encoder backend."""
+    backend = backend or TEXT_ENCODER_CONFIG['backend']
+    if backend not in TEXT_ENCODERS:
+        raise ValueError(f"Unknown text encoder backend: {backend} "
+                         f"(available: {', '.join(available_text_encoders())})")
+    return TEXT_ENCODERS[backend].from_config(TEXT_ENCODER_CONFIG, device)
+
+
+class TextEncoder:
+    """Interface for text encoder backends."""
+    
+    name = None
+    version = None
+    output_dim = None
+    
+    @classmethod
+    def from_config(cls, config, device='cpu'):
+        raise NotImplementedError
+    
+    def encode(self, texts):
+        """Encode a list of texts to a float32 numpy array [N, output_dim]."""
+        raise NotImplementedError
+    
+    def describe(self):
+        return {'name': self.name, 'version': self.version, 'output_dim': self.output_dim}
+
+
+def basic_tokenize(text):
+    """Lowercase, strip accents and split on whitespace/punctuation (BERT basic tokenizer)."""
+    text = unicodedata.normalize('NFD', (text or '').lower())
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    
+    tokens, current = [], []
+    for char in text:
+        if char.isspace() or _is_punctuation(char):
+            if current:
+                tokens.append(''.join(current))
+                current = []
+            if not char.isspace():
+                tokens.append(char)
+        else:
+            current.append(char)
+    if current:
+        tokens.append(''.join(current))
+    return tokens
+
+
+def _is_punctuation(char):
+    code = ord(char)
+    if 33 <= code <= 47 or 58 <= code <= 64 or 91 <= code <= 96 or 123 <= code <= 126:
+        return True
+    return unicodedata.category(char).startswith('P')
+
+
+class WordPieceTokenizer:
+    """Minimal bert-base-uncased compatible tokenizer (basic split + greedy WordPiece)."""
+    
+    def __init__(self, vocab, unk_token='[UNK]', max_chars_per_word=100):
+        self.vocab = list(vocab)
+        self.token_to_id = {token: i for i, token in enumerate(self.vocab)}
+        self.unk_id = self.token_to_id.get(unk_token, 0)
+        self.max_chars_per_word = max_chars_per_word
+    
+    @classmethod
+    def from_vocab_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(line.rstrip('\n') for line in f)
+    
+    def __len__(self):
+        return len(self.vocab)
+    
+    def _wordpiece(self, word):
+        if len(word) > self.max_chars_per_word:
+            return [self.unk_id]
+        
+        ids, start = [], 0
+        while start < len(word):
+            end = len(word)
+            piece_id = None
+            while start < end:
+                piece = word[start:end] if start == 0 else '##' + word[start:end]
+                if piece in self.token_to_id:
+                    piece_id = self.token_to_id[piece]
+                    break
+                end -= 1
+            if piece_id is None:
+                return [self.unk_id]
+            ids.append(piece_id)
+            start = end
+        return ids
+    
+    def encode(self, text, max_length=128):
+        """Subword ids without special tokens, truncated to max_length."""
+        ids = []
+        for word in basic_tokenize(text):
+            ids.extend(self._wordpiece(word))
+            if len(ids) >= max_length:
+                break
+        return ids[:max_length] or [self.unk_id]
+
+
+def _bag_batch(per_text_ids, per_text_weights=None, device='cpu'):
+    """Flatten per-text id lists into (ids, offsets[, weights]) for nn.EmbeddingBag."""
+    lengths = [len(ids) for ids in per_text_ids]
+    ids = torch.tensor([i for text_ids in per_text_ids for i in text_ids], dtype=torch.long)
+    offsets = torch.tensor(np.concatenate([[0], np.cumsum(lengths)[:-1]]), dtype=torch.long)
+    batch = [ids.to(device), offsets.to(device)]
+    if per_text_weights is not None:
+        weights = torch.tensor([w for text_weights in per_text_weights for w in text_weights],
+                               dtype=torch.float32)
+        batch.append(weights.to(device))
+    return batch
+
+
+@register_text_encoder('bert')
+class BertTextEncoder(TextEncoder):
+    """bert-base-uncased CLS embedding (the original preprocessing encoder)."""
+    
+    version = 'bert-base-uncased-cls-1'
+    output_dim = 768
+    
+    def __init__(self, model_name='bert-base-uncased', max_length=128, batch_size=32, device='cpu'):
+        from transformers import AutoTokenizer, AutoModel
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).to(device).eval()
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.device = device
+        self.output_dim = self.model.config.hidden_size
+    
+    @classmethod
+    def from_config(cls, config, device='cpu'):
+        return cls(config['bert_model_name'], config['max_length'], device=device)
+    
+    def encode(self, texts):
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            with timed('tokenize'):
+                inputs = self.tokenizer(
+                    list(texts[start:start + self.batch_size]),
+                    return_tensors='pt',
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length
+                ).to(self.device)
+            with timed('text_encoder'), torch.inference_mode():
+                outputs = self.model(**inputs)
+            embeddings.append(outputs.last_hidden_state[:, 0, :].cpu().numpy())
+        return np.concatenate(embeddings).astype(np.float32)
+
+
+class BagOfSubwordsEncoder(nn.Module):
+    """Mean of subword embeddings followed by a small MLP."""
+    
+    def __init__(self, vocab_size, embedding_dim=256, hidden_dim=256, output_dim=128):
+        super().__init__()
+        self.embedding = nn.EmbeddingBag(vocab_size, embedding_dim, mode='mean')
+        self.mlp = nn.Sequential(
+            nn.Linear(embedding_dim, hidden_dim),
+            nn.GELU(),
+            nn.Linear(hidden_dim, output_dim)
+        )
+    
+    def forward(self, input_ids, offsets):
+        return self.mlp(self.embedding(input_ids, offsets))
+
+
+@register_text_encoder('distilled')
+class DistilledTextEncoder(TextEncoder):
+    """Tokenizer + BagOfSubwordsEncoder, producing projected [N, d_model] text embeddings."""
+    
+    version = 'distilled-bag-of-subwords-1'
+    
+    def __init__(self, tokenizer, model, max_length=128, device='cpu'):
+        self.tokenizer = tokenizer
+        self.model = model.to(device).eval()
+        self.max_length = max_length
+        self.device = device
+        self.output_dim = model.mlp[-1].out_features
+    
+    @classmethod
+    def from_config(cls, config, device='cpu'):
+        return cls.load(config['distilled_model_path'], device)
+    
+    def features(self, texts):
+        return [self.tokenizer.encode(text, self.max_length) for text in texts]
+    
+    def encode(self, texts):
+        with timed('tokenize'):
+            inputs = _bag_batch(self.features(texts), device=self.device)
+        with timed('text_encoder'), torch.inference_mode():
+            embeddings = self.model(*inputs)
+        return embeddings.cpu().numpy()
+    
+    def save(self, path):
+        model = self.model
+        torch.save({
+            'version': self.version,
+            'vocab': self.tokenizer.vocab,
+            'max_length': self.max_length,
+            'embedding_dim': model.embedding.embedding_dim,
+            'hidden_dim': model.mlp[0].out_features,
+            'output_dim': model.mlp[-1].out_features,
+            'state_dict': model.state_dict()
+        }, path)
+    
+    @classmethod
+    def load(cls, path, device='cpu'):
+        checkpoint = torch.load(path, map_location=device)
+        tokenizer = WordPieceTokenizer(checkpoint['vocab'])
+        model = BagOfSubwordsEncoder(len(tokenizer), checkpoint['embedding_dim'],
+                                     checkpoint['hidden_dim'], checkpoint['output_dim'])
+        model.load_state_dict(checkpoint['state_dict'])
+        return cls(tokenizer, model, checkpoint['max_length'], device)
+
+
+@register_text_encoder('hashing')
+class HashingTextEncoder(TextEncoder):
+    """
+    Hashed n-gram TF-IDF features with a learned linear projection to d_model.
+    
+    Features are word n-grams plus character n-grams of each word, hashed with
+    crc32 into `num_features` buckets (sign from a second hash bit). IDF weights
+    come from the fitting texts; the projection is an EmbeddingBag over the
+    buckets, trained to regress projected CLS embeddings when a cache exists and
+    a seeded random projection otherwise.
+    """
+    
+    version = 'hashing-tfidf-1'
+    
+    def __init__(self, num_features=2 ** 16, output_dim=None, word_ngrams=2, char_ngrams=3,
+                 idf=None, device='cpu'):
+        self.num_features = num_features
+        self.output_dim = output_dim or MODEL_CONFIG['d_model']
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = char_ngrams
+        self.idf = np.ones(num_features, dtype=np.float32) if idf is None else idf.astype(np.float32)
+        self.device = device
+        
+        generator = torch.Generator().manual_seed(0)
+        self.projection = nn.EmbeddingBag(num_features, self.output_dim, mode='sum')
+        with torch.no_grad():
+            self.projection.weight.normal_(0.0, 1.0, generator=generator)
+        self.projection = self.projection.to(device).eval()
+    
+    @classmethod
+    def from_config(cls, config, device='cpu'):
+        return cls.load(config['hashing_model_path'], device)
+    
+    def _grams(self, text):
+        words = basic_tokenize(text)
+        grams = []
+        for n in range(1, self.word_ngrams + 1):
+            grams.extend(' '.join(words[i:i + n]) for i in range(len(words) - n + 1))
+        for word in words:
+            padded = f'<{word}>'
+            grams.extend('#' + padded[i:i + self.char_ngrams]
+                         for i in range(max(1, len(padded) - self.char_ngrams + 1)))
+        return grams
+    
+    def _hashed_counts(self, text):
+        counts = {}
+        for gram in self._grams(text):
+            h = zlib.crc32(gram.encode('utf-8'))
+            bucket = h % self.num_features
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+        return counts
+    
+    def fit_idf(self, texts):
+        document_frequency = np.zeros(self.num_features, dtype=np.float64)
+        for text in texts:
+            document_frequency[list(self._hashed_counts(text))] += 1
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self
+    
+    def features(self, texts):
+        """Per-text (bucket ids, L2-normalized TF-IDF weights)."""
+        ids, weights = [], []
+        for text in texts:
+            counts = self._hashed_counts(text) or {0: 0.0}
+            buckets = np.fromiter(counts, dtype=np.int64)
+            values = np.fromiter(counts.values(), dtype=np.float32) * self.idf[buckets]
+            norm = np.linalg.norm(values)
+            ids.append(buckets.tolist())
+            weights.append((values / norm if norm > 0 else values).tolist())
+        return ids, weights
+    
+    def encode(self, texts):
+        with timed('tokenize'):
+            ids, weights = self.features(texts)
+            input_ids, offsets, per_sample_weights = _bag_batch(ids, weights, self.device)
+        with timed('text_encoder'), torch.inference_mode():
+            embeddings = self.projection(input_ids, offsets, per_sample_weights=per_sample_weights)
+        return embeddings.cpu().numpy()
+    
+    def save(self, path):
+        torch.save({
+            'version': self.version,
+            'num_features': self.num_features,
+            'output_dim': self.output_dim,
+            'word_ngrams': self.word_ngrams,
+            'char_ngrams': self.char_ngrams,
+            'idf': torch.from_numpy(self.idf),
+            'projection': self.projection.state_dict()
+        }, path)
+    
+    @classmethod
+    def load(cls, path, device='cpu'):
+        checkpoint = torch.load(path, map_location='cpu')
+        encoder = cls(checkpoint['num_features'], checkpoint['output_dim'], checkpoint['word_ngrams'],
+                      checkpoint['char_ngrams'], checkpoint['idf'].numpy(), device)
+        encoder.projection.load_state_dict(checkpoint['projection'])
+        return encoder
+
+
+def build_text_projection(path=None, source=None, text_dim=768, d_model=None, seed=0):
+    """
+    Write the fixed text projection (text_dim -> d_model) used at serving time.
+    
+    Copies the text projection out of the token-building ModalityProjection
+    (modality_projection.pth from INPUT_PREPARATION.ipynb), so served text tokens
+    match the ones the model was trained on. Without that file a seeded random
+    projection is written instead, and a warning is printed.
+    
+    Returns:
+        path of the saved projection
+    """
+    path = path or TEXT_ENCODER_CONFIG['text_projection_path']
+    source = source or os.path.join(DATA_PATH, 'modality_projection.pth')
+    
+    if os.path.exists(source):
+        state = {name.split('.', 1)[1]: value for name, value in torch.load(source, map_location='cpu').items()
+                 if name.startswith('text_projection.')}
+        if not state:
+            raise ValueError(f"{source} has no text_projection weights (its tokens were built from a d_model "
+                             f"backend, which is served without a projection)")
+        print(f"   Using the token-building text projection from {source}")
+    else:
+        print(f"⚠️ {source} not found; writing a seeded random projection "
+              f"(it will not match tokens built by INPUT_PREPARATION.ipynb)")
+        generator_state = torch.random.get_rng_state()
+        torch.manual_seed(seed)
+        state = nn.Linear(text_dim, d_model or MODEL_CONFIG['d_model']).state_dict()
+        torch.random.set_rng_state(generator_state)
+    
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    torch.save(state, path)
+    print(f"💾 Saved text projection ({state['weight'].shape[1]} -> {state['weight'].shape[0]}) to {path}")
+    return path
+
+
+def load_text_projection(path=None, text_dim=768, d_model=None):
+    """
+    Load the fixed text projection (text_dim -> d_model) for backends that need one.
+    
+    Raises:
+        FileNotFoundError: if it has not been built (see build_text_projection)
+        ValueError: if its shape does not match text_dim / d_model
+    """
+    path = path or TEXT_ENCODER_CONFIG['text_projection_path']
+    d_model = d_model or MODEL_CONFIG['d_model']
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No text projection at {path}; build it with `python text_encoders.py build-projection`"
+        )
+    
+    state = torch.load(path, map_location='cpu')
+    if tuple(state['weight'].shape) != (d_model, text_dim):
+        raise ValueError(f"Text projection {path} maps {state['weight'].shape[1]} -> {state['weight'].shape[0]}, "
+                         f"expected {text_dim} -> {d_model}")
+    projection = nn.Linear(text_dim, d_model)
+    projection.load_state_dict(state)
+    return projection.eval()
+
+
+def text_space(encoder_name, encoder_version, projection=None):
+    """
+    Identifier of the text-token space a backend (plus projection) produces.
+    
+    Tokens from two sources are interchangeable only when their text spaces
+    are equal, e.g. catalog index tokens and freshly encoded ones.
+    """
+    digest = 'none'
+    if projection is not None:
+        hasher = hashlib.sha256()
+        for name, value in sorted(projection.state_dict().items()):
+            hasher.update(name.encode())
+            hasher.update(value.detach().cpu().contiguous().numpy().tobytes())
+        digest = hasher.hexdigest()[:12]
+    return f"{encoder_name}:{encoder_version}:{digest}"
+
+
+def find_vocab_file(path=None):
+    """Locate a bert-base-uncased vocab.txt locally (config path, then the HF cache)."""
+    candidates = [path, TEXT_ENCODER_CONFIG.get('tokenizer_vocab_path')]
+    hf_home = os.environ.get('HF_HOME', os.path.join(os.path.expanduser('~'), '.cache', 'huggingface'))
+    candidates += sorted(glob.glob(os.path.join(
+        hf_home, 'hub', 'models--bert-base-uncased', 'snapshots', '*', 'vocab.txt')))
+    
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(
+        "No tokenizer vocab.txt found; set TEXT_ENCODER_CONFIG['tokenizer_vocab_path']"
+    )
+
+
+def save_embedding_cache(texts, embeddings, path=None, prices=None, categories=None):
+    """
+    Cache product names with their raw CLS embeddings (call from preprocessing).
+    
+    prices / categories are optional per-text columns used by catalog_index.py.
+    
+    Raises:
+        ValueError: if the embeddings are not BERT CLS vectors (e.g. another backend's output)
+    """
+    path = path or TEXT_ENCODER_CONFIG['embedding_cache_path']
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2 or embeddings.shape[1] != BertTextEncoder.output_dim:
+        raise ValueError(f"The embedding cache holds {BertTextEncoder.output_dim}-d BERT CLS vectors, "
+                         f"got shape {embeddings.shape}")
+    extras = {}
+    if prices is not None:
+        extras['prices'] = np.asarray(prices, dtype=np.float64)
+    if categories is not None:
+        extras['categories'] = np.asarray(categories, dtype=str)
+    np.savez(path, texts=np.asarray(texts, dtype=object), embeddings=embeddings, **extras)
+    print(f"💾 Saved {len(texts)} cached text embeddings to {path}")
+    return path
+
+
+def load_projected_cache(cache_path=None):
+    """Cached texts and their CLS embeddings passed through the fixed text projection."""
+    cache_path = cache_path or TEXT_ENCODER_CONFIG['embedding_cache_path']
+    cache = np.load(cache_path, allow_pickle=True)
+    texts = [str(t) for t in cache['texts']]
+    projection = load_text_projection(text_dim=cache['embeddings'].shape[1])
+    with torch.no_grad():
+        targets = projection(torch.as_tensor(cache['embeddings'], dtype=torch.float32))
+    print(f"✅ Loaded {len(texts)} cached embeddings from {cache_path}")
+    return texts, targets
+
+
+def _fit_to_targets(model, make_inputs, targets, save, epochs, batch_size, learning_rate,
+                    device, val_fraction=0.05):
+    """
+    Regress `targets` with MSE + cosine loss; `save()` is called on each new best.
+    
+    Args:
+        make_inputs: indices -> tuple of model inputs on `device`
+    
+    Returns:
+        (best val MSE, val cosine at that epoch)
+    """
+    order = np.random.default_rng(0).permutation(len(targets))
+    num_val = max(1, int(len(targets) * val_fraction))
+    val_idx, train_idx = order[:num_val], order[num_val:]
+    
+    def evaluate(indices):
+        model.eval()
+        se, cos, count = 0.0, 0.0, 0
+        with torch.no_grad():
+            for start in range(0, len(indices), batch_size):
+                batch = indices[start:start + batch_size]
+                predictions = model(*make_inputs(batch))
+                batch_targets = targets[batch].to(device)
+                se += ((predictions - batch_targets) ** 2).mean(dim=1).sum().item()
+                cos += F.cosine_similarity(predictions, batch_targets).sum().item()
+                count += len(batch)
+        return se / count, cos / count
+    
+    optimizer = torch.optim.AdamW(model.parameters(), lr=learning_rate)
+    rng = np.random.default_rng(1)
+    best = (float('inf'), 0.0)
+    
+    for epoch in range(epochs):
+        model.train()
+        rng.shuffle(train_idx)
+        total_loss, num_batches = 0.0, 0
+        for start in range(0, len(train_idx), batch_size):
+            batch = train_idx[start:start + batch_size]
+            predictions = model(*make_inputs(batch))
+            batch_targets = targets[batch].to(device)
+            loss = F.mse_loss(predictions, batch_targets) + \
+                (1 - F.cosine_similarity(predictions, batch_targets)).mean()
+            
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item()
+            num_batches += 1
+        
+        val_mse, val_cos = evaluate(val_idx)
+        print(f"Epoch {epoch+1}/{epochs}: train {total_loss / num_batches:.5f} | "
+              f"val MSE {val_mse:.5f} | val cosine {val_cos:.4f}")
+        
+        if val_mse < best[0]:
+            best = (val_mse, val_cos)
+            save()
+    
+    model.eval()
+    return best
+
+
+def _report(encoder, texts, output_path, val_mse, val_cos):
+    sample = texts[:64]
+    start = time.perf_counter()
+    for text in sample:
+        encoder.encode([text])
+    latency_ms = (time.perf_counter() - start) / len(sample) * 1000
+    
+    print(f"💾 {encoder.name} text encoder saved to {output_path}")
+    print(f"📊 Val MSE {val_mse:.5f}, cosine {val_cos:.4f}, {latency_ms:.3f} ms/text (CPU)")
+    return {'val_mse': val_mse, 'val_cosine': val_cos, 'ms_per_text': latency_ms,
+            **encoder.describe()}
+
+
+def distill_text_encoder(cache_path=None, vocab_path=None, output_path=None, epochs=None,
+                         batch_size=None, learning_rate=None, device=None):
+    """
+    Train the 'distilled' backend to regress projected CLS embeddings.
+    
+    Returns:
+        dict with validation MSE / cosine similarity, per-text latency and encoder info
+    """
+    config = TEXT_ENCODER_CONFIG
+    output_path = output_path or config['distilled_model_path']
+    batch_size = batch_size or config['batch_size']
+    device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+    
+    texts, targets = load_projected_cache(cache_path)
+    tokenizer = WordPieceTokenizer.from_vocab_file(find_vocab_file(vocab_path))
+    model = BagOfSubwordsEncoder(len(tokenizer), config['embedding_dim'],
+                                 config['hidden_dim'], targets.shape[1]).to(device)
+    print(f"Student parameters: {sum(p.numel() for p in model.parameters()):,} "
+          f"(vocab {len(tokenizer):,})")
+    
+    # Tokenize once; batches slice the per-text id lists
+    encoder = DistilledTextEncoder(tokenizer, model, config['max_length'], device)
+    encoded = encoder.features(texts)
+    
+    val_mse, val_cos = _fit_to_targets(
+        model, lambda batch: _bag_batch([encoded[i] for i in batch], device=device), targets,
+        lambda: encoder.save(output_path), epochs or config['epochs'], batch_size,
+        learning_rate or config['learning_rate'], device
+    )
+    return _report(DistilledTextEncoder.load(output_path), texts, output_path, val_mse, val_cos)
+
+
+class _WeightedBag(nn.Module):
+    """Adapts EmbeddingBag(ids, offsets, per_sample_weights) to positional inputs."""
+    
+    def __init__(self, bag):
+        super().__init__()
+        self.bag = bag
+    
+    def forward(self, input_ids, offsets, weights):
+        return self.bag(input_ids, offsets, per_sample_weights=weights)
+
+
+def fit_hashing_encoder(cache_path=None, output_path=None, epochs=None, batch_size=None,
+                        learning_rate=None, device=None):
+    """
+    Fit the 'hashing' backend: IDF on the cached texts, then the projection to
+    regress projected CLS embeddings. Deployments without any cache can still
+    use HashingTextEncoder().fit_idf(texts), which keeps the seeded random projection.
+    """
+    config = TEXT_ENCODER_CONFIG
+    output_path = output_path or config['hashing_model_path']
+    batch_size = batch_size or config['batch_size']
+    device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+    
+    texts, targets = load_projected_cache(cache_path)
+    encoder = HashingTextEncoder(config['hashing_num_features'], targets.shape[1], device=device)
+    encoder.fit_idf(texts)
+    ids, weights = encoder.features(texts)
+    with torch.no_grad():
+        encoder.projection.weight.mul_(0.01)
+    
+    val_mse, val_cos = _fit_to_targets(
+        _WeightedBag(encoder.projection),
+        lambda batch: _bag_batch([ids[i] for i in batch], [weights[i] for i in batch], device),
+        targets, lambda: encoder.save(output_path), epochs or config['epochs'], batch_size,
+        config['hashing_learning_rate'] if learning_rate is None else learning_rate, device
+    )
+    return _report(HashingTextEncoder.load(output_path), texts, output_path, val_mse, val_cos)
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Train or inspect text encoder backends")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    projection_parser = subparsers.add_parser('build-projection', help='Write the fixed text projection for serving')
+    projection_parser.add_argument('--source', help='modality_projection.pth to copy the text projection from')
+    projection_parser.add_argument('--output', help='Where to save the projection')
+    
+    distill_parser = subparsers.add_parser('distill', help='Train the distilled backend from cached CLS embeddings')
+    distill_parser.add_argument('--cache', help='npz with texts + embeddings')
+    distill_parser.add_argument('--vocab', help='Tokenizer vocab.txt')
+    distill_parser.add_argument('--output', help='Where to save the encoder')
+    distill_parser.add_argument('--epochs', type=int)
+    
+    hashing_parser = subparsers.add_parser('fit-hashing', help='Fit the hashing backend from cached CLS embeddings')
+    hashing_parser.add_argument('--cache', help='npz with texts + embeddings')
+    hashing_parser.add_argument('--output', help='Where to save the encoder')
+    hashing_parser.add_argument('--epochs', type=int)
+    
+    subparsers.add_parser('list', help='List registered backends')
+    args = parser.parse_args()
+    
+    if args.command == 'build-projection':
+        build_text_projection(args.output, args.source)
+    elif args.command == 'distill':
+        distill_text_encoder(args.cache, args.vocab, args.output, args.epochs)
+    elif args.command == 'fit-hashing':
+        fit_hashing_encoder(args.cache, args.output, args.epochs)
+    else:
+        for name in available_text_encoders():
+            cls = TEXT_ENCODERS[name]
+            print(f"{name:10s} version={cls.version} output_dim={cls.output_dim or MODEL_CONFIG['d_model']}")
@@ -2,11 +2,71 @@
 Simple but effective multimodal transformer for price prediction.
 Specialized for 3-token sequences: [text, category, numeric]
 """
+import copy
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import math
 
+TOKEN_NAMES = ('text', 'category', 'numeric')
+
+
+def _feed_forward(layer, x):
+    return layer.dropout2(layer.linear2(layer.dropout(layer.activation(layer.linear1(x)))))
+
+
+def encode_with_attention(transformer, x):
+    """
+    Run an nn.TransformerEncoder layer by layer, also returning each layer's self-attention.
+    
+    Same math as TransformerEncoderLayer (pre- or post-norm). The fused fast
+    path cannot return weights, so this path is only used when they are requested.
+    
+    Returns:
+        (encoded, attention [num_layers, batch, heads, seq, seq])
+    """
+    maps = []
+    for layer in transformer.layers:
+        if layer.norm_first:
+            h = layer.norm1(x)
+            attended, weights = layer.self_attn(h, h, h, need_weights=True, average_attn_weights=False)
+            x = x + layer.dropout1(attended)
+            x = x + _feed_forward(layer, layer.norm2(x))
+        else:
+            attended, weights = layer.self_attn(x, x, x, need_weights=True, average_attn_weights=False)
+            x = layer.norm1(x + layer.dropout1(attended))
+            x = layer.norm2(x + _feed_forward(layer, x))
+        maps.append(weights)
+    
+    if transformer.norm is not None:
+        x = transformer.norm(x)
+    return x, torch.stack(maps)
+
+
+def attention_rollout(layer_attention, pooling_weights):
+    """
+    Importance of each input token for the pooled representation.
+    
+    Head-averaged attention of every layer is mixed 50/50 with the identity
+    (the residual path), row-normalized and multiplied through the layers;
+    the pooling weights are then propagated back through that product.
+    
+    Args:
+        layer_attention: [num_layers, batch, heads, seq, seq]
+        pooling_weights: [batch, seq]
+    
+    Returns:
+        [batch, seq] importances summing to 1
+    """
+    seq_len = pooling_weights.shape[-1]
+    identity = torch.eye(seq_len, device=pooling_weights.device)
+    rollout = identity.expand(pooling_weights.shape[0], seq_len, seq_len)
+    for attention in layer_attention:
+        mixed = 0.5 * attention.mean(dim=1) + 0.5 * identity
+        rollout = (mixed / mixed.sum(dim=-1, keepdim=True)) @ rollout
+    return (pooling_weights.unsqueeze(1) @ rollout).squeeze(1)
+
+
 class MultimodalPriceTransformer(nn.Module):
     """
     Simple multimodal transformer specialized for price prediction.
@@ -80,15 +140,18 @@ class MultimodalPriceTransformer(nn.Module):
                 nn.init.ones_(module.weight)
                 nn.init.zeros_(module.bias)
     
-    def forward(self, token_sequence):
+    def forward(self, token_sequence, return_attention=False):
         """
         Forward pass for price prediction.
         
         Args:
             token_sequence: [batch_size, 3, d_model] - 3 tokens per sample
+            return_attention: Also return the attention maps from the same pass
         
         Returns:
             price_predictions: [batch_size] - predicted log prices
+            attention: (only with return_attention) {'pooling': [batch_size, 3],
+                'layers': [num_layers, batch_size, heads, 3, 3]}
         """
         batch_size, seq_len, _ = token_sequence.shape
         
@@ -100,7 +163,10 @@ class MultimodalPriceTransformer(nn.Module):
         type_embedded = pos_encoded + self.token_type_embedding(token_types)
         
         # Apply transformer layers
-        encoded = self.transformer(type_embedded)
+        if return_attention:
+            encoded, layer_attention = encode_with_attention(self.transformer, type_embedded)
+        else:
+            encoded = self.transformer(type_embedded)
         
         # Attention pooling - let model decide which tokens matter most
         # Use first token as query, all tokens as keys/values
@@ -114,24 +180,107 @@ class MultimodalPriceTransformer(nn.Module):
         # Constrain to reasonable price range
         price_pred = torch.clamp(price_logits, self.min_price_log, self.max_price_log)
         
+        if return_attention:
+            return price_pred, {'pooling': attention_weights.squeeze(1), 'layers': layer_attention}
         return price_pred
     
     def get_attention_weights(self, token_sequence):
-        """Get attention weights for interpretation."""
+        """Get pooling attention weights for interpretation (see forward(return_attention=True))."""
         self.eval()
         with torch.no_grad():
-            batch_size, seq_len, _ = token_sequence.shape
+            _, attention = self.forward(token_sequence, return_attention=True)
+            return attention['pooling'].unsqueeze(1)  # [batch_size, 1, 3]
+
+
+class InferencePriceTransformer(nn.Module):
+    """
+    Eval-only copy of a trained MultimodalPriceTransformer with constant folding.
+    
+    - pos_encoding + token_type_embedding(arange(3)) is folded into one [3, d_model] bias
+    - encoder layers run through the fused TransformerEncoderLayer fast path
+      (eval mode, no parameters requiring grad, inference_mode)
+    - attention pooling uses the first token as its only query, so only that row's
+      Q projection is computed, K/V come from one fused matmul, the 1/sqrt(d)
+      scaling is folded into the Q weights, and attention weights are only returned
+      on request (forward(return_attention=True))
+    - dropout layers are dropped from the price head
+    """
+    
+    def __init__(self, model):
+        super().__init__()
+        
+        d_model = model.d_model
+        self.d_model = d_model
+        self.max_price_log = model.max_price_log
+        self.min_price_log = model.min_price_log
+        
+        with torch.no_grad():
+            # Constant [3, d_model] input bias
+            token_bias = model.pos_encoding + model.token_type_embedding.weight[:3]
+            self.register_buffer('token_bias', token_bias.detach().clone())
             
-            # Forward pass to get attention
-            pos_encoded = token_sequence + self.pos_encoding.unsqueeze(0)
-            token_types = torch.arange(3, device=token_sequence.device).unsqueeze(0).expand(batch_size, -1)
-            type_embedded = pos_encoded + self.token_type_embedding(token_types)
-            encoded = self.transformer(type_embedded)
+            self.transformer = copy.deepcopy(model.transformer)
             
-            query = encoded[:, 0:1]
-            _, attention_weights = self.attention_pooling(query, encoded, encoded)
+            pooling = model.attention_pooling
+            scale = 1.0 / math.sqrt(d_model // pooling.num_heads)
+            self.register_buffer('query_weight', pooling.in_proj_weight[:d_model].detach().clone() * scale)
+            self.register_buffer('query_bias', pooling.in_proj_bias[:d_model].detach().clone() * scale)
+            self.register_buffer('kv_weight', pooling.in_proj_weight[d_model:].detach().clone())
+            self.register_buffer('kv_bias', pooling.in_proj_bias[d_model:].detach().clone())
+            self.register_buffer('out_weight', pooling.out_proj.weight.detach().clone())
+            self.register_buffer('out_bias', pooling.out_proj.bias.detach().clone())
             
-            return attention_weights  # [batch_size, 1, 3]
+            self.price_head = nn.Sequential(*[
+                copy.deepcopy(layer) for layer in model.price_head if not isinstance(layer, nn.Dropout)
+            ])
+        
+        self.requires_grad_(False)
+        super().train(False)
+    
+    @classmethod
+    def from_checkpoint(cls, model_path, device='cpu', **model_config):
+        """Build from a saved MultimodalPriceTransformer state dict."""
+        model = MultimodalPriceTransformer(**model_config)
+        checkpoint = torch.load(model_path, map_location=device)
+        model.load_state_dict(checkpoint.get('model_state_dict', checkpoint))
+        return cls(model.eval()).to(device)
+    
+    def train(self, mode=True):
+        """Eval-only: dropout and the training path are never used."""
+        if mode:
+            raise RuntimeError("InferencePriceTransformer is eval-only; train MultimodalPriceTransformer instead")
+        return self
+    
+    def forward(self, token_sequence, return_attention=False):
+        """
+        Args:
+            token_sequence: [batch_size, 3, d_model]
+            return_attention: Also return pooling and per-layer attention from the
+                same pass (the encoder then runs layer by layer, off the fused path)
+        
+        Returns:
+            price_predictions: [batch_size] - predicted log prices
+            attention: (only with return_attention) {'pooling': [batch_size, 3],
+                'layers': [num_layers, batch_size, heads, 3, 3]}
+        """
+        with torch.inference_mode():
+            if return_attention:
+                encoded, layer_attention = encode_with_attention(self.transformer, token_sequence + self.token_bias)
+            else:
+                encoded = self.transformer(token_sequence + self.token_bias)
+            
+            # Single-query attention pooling
+            query = F.linear(encoded[:, 0], self.query_weight, self.query_bias)  # [batch, d]
+            key, value = F.linear(encoded, self.kv_weight, self.kv_bias).split(self.d_model, dim=-1)
+            weights = torch.softmax(torch.bmm(key, query.unsqueeze(-1)).squeeze(-1), dim=-1)  # [batch, 3]
+            pooled = torch.bmm(weights.unsqueeze(1), value).squeeze(1)
+            pooled = F.linear(pooled, self.out_weight, self.out_bias)
+            
+            price_logits = self.price_head(pooled).squeeze(-1)
+            price_pred = torch.clamp(price_logits, self.min_price_log, self.max_price_log)
+            if return_attention:
+                return price_pred, {'pooling': weights, 'layers': layer_attention}
+            return price_pred
 
 
 class SimplePricePredictor(nn.Module):
@@ -159,4 +308,123 @@ class SimplePricePredictor(nn.Module):
         # Simple global average pooling
         pooled = self.global_pool(token_sequence.transpose(1, 2)).squeeze(-1)
         price_pred = self.predictor(pooled).squeeze(-1)
-        return torch.clamp(price_pred, 2.0, 13.0)
\ No newline at end of file
+        return torch.clamp(price_pred, 2.0, 13.0)
+
+
+class CategoryEmbedding(nn.Module):
+    """
+    Embedding lookup equivalent to nn.Linear applied to a one-hot vector.
+    
+    Row `num_categories` is a reserved, all-zero OOV row so unknown ids give
+    just the bias, like an all-zero one-hot row does.
+    """
+    
+    def __init__(self, num_categories, embedding_dim):
+        super().__init__()
+        self.num_categories = num_categories
+        self.weight = nn.Parameter(torch.empty(num_categories + 1, embedding_dim))
+        self.bias = nn.Parameter(torch.zeros(embedding_dim))
+        
+        # Same init as the nn.Linear it replaces
+        bound = 1 / math.sqrt(num_categories)
+        nn.init.uniform_(self.weight, -bound, bound)
+        nn.init.uniform_(self.bias, -bound, bound)
+        with torch.no_grad():
+            self.weight[num_categories].zero_()
+    
+    @classmethod
+    def from_linear(cls, linear):
+        """Convert a trained one-hot projection (nn.Linear) into a lookup table."""
+        module = cls(linear.in_features, linear.out_features)
+        with torch.no_grad():
+            module.weight[:-1].copy_(linear.weight.t())
+            module.weight[-1].zero_()
+            module.bias.copy_(linear.bias)
+        return module
+    
+    def forward(self, category_ids):
+        # Gather instead of a dense [batch, num_categories] @ [num_categories, dim] matmul
+        return F.embedding(category_ids.long(), self.weight, padding_idx=self.num_categories) + self.bias
+
+
+def sinusoidal_positional_encoding(seq_len, d_model):
+    """Fixed sinusoidal encoding used when the training tokens were prepared."""
+    pe = torch.zeros(seq_len, d_model)
+    position = torch.arange(0, seq_len, dtype=torch.float).unsqueeze(1)
+    div_term = torch.exp(torch.arange(0, d_model, 2).float() * (-math.log(10000.0) / d_model))
+    pe[:, 0::2] = torch.sin(position * div_term)
+    pe[:, 1::2] = torch.cos(position * div_term)
+    return pe
+
+
+class ModalityProjection(nn.Module):
+    """
+    Builds the [text, category, numeric] token sequence from raw features.
+    
+    With category_encoding='index' the category token is an embedding gather over
+    vocabulary ids; with 'onehot' it is the original Linear over one-hot rows.
+    Both produce the same tokens for the same weights.
+    
+    text_dim is the text encoder's output_dim. Text embeddings that are already
+    d_model wide ('distilled' / 'hashing' backends) are used as the text token
+    unchanged, as PricePredictor does; wider ones (BERT CLS) are projected.
+    """
+    
+    def __init__(self, num_main_categories, num_sub_categories, d_model=128,
+                 text_dim=768, numeric_dim=6, category_encoding='index'):
+        super().__init__()
+        
+        self.d_model = d_model
+        self.text_dim = text_dim
+        self.category_encoding = category_encoding
+        
+        self.text_projection = nn.Identity() if text_dim == d_model else nn.Linear(text_dim, d_model)
+        self.numeric_projection = nn.Linear(numeric_dim, d_model)
+        
+        if category_encoding == 'index':
+            self.main_cat_projection = CategoryEmbedding(num_main_categories, d_model // 2)
+            self.sub_cat_projection = CategoryEmbedding(num_sub_categories, d_model - d_model // 2)
+        elif category_encoding == 'onehot':
+            self.main_cat_projection = nn.Linear(num_main_categories, d_model // 2)
+            self.sub_cat_projection = nn.Linear(num_sub_categories, d_model - d_model // 2)
+        else:
+            raise ValueError(f"Unknown category_encoding: {category_encoding}")
+        
+        self.register_buffer('positional_encoding', sinusoidal_positional_encoding(3, d_model))
+    
+    def to_index_encoding(self):
+        """Return an equivalent projection that uses embedding lookups for categories."""
+        if self.category_encoding == 'index':
+            return self
+        
+        converted = ModalityProjection(
+            self.main_cat_projection.in_features, self.sub_cat_projection.in_features,
+            d_model=self.d_model, text_dim=self.text_dim,
+            numeric_dim=self.numeric_projection.in_features, category_encoding='index'
+        )
+        converted.text_projection.load_state_dict(self.text_projection.state_dict())
+        converted.numeric_projection.load_state_dict(self.numeric_projection.state_dict())
+        converted.main_cat_projection = CategoryEmbedding.from_linear(self.main_cat_projection)
+        converted.sub_cat_projection = CategoryEmbedding.from_linear(self.sub_cat_projection)
+        return converted.to(self.positional_encoding.device)
+    
+    def forward(self, text_embedding, main_category, sub_category, numeric_features):
+        """
+        Args:
+            text_embedding: [batch_size, text_dim]
+            main_category / sub_category: [batch_size] ids ('index') or
+                [batch_size, num_categories] one-hot rows ('onehot')
+            numeric_features: [batch_size, numeric_dim]
+        
+        Returns:
+            token_sequence: [batch_size, 3, d_model]
+        """
+        text_token = self.text_projection(text_embedding)
+        category_token = torch.cat([
+            self.main_cat_projection(main_category),
+            self.sub_cat_projection(sub_category)
+        ], dim=-1)
+        numeric_token = self.numeric_projection(numeric_features)
+        
+        token_sequence = torch.stack([text_token, category_token, numeric_token], dim=1)
+        return token_sequence + self.positional_encoding
@@ -0,0 +1,250 @@
+"""
+Monte-Carlo dropout price intervals.
+
+The trained MultimodalPriceTransformer is copied once per ModelSet and kept
+in train mode, so dropout stays active. For an interval, the model input is
+built once (text encoded once) and repeated K times. All K stochastic passes
+then run as one batch, giving K log-price samples per product.
+
+Raw MC-dropout spread is not calibrated: its quantiles usually cover too
+little. `python uncertainty.py calibrate` therefore fits a split-conformal
+scale on the validation split. For each level it stores the quantile of
+|log target - MC median| / MC std. At serving time the interval is
+
+    exp(median ± scale[level] * std)
+
+Without a calibration file (or with one fitted for another model version),
+the raw MC quantiles are returned and marked uncalibrated.
+
+Usage:
+    python uncertainty.py calibrate [--samples 32] [--rows 5000]
+    python uncertainty.py benchmark [--samples 8 16 32 64] [--batch-sizes 1 32]
+"""
+import copy
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+from config import UNCERTAINTY_CONFIG, DATA_PATH
+
+
+def mc_dropout_model(model):
+    """Frozen copy of a MultimodalPriceTransformer with dropout left on (train mode)."""
+    mc_model = copy.deepcopy(model)
+    mc_model.requires_grad_(False)
+    return mc_model.train()
+
+
+def mc_samples(mc_model, token_sequences, num_samples, max_rows=None):
+    """
+    K stochastic log-price samples per row, as one repeated batch.
+    
+    Args:
+        token_sequences: [batch, 3, d_model]
+        max_rows: run the K x batch rows in chunks of at most this many
+    
+    Returns:
+        [num_samples, batch] numpy array of log prices
+    """
+    max_rows = max_rows or UNCERTAINTY_CONFIG['max_rows']
+    batch_size = token_sequences.shape[0]
+    repeated = token_sequences.repeat(num_samples, 1, 1)  # Sample-major: row k*batch + i
+    
+    outputs = []
+    with torch.inference_mode():
+        for start in range(0, len(repeated), max_rows):
+            outputs.append(mc_model(repeated[start:start + max_rows]))
+    return torch.cat(outputs).view(num_samples, batch_size).cpu().numpy().astype(np.float64)
+
+
+def samples_for_budget(batch_size):
+    """Samples per row that fit the per-request row budget (at least `min_samples`)."""
+    budget = UNCERTAINTY_CONFIG['max_rows_per_request'] // max(batch_size, 1)
+    return max(UNCERTAINTY_CONFIG['min_samples'], min(UNCERTAINTY_CONFIG['num_samples'], budget))
+
+
+def intervals(samples, level, calibration=None):
+    """
+    Price intervals from MC log-price samples.
+    
+    Args:
+        samples: [num_samples, batch] log prices
+        level: central coverage, e.g. 0.8
+        calibration: loaded calibration dict, or None for raw MC quantiles
+    
+    Returns:
+        dict of [batch] arrays: 'median', 'lower', 'upper' (prices) and 'std_log'
+    """
+    median = np.median(samples, axis=0)
+    std = _spread(samples)
+    scale = None if calibration is None else calibration['scales'].get(_level_key(level))
+    if scale is not None:
+        lower, upper = median - scale * std, median + scale * std
+    else:
+        lower, upper = np.quantile(samples, [(1 - level) / 2, (1 + level) / 2], axis=0)
+    return {'median': np.exp(median), 'lower': np.exp(lower), 'upper': np.exp(upper), 'std_log': std}
+
+
+def interval_confidence(price, lower, upper):
+    """Confidence in [0, 1] from the interval's relative half-width."""
+    return np.clip(1.0 - (np.asarray(upper) - np.asarray(lower)) / (2.0 * np.asarray(price)), 0.0, 1.0)
+
+
+def _level_key(level):
+    return f'{float(level):.2f}'
+
+
+def _spread(samples):
+    return np.maximum(samples.std(axis=0), UNCERTAINTY_CONFIG['min_std_log'])
+
+
+def _nonconformity(samples, targets):
+    return np.abs(targets - np.median(samples, axis=0)) / _spread(samples)
+
+
+def _coverage(samples, targets, level, scales=None):
+    found = intervals(samples, level, {'scales': scales} if scales else None)
+    log_lower, log_upper = np.log(found['lower']), np.log(found['upper'])
+    return float(np.mean((targets >= log_lower) & (targets <= log_upper)))
+
+
+def fit_calibration(samples, targets, levels=None, seed=0):
+    """
+    Split-conformal scales per level; coverage is checked on a held-out half.
+    
+    Args:
+        samples: [num_samples, N] MC log prices
+        targets: [N] log prices
+    
+    Returns:
+        dict with 'scales' ({level: scale}, fitted on all rows), 'coverage'
+        (raw vs calibrated on the held-out half) and 'rows'
+    """
+    levels = levels or UNCERTAINTY_CONFIG['levels']
+    targets = np.asarray(targets, dtype=np.float64)
+    order = np.random.default_rng(seed).permutation(len(targets))
+    fit, held_out = order[:len(order) // 2], order[len(order) // 2:]
+    
+    def scales_for(rows):
+        scores = _nonconformity(samples[:, rows], targets[rows])
+        # Finite-sample conformal quantile
+        return {_level_key(level): float(np.quantile(scores, min(1.0, level * (1 + 1 / len(rows)))))
+                for level in levels}
+    
+    held_out_scales = scales_for(fit)
+    coverage = {
+        _level_key(level): {
+            'raw': round(_coverage(samples[:, held_out], targets[held_out], level), 4),
+            'calibrated': round(_coverage(samples[:, held_out], targets[held_out], level, held_out_scales), 4)
+        }
+        for level in levels
+    }
+    return {'scales': scales_for(order), 'coverage': coverage, 'rows': len(targets)}
+
+
+def save_calibration(calibration, path=None):
+    path = path or UNCERTAINTY_CONFIG['calibration_path']
+    with open(path + '.tmp', 'w') as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def load_calibration(model_version, path=None):
+    """Calibration for `model_version`, or None (missing or fitted for another model)."""
+    path = path or UNCERTAINTY_CONFIG['calibration_path']
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            calibration = json.load(f)
+    except Exception as e:
+        print(f"   ⚠️ Could not load uncertainty calibration: {e}")
+        return None
+    if calibration.get('model_version') != model_version:
+        print(f"   ⚠️ Uncertainty calibration is for {calibration.get('model_version')}, "
+              f"not {model_version}; intervals are uncalibrated until `python uncertainty.py calibrate`")
+        return None
+    return calibration
+
+
+def calibrate(num_samples=None, max_rows=5000, split='val'):
+    """Fit and save the calibration for the current serving model on the validation split."""
+    from dataloader import load_split
+    from predict import PricePredictor
+    
+    num_samples = num_samples or UNCERTAINTY_CONFIG['num_samples']
+    predictor = PricePredictor()
+    models = predictor.models
+    
+    dataset = load_split(DATA_PATH, split)
+    rows = np.random.default_rng(0).permutation(len(dataset.targets))[:max_rows]
+    token_sequences = dataset.token_sequences[rows].to(predictor.device)
+    targets = dataset.targets[rows].numpy()
+    
+    print(f"🎲 Calibrating MC dropout ({num_samples} samples) on {len(rows):,} {split} rows...")
+    samples = mc_samples(models.mc_model, token_sequences, num_samples)
+    calibration = fit_calibration(samples, targets)
+    calibration.update({'model_version': models.version, 'num_samples': num_samples, 'split': split})
+    path = save_calibration(calibration)
+    
+    for level, coverage in calibration['coverage'].items():
+        print(f"   {float(level):.0%} interval: coverage {coverage['raw']:.1%} raw → "
+              f"{coverage['calibrated']:.1%} calibrated (scale {calibration['scales'][level]:.2f})")
+    print(f"💾 Saved calibration to {path}")
+    return calibration
+
+
+def benchmark(sample_counts=(8, 16, 32, 64), batch_sizes=(1, 32), repeats=20):
+    """Latency of MC intervals vs. the deterministic inference path (model only, text already encoded)."""
+    from config import MODEL_CONFIG
+    from predict import PricePredictor
+    
+    predictor = PricePredictor()
+    models = predictor.models
+    results = []
+    
+    def timed(fn):
+        fn()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        return (time.perf_counter() - start) / repeats * 1000
+    
+    for batch_size in batch_sizes:
+        tokens = torch.randn(batch_size, 3, MODEL_CONFIG['d_model'], device=predictor.device)
+        deterministic_ms = timed(lambda: models.inference_model(tokens))
+        for num_samples in sample_counts:
+            mc_ms = timed(lambda: mc_samples(models.mc_model, tokens, num_samples))
+            results.append({'batch_size': batch_size, 'samples': num_samples, 'deterministic_ms': deterministic_ms,
+                            'mc_ms': mc_ms, 'overhead': mc_ms / deterministic_ms})
+    
+    print(f"\n{'batch':>6} {'K':>4} {'deterministic':>14} {'MC dropout':>11} {'overhead':>9}")
+    for r in results:
+        print(f"{r['batch_size']:>6} {r['samples']:>4} {r['deterministic_ms']:>11.2f} ms "
+              f"{r['mc_ms']:>8.2f} ms {r['overhead']:>8.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Calibrate or benchmark MC-dropout price intervals")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    calibrate_parser = subparsers.add_parser('calibrate', help='Fit conformal scales on the validation split')
+    calibrate_parser.add_argument('--samples', type=int, help='MC samples per row')
+    calibrate_parser.add_argument('--rows', type=int, default=5000, help='Validation rows to use')
+    
+    benchmark_parser = subparsers.add_parser('benchmark', help='Overhead over the deterministic path')
+    benchmark_parser.add_argument('--samples', type=int, nargs='+', default=[8, 16, 32, 64])
+    benchmark_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32])
+    args = parser.parse_args()
+    
+    if args.command == 'calibrate':
+        calibrate(args.samples, args.rows)
+    else:
+        benchmark(args.samples, args.batch_sizes)